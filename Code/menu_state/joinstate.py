@@ -11,7 +11,8 @@ class JoinState(BaseState):
         # input
         self.ip_text = "localhost"
         self.port_text = "5555"
-        self.active_field = "ip"  # "ip" or "port"
+        self.room_text = ""  # optional: named room on a room server
+        self.active_field = "ip"  # "ip", "port" or "room"
         self.error_message = ""
         
         # Fonts
@@ -40,6 +41,7 @@ class JoinState(BaseState):
     def enter(self, **kwargs):
         self.ip_text = "localhost"
         self.port_text = "5555"
+        self.room_text = ""
         self.active_field = "ip"
         self.error_message = ""
         self.cursor_visible = True
@@ -54,18 +56,26 @@ class JoinState(BaseState):
                 elif event.key == pygame.K_TAB:
                     # Changing camps
                     get_audio_manager().play_menu_hover()
-                    self.active_field = "port" if self.active_field == "ip" else "ip"
+                    fields = ("ip", "port", "room")
+                    self.active_field = fields[(fields.index(self.active_field) + 1) % len(fields)]
                 
                 elif event.key == pygame.K_RETURN:
                     get_audio_manager().play_menu_click()
                     self._try_connect()
                 
+                elif event.key == pygame.K_F2:
+                    # Watch the match in the room as a spectator
+                    get_audio_manager().play_menu_click()
+                    self._try_connect(spectate=True)
+                
                 elif event.key == pygame.K_BACKSPACE:
                     # Erasing chars
                     if self.active_field == "ip":
                         self.ip_text = self.ip_text[:-1]
-                    else:
+                    elif self.active_field == "port":
                         self.port_text = self.port_text[:-1]
+                    else:
+                        self.room_text = self.room_text[:-1]
                 
                 else:
                     # Adding chars
@@ -74,16 +84,28 @@ class JoinState(BaseState):
                         if self.active_field == "ip":
                             if char.isdigit() or char == '.':
                                 self.ip_text += char
-                        else:
+                        elif self.active_field == "port":
                             if char.isdigit():
                                 self.port_text += char
+                        elif char.isalnum() or char in '-_':
+                            self.room_text += char
 
-    def _try_connect(self):
+    def _try_connect(self, spectate=False):
         try:
             port = int(self.port_text)
             network = NetworkHandler()
+            room = self.room_text or None
+            
+            if spectate and room is None:
+                self.error_message = "Room required to watch"
+                return
             
-            if network.join(self.ip_text, port):
+            if spectate:
+                connected = network.spectate(self.ip_text, port, room)
+            else:
+                connected = network.join(self.ip_text, port, room)
+            
+            if connected:
                 self.state_manager.change_state(StateID.WAITING, 
                                               network=network, 
                                               mode="1v1",
@@ -168,14 +190,28 @@ class JoinState(BaseState):
         port_rect = port_surf.get_rect(midleft=(center_x + 10, panel_rect.top + y_offset + 50))
         self.screen.blit(port_surf, port_rect)
         
+        # Room (optional)
+        room_label = self.label_font.render("Room:", True, self.text_color)
+        room_label_rect = room_label.get_rect(midright=(center_x - 10, panel_rect.top + y_offset + 100))
+        self.screen.blit(room_label, room_label_rect)
+        
+        room_color = self.highlight_color if self.active_field == "room" else self.text_color
+        room_display = self.room_text
+        if self.active_field == "room" and self.cursor_visible:
+            room_display += "_"
+        
+        room_surf = self.input_font.render(room_display, True, room_color)
+        room_rect = room_surf.get_rect(midleft=(center_x + 10, panel_rect.top + y_offset + 100))
+        self.screen.blit(room_surf, room_rect)
+        
         # Error message
         if self.error_message:
             error_surf = self.small_font.render(self.error_message, True, self.error_color)
-            error_rect = error_surf.get_rect(center=(center_x, panel_rect.top + y_offset + 100))
+            error_rect = error_surf.get_rect(center=(center_x, panel_rect.top + y_offset + 145))
             self.screen.blit(error_surf, error_rect)
         
         # Instructions
-        instr1 = "TAB: Switch field | ENTER: Connect | ESC: Back"
+        instr1 = "TAB: Switch field | ENTER: Connect | F2: Watch | ESC: Back"
         instr1_surf = self.small_font.render(instr1, True, (180, 180, 200))
         instr1_rect = instr1_surf.get_rect(center=(center_x, panel_rect.bottom - 30))
         self.screen.blit(instr1_surf, instr1_rect)
\ No newline at end of file
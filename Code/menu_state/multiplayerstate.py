@@ -237,7 +237,7 @@ class MultiplayerHostJoinState(BaseState):
             self.option_font = pygame.font.Font(None, 30)
             self.small_font = pygame.font.Font(None, 18)
 
-        self.options = ["Host match", "Join match", "Back"]
+        self.options = ["Host match", "Join match", "Quick match", "Back"]
         self.current_index = 0
 
         self.center_x = WINDOW_WIDTH // 2
@@ -286,7 +286,7 @@ class MultiplayerHostJoinState(BaseState):
         if option == "Host match":
             # Criar servidor e ir para tela de espera
             network = NetworkHandler()
-            if network.host(5555):  # Porta padrão
+            if network.host(5555, netcode=NETCODE):  # Porta padrão
                 self.state_manager.change_state(StateID.WAITING, 
                                               network=network, 
                                               mode=self.mode,
@@ -298,6 +298,18 @@ class MultiplayerHostJoinState(BaseState):
             # Ir para tela de inserir IP
             self.state_manager.change_state(StateID.JOIN)
 
+        elif option == "Quick match":
+            # Fila do lobby: o servidor e a sala vêm no match_found
+            network = NetworkHandler()
+            if network.find_match(LOBBY_HOST, LOBBY_PORT, self.mode):
+                self.state_manager.change_state(StateID.WAITING,
+                                              network=network,
+                                              mode=self.mode,
+                                              is_host=False,
+                                              matchmaking=True)
+            else:
+                print("Failed to reach lobby")
+
         elif option == "Back":
             self.state_manager.change_state(StateID.MULTI_MODE)
 
@@ -358,7 +370,7 @@ class MultiplayerHostJoinState(BaseState):
         self._draw_pong_background()
 
         panel_width = 540
-        panel_height = 320
+        panel_height = 370
         panel_rect = pygame.Rect(
             self.center_x - panel_width // 2,
             self.center_y - panel_height // 2,
@@ -218,4 +218,32 @@ class DisconnectMessage:
         sub_text = f"Returning to menu in {int(remaining) + 1}..."
         sub_surf = self.small_font.render(sub_text, True, (180, 180, 200))
         sub_rect = sub_surf.get_rect(center=(center_x, center_y + 30))
+        self.screen.blit(sub_surf, sub_rect)
+
+
+class ReconnectMessage:
+    def __init__(self, screen, title_font, small_font):
+        self.screen = screen
+        self.title_font = title_font
+        self.small_font = small_font
+    
+    def draw(self, center_x, center_y, is_host, time_left=None):
+        # Overlay
+        overlay = pygame.Surface((self.screen.get_width(), self.screen.get_height()), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 160))
+        self.screen.blit(overlay, (0, 0))
+        
+        # Texto principal
+        msg_text = "OPPONENT RECONNECTING" if is_host else "RECONNECTING"
+        msg_surf = self.title_font.render(msg_text, True, (255, 200, 100))
+        msg_rect = msg_surf.get_rect(center=(center_x, center_y - 20))
+        self.screen.blit(msg_surf, msg_rect)
+        
+        # Janela de reconexão (sem ela: reconectado, sincronizando o estado)
+        if time_left is None:
+            sub_text = "Resyncing..."
+        else:
+            sub_text = f"Waiting up to {int(time_left) + 1}s..."
+        sub_surf = self.small_font.render(sub_text, True, (180, 180, 200))
+        sub_rect = sub_surf.get_rect(center=(center_x, center_y + 30))
         self.screen.blit(sub_surf, sub_rect)
\ No newline at end of file
@@ -12,6 +12,7 @@ class WaitingForPlayersState(BaseState):
         self.mode = "1v1"
         self.message = "Waiting for opponent..."
         self.is_host = False
+        self.matchmaking = False
         
         # Fontes
         font_path = "8-BIT WONDER.TTF"
@@ -36,10 +37,11 @@ class WaitingForPlayersState(BaseState):
         # time counter
         self.wait_time = 0
 
-    def enter(self, network=None, mode="1v1", is_host=False):
+    def enter(self, network=None, mode="1v1", is_host=False, matchmaking=False):
         self.network = network
         self.mode = mode
         self.is_host = is_host
+        self.matchmaking = matchmaking
         self.dot_timer = 0
         self.dots = ""
         self.wait_time = 0
@@ -47,6 +49,10 @@ class WaitingForPlayersState(BaseState):
         
         if self.is_host:
             self.message = f"Hosting {mode} match..."
+        elif network is not None and network.is_spectator():
+            self.message = "Waiting for match..."
+        elif self.matchmaking:
+            self.message = "Searching for opponent..."
         else:
             self.message = "Connecting to host..."
     
@@ -83,6 +89,14 @@ class WaitingForPlayersState(BaseState):
         if self.network:
             self.network.update()
             
+            if self.matchmaking:
+                if self.network.room_id is not None:
+                    self.message = "Opponent found..."
+                elif not self.network.connected:
+                    self.message = "Matchmaking failed"
+            elif self.network.is_spectator() and not self.network.connected:
+                self.message = "Match not found"
+            
             # verifying if net is ready
             if self.network.is_ready():
                 self.state_manager.change_state(StateID.PLAYING, 
@@ -144,6 +158,11 @@ class WaitingForPlayersState(BaseState):
             port_surf = self.small_font.render(port_text, True, (180, 180, 200))
             port_rect = port_surf.get_rect(center=(center_x, center_y + 45))
             self.screen.blit(port_surf, port_rect)
+        elif self.matchmaking and self.network and self.network.room_id is None:
+            queue_text = f"In queue: {self.network.queued_players}"
+            queue_surf = self.small_font.render(queue_text, True, (180, 180, 200))
+            queue_rect = queue_surf.get_rect(center=(center_x, center_y + 10))
+            self.screen.blit(queue_surf, queue_rect)
         
         # waiting time
         time_text = f"Waiting: {int(self.wait_time)}s"
@@ -0,0 +1,211 @@
+"""Microbenchmarks do codec: encode/decode de cada tipo de mensagem em JSON e binário.
+
+As mensagens têm valores realistas: os snapshots vêm de uma Match simulada com
+inputs aleatórios (com deltas do DeltaEncoder), os inputs têm seq crescente e
+histórico de 0 a INPUT_HISTORY direções. Cada caso roda várias repetições sobre o
+mesmo conjunto de mensagens e guarda o melhor tempo e a mediana por mensagem.
+
+O resultado vai para um JSON (--output) que serve de base para a próxima
+execução (--baseline): casos mais lentos que o limite são apontados, e com
+--fail-on-regression o processo termina com código 1.
+
+Uso (a partir de Code/):
+    python -m network.benchmark --output bench.json
+    python -m network.benchmark --baseline bench.json --fail-on-regression
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from network.prediction import INPUT_HISTORY
+from network.protocol import (CODEC_BINARY, MAX_INPUT_HISTORY, PROTOCOL_VERSION, SUPPORTED_CODECS,
+                              decode_message, encode_message)
+from network.simulation import Match
+from network.snapshot import DeltaEncoder
+
+
+# Mensagens distintas por tipo (o laço percorre todas em cada repetição)
+DEFAULT_SAMPLES = 256
+DEFAULT_REPEATS = 30
+# Razão de tempo (atual / base) acima da qual um caso conta como regressão
+DEFAULT_THRESHOLD = 1.2
+MESSAGE_TYPES = ('input', 'opponent_input', 'game_state', 'game_state_delta', 'state_ack',
+                 'pause_state', 'rollback_input')
+
+
+def _snapshot_messages(rng: random.Random, count: int) -> tuple[list[dict], list[dict]]:
+    """Keyframes e deltas de uma partida simulada, com o cliente confirmando cada snapshot."""
+    match = Match()
+    match.start()
+    encoder = DeltaEncoder()
+    keyframes, deltas = [], []
+    seq = 0
+    while len(keyframes) < count or len(deltas) < count:
+        for slot in (1, 2):
+            seq += 1
+            match.apply_input(slot, {'direction': rng.choice((-1, 0, 1)), 'seq': seq})
+        match.step()
+        snapshot_seq = encoder.push(match.snapshot())
+        msg = encoder.encode_for(1)
+        (keyframes if msg['type'] == 'game_state' else deltas).append(dict(msg))
+        if rng.random() < 0.1:
+            encoder.request_keyframe(1)
+        encoder.ack(1, snapshot_seq)
+    return keyframes[:count], deltas[:count]
+
+
+def _history(rng: random.Random, limit: int) -> list[int]:
+    # Em geral poucos inputs pendentes; às vezes a janela inteira (perdas, RTT alto)
+    length = limit if rng.random() < 0.1 else rng.randint(0, min(3, limit))
+    return [rng.choice((-1, 0, 1)) for _ in range(length)]
+
+
+def build_messages(count: int = DEFAULT_SAMPLES, seed: int = 0) -> dict[str, list[dict]]:
+    """Mensagens de cada tipo em MESSAGE_TYPES, com valores na faixa vista numa partida."""
+    rng = random.Random(seed)
+    keyframes, deltas = _snapshot_messages(rng, count)
+    messages = {'game_state': keyframes, 'game_state_delta': deltas}
+
+    inputs, opponent_inputs, rollback_inputs = [], [], []
+    for i in range(count):
+        seq = rng.randint(1, 60 * 60 * 10) + i
+        msg = {'type': 'input', 'direction': rng.choice((-1, 0, 1)), 'seq': seq}
+        history = _history(rng, INPUT_HISTORY)
+        if history:
+            msg['history'] = history
+        inputs.append(msg)
+
+        opponent = {'type': 'opponent_input', 'direction': rng.choice((-1, 0, 1))}
+        if rng.random() < 0.5:
+            opponent['paddle_y'] = rng.uniform(60, 660)
+        opponent_inputs.append(opponent)
+
+        rollback_inputs.append({
+            'type': 'rollback_input',
+            'tick': seq,
+            'direction': rng.choice((-1, 0, 1)),
+            'history': _history(rng, MAX_INPUT_HISTORY),
+            'ack': seq - rng.randint(1, 8),
+            'adv': rng.randint(-4, 4),
+        })
+
+    messages['input'] = inputs
+    messages['opponent_input'] = opponent_inputs
+    messages['rollback_input'] = rollback_inputs
+    messages['state_ack'] = [{'type': 'state_ack', 'seq': rng.randint(1, 1 << 20)} for _ in range(count)]
+    messages['pause_state'] = [{'type': 'pause_state', 'paused': rng.random() < 0.5,
+                                'initiator': rng.choice(('host', 'client'))} for _ in range(count)]
+    return messages
+
+
+def _time_loop(function, items: list, repeats: int) -> tuple[float, float]:
+    """(melhor, mediana) em nanossegundos por item."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for item in items:
+            function(item)
+        timings.append((time.perf_counter_ns() - start) / len(items))
+    return min(timings), statistics.median(timings)
+
+
+def run_benchmarks(samples: int = DEFAULT_SAMPLES, repeats: int = DEFAULT_REPEATS,
+                   codecs: tuple = SUPPORTED_CODECS, seed: int = 0) -> dict:
+    messages = build_messages(samples, seed)
+    results = {}
+    for msg_type in MESSAGE_TYPES:
+        for codec in codecs:
+            items = messages[msg_type]
+            payloads = [encode_message(msg, codec) for msg in items]
+            encode_best, encode_median = _time_loop(lambda msg: encode_message(msg, codec), items, repeats)
+            decode_best, decode_median = _time_loop(decode_message, payloads, repeats)
+            results[f'{msg_type}/{codec}'] = {
+                'type': msg_type,
+                'codec': codec,
+                'encode_ns': encode_best,
+                'encode_median_ns': encode_median,
+                'decode_ns': decode_best,
+                'decode_median_ns': decode_median,
+                'bytes': sum(len(payload) for payload in payloads) / len(payloads),
+                # Mensagens que o layout binário não cobre e seguiram em JSON
+                'json_fallbacks': (sum(1 for payload in payloads if payload[:1] == b'{')
+                                   if codec == CODEC_BINARY else 0),
+            }
+    return {
+        'meta': {
+            'protocol_version': PROTOCOL_VERSION,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'samples': samples,
+            'repeats': repeats,
+            'seed': seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Casos (e medida) mais lentos que threshold vezes a base."""
+    regressions = []
+    for key, result in report['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if base is None:
+            continue
+        for measure in ('encode_ns', 'decode_ns'):
+            if base.get(measure) and result[measure] / base[measure] > threshold:
+                regressions.append(f"{key} {measure}: {base[measure]:.0f} -> {result[measure]:.0f} ns "
+                                   f"({result[measure] / base[measure]:.2f}x)")
+    return regressions
+
+
+def print_report(report: dict, baseline: dict | None = None):
+    print(f"{'mensagem':<28}{'encode ns':>11}{'decode ns':>11}{'bytes':>8}{'base enc/dec':>16}")
+    for key, result in report['results'].items():
+        line = f"{key:<28}{result['encode_ns']:>11.0f}{result['decode_ns']:>11.0f}{result['bytes']:>8.1f}"
+        base = (baseline or {}).get('results', {}).get(key)
+        if base:
+            line += f"{result['encode_ns'] / base['encode_ns']:>9.2f}x/{result['decode_ns'] / base['decode_ns']:.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks do codec de rede do Ultra-Pong")
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES, help="mensagens distintas por tipo")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="repetições por caso")
+    parser.add_argument('--codec', action='append', choices=SUPPORTED_CODECS, default=None,
+                        help="codec medido (repetível; padrão: todos)")
+    parser.add_argument('--seed', type=int, default=0, help="semente das mensagens geradas")
+    parser.add_argument('--output', default=None, metavar='ARQUIVO', help="grava os resultados em JSON")
+    parser.add_argument('--baseline', default=None, metavar='ARQUIVO', help="resultados anteriores para comparar")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="razão atual/base que conta como regressão")
+    parser.add_argument('--fail-on-regression', action='store_true', help="código de saída 1 se houver regressão")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.samples, args.repeats, tuple(args.codec or SUPPORTED_CODECS), args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = compare(report, baseline, args.threshold)
+        for regression in regressions:
+            print(f"[Benchmark] Regressão: {regression}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,94 @@
 import socket
-import json
 import threading
 import select
+import time
 from collections import deque
 
+from network.framing import DEFAULT_MAX_FRAME_SIZE, LENGTH_PREFIX_SIZE, FrameBuffer, FrameTooLargeError
+from network.protocol import (CODEC_BINARY, CODEC_JSON, SUPPORTED_CODECS, decode_message,
+                              encode_message, frame, hello_message)
+from network.metrics import ConnectionStats, SendStats
+from network.udp import (MAX_DATAGRAM_SIZE, RECORD_OVERHEAD, SequenceCounter, SequenceFilter,
+                         pack_datagrams, unpack_datagram)
+
+# Reenvio do udp_hello até o servidor confirmar o canal
+UDP_HELLO_INTERVAL = 0.1
+UDP_HELLO_ATTEMPTS = 30
+# Bytes na fila de escrita (kernel sem aceitar) antes de dar a conexão como perdida
+DEFAULT_MAX_QUEUE_BYTES = 256 * 1024
+# Mensagens marcadas com o momento de chegada (_received_at): pong para o RTT,
+# snapshots para o jitter buffer
+_STAMPED_TYPES = frozenset(('pong', 'game_state', 'game_state_delta'))
+
 
 class TCPClient:
-    def __init__(self, server_ip: str = 'localhost', server_port: int = 5555):
+    def __init__(self, server_ip: str = 'localhost', server_port: int = 5555,
+                 codec: str = CODEC_BINARY, udp: bool = True,
+                 max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+                 stats: ConnectionStats | None = None,
+                 max_queue_bytes: int = DEFAULT_MAX_QUEUE_BYTES):
         self.server_addr = (server_ip, server_port)
+        self.preferred_codec = codec
+        self.codec = CODEC_JSON  # codec ativo; muda quando o servidor responde ao hello
         self.socket: socket.socket | None = None
         self.connected = False
         self.receive_queue: deque = deque()
         self._receive_thread: threading.Thread | None = None
         self._running = False
-        self._recv_buffer = b''
+        self._recv_buffer = FrameBuffer(max_frame_size=max_frame_size)
+        
+        # Canal UDP não-confiável; só é usado depois do udp_ready do servidor
+        self.udp_enabled = udp
+        self.udp_socket: socket.socket | None = None
+        self.udp_token: int | None = None
+        self.udp_ready = False
+        self._udp_seq = SequenceCounter()
+        self._udp_filter = SequenceFilter()
+        self._udp_hello_attempts = 0
+        self._udp_hello_last = 0.0
+        
+        # Coalescência por tick: entre begin_batch() e flush() os envios só são enfileirados
+        self._batching = False
+        self._pending: list[bytes] = []
+        self._udp_pending: list[tuple[int, bytes]] = []
+        self.send_stats = SendStats()
         
-    def connect(self) -> bool:
+        # Fila de escrita: o que o kernel não aceitou. Um frame cortado no meio não pode
+        # ser descartado, senão o servidor perde o enquadramento; o resto sai antes de
+        # qualquer frame novo, pela thread de recepção (socket gravável) ou no próximo envio
+        self.max_queue_bytes = max_queue_bytes
+        self._outbox = bytearray()
+        self._send_lock = threading.Lock()
+        self._backlog_since: float | None = None
+        # Métricas da conexão; sobrevivem a reconexões (contadas em stats.reconnects).
+        # stats de outro cliente: continua as métricas de uma conexão anterior (retomada de sessão)
+        self.stats = stats if stats is not None else ConnectionStats()
+        self._connects = 0 if stats is None else 1
+        
+    def connect(self, timeout: float = 5.0) -> bool:
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            self.socket.settimeout(5.0)
+            self.socket.settimeout(timeout)
             self.socket.connect(self.server_addr)
             self.socket.setblocking(False)
             
             self.connected = True
             self._running = True
+            if self._connects:
+                self.stats.reconnects += 1
+            self._connects += 1
+            self.stats.connected_at = time.monotonic()
+            self.codec = CODEC_JSON
+            self._reset_udp()
+            
+            if self.udp_enabled:
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.connect(self.socket.getpeername()[:2])
+                self.udp_socket.setblocking(False)
+            
+            # Oferece os codecs suportados; até a resposta tudo segue em JSON
+            self.send(hello_message(self.preferred_codec, udp=self.udp_socket is not None))
             
             self._receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
             self._receive_thread.start()
@@ -49,83 +113,303 @@ class TCPClient:
         if self.socket:
             try:
                 self.socket.shutdown(socket.SHUT_RDWR)
-            except:
-                pass
+            except OSError:
+                pass  # já desconectado pelo peer
             finally:
                 self.socket.close()
                 self.socket = None
         
+        if self.udp_socket:
+            try:
+                self.udp_socket.close()
+            except OSError:
+                pass
+            self.udp_socket = None
+        self._reset_udp()
+        
         if self._receive_thread and self._receive_thread.is_alive():
             self._receive_thread.join(timeout=1.0)
         
-        self._recv_buffer = b''
+        self._recv_buffer.clear()
+        self._batching = False
+        self._pending.clear()
+        self._udp_pending.clear()
+        with self._send_lock:
+            self._outbox.clear()
+            self._backlog_since = None
         print("[TCP Client] Desconectado")
     
-    def send(self, data: dict) -> bool:
+    def _reset_udp(self):
+        self.udp_token = None
+        self.udp_ready = False
+        self._udp_seq = SequenceCounter()
+        self._udp_filter = SequenceFilter()
+        self._udp_hello_attempts = 0
+        self._udp_hello_last = 0.0
+    
+    def send(self, data: dict, reliable: bool = True) -> bool:
         if not self.connected or not self.socket:
             return False
         
-        try:
-            payload = json.dumps(data).encode('utf-8')
-            length_prefix = len(payload).to_bytes(4, byteorder='big')
-            message = length_prefix + payload
-            self.socket.sendall(message)
+        self.send_stats.messages += 1
+        
+        if not reliable and self.udp_ready:
+            if self._batching:
+                self._udp_pending.append(self._udp_record(data))
+                return True
+            return self._send_datagram(data)
+        
+        message = frame(encode_message(data, self.codec))
+        self.send_stats.encodes += 1
+        self.stats.record_out(data.get('type'), len(message))
+        self.stats.bytes_out += len(message)
+        if self._batching:
+            self._pending.append(message)
             return True
+        return self._write(message)
+    
+    def begin_batch(self):
+        """Passa a acumular os envios até flush(), tipicamente um tick de simulação."""
+        self._batching = True
+    
+    def flush(self) -> bool:
+        """Envia o que foi acumulado no tick com uma syscall por canal."""
+        self._batching = False
+        ok = True
+        
+        if self._udp_pending:
+            records, self._udp_pending = self._udp_pending, []
+            self.send_stats.record_flush(len(records))
+            ok = self._send_records(records)
+        
+        if self._pending:
+            frames, self._pending = self._pending, []
+            self.send_stats.record_flush(len(frames))
+            ok = self._write(b''.join(frames)) and ok
+        return ok
+    
+    def _write(self, message: bytes) -> bool:
+        """Envia sem bloquear; o que o kernel não aceitar vai para a fila de escrita."""
+        with self._send_lock:
+            if not self.connected or not self.socket:
+                return False
             
-        except (BrokenPipeError, ConnectionResetError):
-            print("[TCP Client] Conexão perdida ao enviar")
-            self.connected = False
-            return False
-        except Exception as e:
-            print(f"[TCP Client] Erro ao enviar: {e}")
+            if self._outbox:
+                # Já há bytes pendentes: entra atrás deles para preservar a ordem
+                self._outbox += message
+                return self._drain_outbox()
+            
+            try:
+                sent = self.socket.send(message)
+                self.send_stats.record_syscalls()
+            except (BlockingIOError, InterruptedError):
+                sent = 0  # buffer do kernel cheio (rede parada ou servidor sem ler)
+            except OSError as e:
+                return self._lose_connection(f"Conexão perdida ao enviar: {e}")
+            
+            if sent < len(message):
+                # Escrita enfileirada: conta uma parada e mede até a fila esvaziar
+                self.stats.send_stalls += 1
+                self._backlog_since = time.monotonic()
+                self._outbox += memoryview(message)[sent:]
+                return self._check_outbox()
+            return True
+    
+    def _drain_outbox(self) -> bool:
+        """Tenta mandar a fila de escrita. Chamado com _send_lock."""
+        try:
+            sent = self.socket.send(self._outbox)
+            self.send_stats.record_syscalls()
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError as e:
+            return self._lose_connection(f"Conexão perdida ao enviar: {e}")
+        del self._outbox[:sent]
+        if not self._outbox and self._backlog_since is not None:
+            self.stats.stalled_s += time.monotonic() - self._backlog_since
+            self._backlog_since = None
+        return self._check_outbox()
+    
+    def _check_outbox(self) -> bool:
+        if len(self._outbox) > self.max_queue_bytes:
+            return self._lose_connection(f"fila de envio com {len(self._outbox)} bytes")
+        return True
+    
+    def _lose_connection(self, reason: str) -> bool:
+        # Conexão perdida (ou stream pela metade): nada mais pode ser escrito nela, e
+        # connected=False faz o NetworkHandler começar a retomada na hora
+        print(f"[TCP Client] {reason}")
+        self.connected = False
+        self._outbox.clear()
+        self._backlog_since = None
+        sock = self.socket
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return False
+    
+    def _flush_outbox(self):
+        with self._send_lock:
+            if self._outbox and self.connected and self.socket:
+                self._drain_outbox()
+    
+    def _udp_record(self, data: dict) -> tuple[int, bytes]:
+        self.send_stats.encodes += 1
+        payload = encode_message(data, self.codec)
+        self.stats.record_out(data.get('type'), RECORD_OVERHEAD + len(payload))
+        return self._udp_seq.next(data.get('type')), payload
+    
+    def _send_datagram(self, data: dict) -> bool:
+        return self._send_records([self._udp_record(data)])
+    
+    def _send_records(self, records: list) -> bool:
+        udp_socket = self.udp_socket
+        if not udp_socket or self.udp_token is None:
             return False
+        try:
+            for datagram in pack_datagrams(self.udp_token, records):
+                udp_socket.send(datagram)
+                self.send_stats.record_syscalls()
+                self.stats.bytes_out += len(datagram)
+            return True
+        except OSError:
+            return False  # perda de datagrama é aceitável neste canal
+    
+    def _maybe_send_udp_hello(self):
+        if self.udp_token is None or self.udp_ready:
+            return
+        if self._udp_hello_attempts >= UDP_HELLO_ATTEMPTS:
+            return  # UDP bloqueado: segue tudo pelo TCP
+        now = time.monotonic()
+        if now - self._udp_hello_last < UDP_HELLO_INTERVAL:
+            return
+        self._udp_hello_last = now
+        self._udp_hello_attempts += 1
+        self._send_datagram({'type': 'udp_hello'})
+    
+    def _handle_udp_data(self):
+        while self.udp_socket:
+            try:
+                data = self.udp_socket.recv(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            
+            unpacked = unpack_datagram(data)
+            if unpacked is None:
+                continue
+            token, records = unpacked
+            if token != self.udp_token:
+                continue
+            self.stats.bytes_in += len(data)
+            
+            for seq, payload in records:
+                try:
+                    msg = decode_message(payload)
+                except ValueError as e:
+                    self.stats.decode_errors += 1
+                    print(f"[TCP Client] Datagrama inválido: {e}")
+                    continue
+                self.stats.record_in(msg.get('type'), RECORD_OVERHEAD + len(payload))
+                
+                # Descarta datagramas antigos ou fora de ordem
+                if self._udp_filter.accept(msg.get('type'), seq):
+                    self._queue_message(msg)
     
     def _receive_loop(self):
         while self._running and self.socket:
             try:
-                ready_to_read, _, _ = select.select([self.socket], [], [], 0.1)
+                read_list = [self.socket]
+                if self.udp_socket:
+                    read_list.append(self.udp_socket)
                 
-                if not ready_to_read:
-                    continue
+                write_list = [self.socket] if self._outbox else []
+                ready_to_read, ready_to_write, _ = select.select(read_list, write_list, [],
+                                                                 UDP_HELLO_INTERVAL)
+                
+                if ready_to_write:
+                    self._flush_outbox()
+                
+                self._maybe_send_udp_hello()
+                
+                if self.udp_socket in ready_to_read:
+                    self._handle_udp_data()
                 
-                chunk = self.socket.recv(4096)
+                if self.socket not in ready_to_read:
+                    continue
                 
-                if not chunk:
-                    print("[TCP Client] Servidor encerrou a conexão")
-                    self.connected = False
+                received = self._recv_buffer.recv_from(self.socket)
+                if not received:
+                    self._close_from_receive("Servidor encerrou a conexão")
                     break
+                self.stats.bytes_in += received
                 
-                self._recv_buffer += chunk
                 self._process_buffer()
                 
-            except (BlockingIOError, OSError):
-                if self._running:
-                    continue
+            except FrameTooLargeError as e:
+                self._close_from_receive(f"Frame inválido do servidor: {e}")
                 break
+            except (BlockingIOError, InterruptedError):
+                continue
             except ConnectionResetError:
-                print("[TCP Client] Conexão resetada pelo servidor")
-                self.connected = False
+                self._close_from_receive("Conexão resetada pelo servidor")
                 break
             except Exception as e:
-                if self._running:
-                    print(f"[TCP Client] Erro na recepção: {e}")
+                # OSError com o socket morto: sem isso o select seguiria acusando leitura
+                self._close_from_receive(f"Erro na recepção: {e}")
                 break
     
+    def _close_from_receive(self, reason: str):
+        if not self._running:
+            return  # disconnect() em andamento fechou o socket
+        with self._send_lock:
+            self._lose_connection(reason)
+    
     def _process_buffer(self):
-        while len(self._recv_buffer) >= 4:
-            msg_length = int.from_bytes(self._recv_buffer[:4], byteorder='big')
+        # Payloads são fatias do buffer de recepção: decodifica antes do próximo recv
+        for payload in self._recv_buffer.frames():
+            try:
+                data = decode_message(payload)
+            except ValueError as e:
+                self.stats.decode_errors += 1
+                print(f"[TCP Client] Erro ao decodificar mensagem: {e}")
+                continue
             
-            if len(self._recv_buffer) < 4 + msg_length:
-                break
+            msg_type = data.get('type')
+            self.stats.record_in(msg_type, LENGTH_PREFIX_SIZE + len(payload))
+            if msg_type == 'codec':
+                # Resposta do hello: a partir daqui envia no codec negociado
+                if data.get('codec') in SUPPORTED_CODECS:
+                    self.codec = data['codec']
+                continue
             
-            payload = self._recv_buffer[4:4 + msg_length]
-            self._recv_buffer = self._recv_buffer[4 + msg_length:]
+            if msg_type == 'udp_token':
+                self.udp_token = data.get('token')
+                port = data.get('port')
+                if port and self.udp_socket and self.socket and port != self.socket.getpeername()[1]:
+                    # UDP do servidor em outra porta (ex.: worker de um servidor fragmentado)
+                    try:
+                        self.udp_socket.connect((self.socket.getpeername()[0], port))
+                    except OSError:
+                        pass
+                self._maybe_send_udp_hello()
+                continue
             
-            try:
-                data = json.loads(payload.decode('utf-8'))
-                self.receive_queue.append(data)
-            except json.JSONDecodeError as e:
-                print(f"[TCP Client] Erro ao decodificar JSON: {e}")
+            if msg_type == 'udp_ready':
+                self.udp_ready = True
+                print("[TCP Client] Canal UDP estabelecido")
+                continue
+            
+            self._queue_message(data)
+    
+    def _queue_message(self, msg: dict):
+        if msg.get('type') in _STAMPED_TYPES:
+            # Momento da chegada: RTT e jitter não incluem a espera até o próximo update() do jogo
+            msg['_received_at'] = time.monotonic()
+        self.receive_queue.append(msg)
     
     def get_messages(self) -> list:
         messages = list(self.receive_queue)
@@ -143,6 +427,22 @@ class TCPClient:
         data = {'type': event_type, **kwargs}
         self.send(data)
     
+    def get_send_stats(self) -> dict:
+        return self.send_stats.snapshot()
+    
+    def get_connection_stats(self) -> dict:
+        """Métricas da conexão: tráfego por tipo, filas, falhas e idade da última recepção."""
+        stats = self.stats.snapshot()
+        stats.update({
+            'connected': self.connected,
+            'codec': self.codec,
+            'udp': self.udp_ready,
+            'received_queue': len(self.receive_queue),
+            'batched_messages': len(self._pending) + len(self._udp_pending),
+            'queued_bytes': len(self._outbox),
+        })
+        return stats
+    
     @property
     def is_connected(self) -> bool:
         return self.connected and self.socket is not None
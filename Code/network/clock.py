@@ -0,0 +1,122 @@
+"""Estimativa de RTT, jitter e do tick atual do servidor por ping/pong.
+
+O cliente manda ping com o seu relógio (monotonic); o servidor devolve pong com o
+mesmo valor e o seu tick de simulação. RTT e jitter são suavizados como no TCP
+(RFC 6298). O tick do servidor no momento da chegada é estimado como
+tick + RTT/2, e a diferença para o relógio local vira um offset também suavizado.
+
+Com a partida pausada (ou a sessão sendo retomada) o tick do servidor não anda:
+a estimativa fica congelada e, ao descongelar, continua do tick em que parou.
+"""
+import time
+
+from settings import FPS
+
+
+# Intervalo entre pings depois da convergência
+PING_INTERVAL = 0.5
+# As primeiras amostras saem mais rápido para o estimador convergir logo após conectar
+FAST_PING_INTERVAL = 0.1
+FAST_PING_SAMPLES = 5
+# Ganhos dos filtros: RTT suavizado, variação média do RTT e offset do relógio
+RTT_GAIN = 1 / 8
+JITTER_GAIN = 1 / 4
+OFFSET_GAIN = 1 / 8
+# Erro (em ticks) acima do qual o relógio é reposicionado em vez de suavizado
+# (ex.: pausa no host, nova partida, tick reiniciado)
+RESYNC_TICKS = 10
+
+
+class ClockSync:
+    """Estimadores suavizados de RTT, jitter e tick do servidor (lado do cliente)."""
+
+    def __init__(self, tick_rate: int = FPS):
+        self.tick_rate = tick_rate
+        self.rtt_ms = 0.0
+        self.jitter_ms = 0.0
+        self.samples = 0
+        self.resyncs = 0
+        self._offset: float | None = None  # tick do servidor - relógio local (em ticks)
+        self._frozen_tick: float | None = None  # estimativa parada durante pausa/retomada
+        self._next_ping = 0.0
+
+    def reset(self):
+        self.rtt_ms = 0.0
+        self.jitter_ms = 0.0
+        self.samples = 0
+        self.resyncs = 0
+        self._offset = None
+        self._frozen_tick = None
+        self._next_ping = 0.0
+
+    def make_ping(self, now: float | None = None) -> dict | None:
+        """Retorna o próximo ping, se já for hora de mandá-lo."""
+        now = time.monotonic() if now is None else now
+        if now < self._next_ping:
+            return None
+        interval = FAST_PING_INTERVAL if self.samples < FAST_PING_SAMPLES else PING_INTERVAL
+        self._next_ping = now + interval
+        return {'type': 'ping', 't': now}
+
+    def on_pong(self, msg: dict, now: float | None = None) -> bool:
+        """Incorpora uma resposta. Retorna False para pongs inválidos."""
+        if now is None:
+            now = msg.get('_received_at', time.monotonic())
+        sent_at = msg.get('t')
+        server_tick = msg.get('tick')
+        if not isinstance(sent_at, (int, float)) or not isinstance(server_tick, (int, float)):
+            return False
+        rtt = now - sent_at
+        if rtt < 0:
+            return False
+
+        rtt_ms = rtt * 1000.0
+        if self.samples == 0:
+            self.rtt_ms = rtt_ms
+            self.jitter_ms = rtt_ms / 2
+        else:
+            # Jitter é atualizado com o RTT suavizado anterior (RFC 6298, seção 2.3)
+            self.jitter_ms += JITTER_GAIN * (abs(self.rtt_ms - rtt_ms) - self.jitter_ms)
+            self.rtt_ms += RTT_GAIN * (rtt_ms - self.rtt_ms)
+        self.samples += 1
+
+        if self._frozen_tick is not None:
+            return True  # servidor parado: o offset só volta a valer depois de descongelar
+        offset = server_tick + (rtt / 2) * self.tick_rate - now * self.tick_rate
+        if self._offset is None or abs(offset - self._offset) > RESYNC_TICKS:
+            if self._offset is not None:
+                self.resyncs += 1
+            self._offset = offset
+        elif rtt_ms <= self.rtt_ms + 2 * self.jitter_ms:
+            # Amostras com fila (RTT bem acima do normal) estimam mal o meio do caminho
+            self._offset += OFFSET_GAIN * (offset - self._offset)
+        return True
+
+    def estimated_server_tick(self, now: float | None = None) -> float | None:
+        """Tick em que o servidor está agora, ou None antes do primeiro pong."""
+        if self._frozen_tick is not None:
+            return self._frozen_tick
+        if self._offset is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return now * self.tick_rate + self._offset
+
+    def set_frozen(self, frozen: bool, now: float | None = None):
+        """Congela a estimativa enquanto o servidor não avança ticks (pausa, retomada)."""
+        if self._offset is None or frozen == (self._frozen_tick is not None):
+            return
+        now = time.monotonic() if now is None else now
+        if frozen:
+            self._frozen_tick = now * self.tick_rate + self._offset
+        else:
+            # O tempo parado não conta: o servidor recomeça do tick em que congelou
+            self._offset = self._frozen_tick - now * self.tick_rate
+            self._frozen_tick = None
+
+    def snapshot(self) -> dict:
+        return {
+            'rtt_ms': self.rtt_ms,
+            'jitter_ms': self.jitter_ms,
+            'samples': self.samples,
+            'resyncs': self.resyncs,
+        }
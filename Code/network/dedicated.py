@@ -0,0 +1,128 @@
+"""Servidor dedicado headless: roda a simulação autoritativa sem janela, áudio ou renderização.
+
+Os jogadores entram como clientes comuns (menu "Join") e são roteados para salas
+(RoomManager); cada sala atribui os slots 1 e 2, avança World/Ball/Paddle em
+passos fixos e envia os snapshots.
+
+Com --workers N > 1 as salas são distribuídas entre N processos (ver sharding.py).
+Espectadores entram com join_room e role 'spectator' e recebem a partida com
+--spectator-delay segundos de atraso; para muitos espectadores, ver relay.py.
+
+Uso (a partir de Code/):
+    python -m network.dedicated --port 5555 --tick-rate 60 --max-rooms 256
+    python -m network.dedicated --port 5555 --workers 16
+"""
+import argparse
+import signal
+import time
+
+from network.rooms import (DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_ROOMS, DEFAULT_MAX_SPECTATORS,
+                           DEFAULT_SPECTATOR_DELAY, RoomManager)
+from network.sharding import Supervisor
+from settings import FPS
+
+
+def print_stats(manager: RoomManager):
+    stats = manager.get_stats()
+    room_stats = manager.get_room_stats().values()
+    worst = max((room['p99_ms'] for room in room_stats), default=0.0)
+    print(f"[Dedicated] {stats['rooms']} salas, {stats['matches']} partidas, "
+          f"{stats['clients']} clientes ({stats['spectators']} espectadores), "
+          f"pior p99 de tick {worst:.3f} ms")
+    print_traffic(stats)
+
+
+def print_traffic(stats: dict):
+    print(f"[Dedicated] {stats['bytes_in'] / 1024:.0f} KiB recebidos, {stats['bytes_out'] / 1024:.0f} KiB enviados, "
+          f"{stats['decode_errors']} erros de decodificação, {stats['send_stalls']} filas de envio paradas, "
+          f"conexão mais silenciosa há {stats['max_receive_age_s']:.1f} s")
+
+
+def print_supervisor_stats(supervisor: Supervisor):
+    stats = supervisor.get_stats()
+    print(f"[Dedicated] {stats['workers']} workers, {stats['rooms']} salas, "
+          f"{stats['matches']} partidas, {stats['clients']} clientes")
+    print_traffic(stats)
+    for worker in stats['per_worker']:
+        print(f"  worker {worker['index']}: {worker.get('clients', 0)} clientes, "
+              f"{worker.get('matches', 0)} partidas, p99 de tick {worker.get('p99_ms', 0.0):.3f} ms")
+
+
+def run_supervisor(args):
+    supervisor = Supervisor(args.host, args.port, args.workers, args.tick_rate,
+                            max_rooms=args.max_rooms, idle_timeout=args.idle_timeout,
+                            udp_base_port=args.udp_base_port,
+                            max_spectators=args.max_spectators, spectator_delay=args.spectator_delay)
+
+    def signal_handler(sig, frame):
+        print("\nEncerrando...")
+        supervisor.running = False
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if not supervisor.start():
+        raise SystemExit(1)
+    try:
+        last_stats = time.monotonic()
+        while supervisor.running:
+            supervisor.poll(0.1)
+            if args.stats_interval > 0 and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                print_supervisor_stats(supervisor)
+    finally:
+        supervisor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor dedicado headless do Ultra-Pong")
+    parser.add_argument('--host', default='0.0.0.0', help="endereço de bind")
+    parser.add_argument('--port', type=int, default=5555, help="porta TCP/UDP")
+    parser.add_argument('--tick-rate', type=int, default=FPS, help="ticks de simulação por segundo")
+    parser.add_argument('--max-rooms', type=int, default=DEFAULT_MAX_ROOMS, help="partidas simultâneas")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="segundos sem mensagens antes de coletar uma sala")
+    parser.add_argument('--stats-interval', type=float, default=0.0,
+                        help="imprime estatísticas das salas a cada N segundos (0 = nunca)")
+    parser.add_argument('--max-spectators', type=int, default=DEFAULT_MAX_SPECTATORS,
+                        help="conexões de espectadores (e relays) por processo")
+    parser.add_argument('--spectator-delay', type=float, default=DEFAULT_SPECTATOR_DELAY,
+                        help="atraso, em segundos, do stream enviado aos espectadores")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processos de salas (0 = um por núcleo); acima de 1 usa o supervisor")
+    parser.add_argument('--udp-base-port', type=int, default=None,
+                        help="com vários workers, o worker i usa UDP na porta base + i (padrão: efêmera)")
+    args = parser.parse_args()
+
+    if args.workers != 1:
+        args.workers = args.workers or None
+        run_supervisor(args)
+        return
+
+    manager = RoomManager(args.host, args.port, args.tick_rate,
+                          max_rooms=args.max_rooms, idle_timeout=args.idle_timeout,
+                          max_spectators=args.max_spectators, spectator_delay=args.spectator_delay)
+
+    def signal_handler(sig, frame):
+        print("\nEncerrando...")
+        manager.running = False
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if not manager.start():
+        raise SystemExit(1)
+    try:
+        last_stats = time.monotonic()
+        while manager.running and manager.server.running:
+            manager.poll()
+            if args.stats_interval > 0 and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                print_stats(manager)
+            manager.wait()
+    finally:
+        manager.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import socket
+
+
+# Tamanho inicial do buffer de recepção por conexão
+DEFAULT_BUFFER_SIZE = 64 * 1024
+# Maior frame aceito; um prefixo de tamanho acima disso derruba a conexão
+DEFAULT_MAX_FRAME_SIZE = 1024 * 1024
+# Espaço livre mínimo no fim do buffer antes de um recv_into
+MIN_RECV_SPACE = 4096
+
+# Prefixo de tamanho de cada frame (big-endian)
+LENGTH_PREFIX_SIZE = 4
+
+
+def send_vectored(sock: socket.socket, buffers: list) -> int:
+    """Envia vários buffers com uma única syscall (sendmsg/writev quando disponível)."""
+    if len(buffers) == 1:
+        return sock.send(buffers[0])
+    if hasattr(sock, 'sendmsg'):
+        return sock.sendmsg(buffers)
+    # Windows não tem sendmsg: junta e envia de uma vez
+    return sock.send(b''.join(buffers))
+
+
+class FrameTooLargeError(ValueError):
+    """Prefixo de tamanho acima do máximo configurado (stream corrompido ou peer malicioso)."""
+
+
+class FrameBuffer:
+    """Buffer de recepção pré-alocado com framing por prefixo de tamanho de 4 bytes.
+
+    Os dados entram via recv_into direto no espaço livre e os payloads saem como
+    fatias de memoryview, sem cópias. O conteúdo só é compactado para o início
+    quando falta espaço no fim do buffer.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_BUFFER_SIZE,
+                 max_frame_size: int = DEFAULT_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray(max(capacity, MIN_RECV_SPACE))
+        self._view = memoryview(self._buf)
+        self._start = 0  # primeiro byte ainda não consumido
+        self._end = 0    # fim dos dados válidos
+
+    @property
+    def pending(self) -> int:
+        """Bytes recebidos que ainda não formam um frame completo."""
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def recv_from(self, sock: socket.socket) -> int:
+        """Lê do socket direto para o buffer. Retorna 0 quando o peer fecha a conexão."""
+        self._reserve(MIN_RECV_SPACE)
+        received = sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def feed(self, data) -> None:
+        """Copia bytes já recebidos por outro caminho para o buffer."""
+        size = len(data)
+        self._reserve(size)
+        self._view[self._end:self._end + size] = data
+        self._end += size
+
+    def frames(self):
+        """Itera sobre os payloads completos.
+
+        Cada payload é um memoryview válido apenas até a próxima recepção.
+        Levanta FrameTooLargeError se o prefixo de tamanho passar do máximo.
+        """
+        view = self._view
+        while self._end - self._start >= LENGTH_PREFIX_SIZE:
+            start = self._start
+            length = int.from_bytes(view[start:start + LENGTH_PREFIX_SIZE], byteorder='big')
+
+            if length > self.max_frame_size:
+                raise FrameTooLargeError(f"frame de {length} bytes (máximo {self.max_frame_size})")
+
+            frame_end = start + LENGTH_PREFIX_SIZE + length
+            if frame_end > self._end:
+                # Frame incompleto: garante espaço para ele chegar inteiro
+                self._reserve(frame_end - self._end)
+                break
+
+            self._start = frame_end
+            yield view[start + LENGTH_PREFIX_SIZE:frame_end]
+
+        if self._start == self._end:
+            # Buffer vazio: volta ao início sem copiar nada
+            self._start = self._end = 0
+
+    def _reserve(self, size: int) -> None:
+        """Garante `size` bytes livres no fim, compactando ou crescendo se necessário."""
+        if len(self._buf) - self._end >= size:
+            return
+
+        pending = self._end - self._start
+        needed = pending + size
+
+        if needed > len(self._buf):
+            # Cresce (limitado pelo maior frame possível) em vez de compactar
+            limit = self.max_frame_size + LENGTH_PREFIX_SIZE + MIN_RECV_SPACE
+            new_size = min(max(len(self._buf) * 2, needed), max(limit, needed))
+            new_buf = bytearray(new_size)
+            new_buf[:pending] = self._view[self._start:self._end]
+            self._buf = new_buf
+            self._view = memoryview(new_buf)
+        elif self._start:
+            self._view[:pending] = self._view[self._start:self._end]
+
+        self._start = 0
+        self._end = pending
@@ -0,0 +1,595 @@
+"""Proxy de degradação de rede para testes locais (latência, jitter, perda, banda).
+
+Fica entre o TCPClient e o TCPServer: o cliente conecta no proxy, o proxy
+conecta no servidor e repassa os dois sentidos, TCP e UDP, atrasando cada
+frame ou datagrama conforme um perfil (ex.: '3g', 'wifi-congested').
+
+- TCP: nada se perde nem muda de ordem (o kernel retransmitiria). A perda vira
+  um atraso extra de retransmissão e segura os frames seguintes (head-of-line).
+- UDP: perda (em rajadas, modelo de Gilbert), duplicação, reordenação e descarte
+  no fim da fila quando a banda não dá conta.
+
+O proxy lê os frames do servidor e troca a porta do udp_token pela sua, para
+que o UDP do cliente também passe por ele (inclusive com workers em outras portas).
+
+Uso (a partir de Code/):
+    python -m network.impairment --target 127.0.0.1:5555 --listen 5600 --profile 3g
+    python -m network.impairment --target 127.0.0.1:5555 --schedule broadband:20,wifi-congested:10
+
+Em testes: ImpairmentProxy(('127.0.0.1', 5555), profile='3g').start() e conectar
+o cliente em proxy.port.
+"""
+import argparse
+import heapq
+import itertools
+import random
+import selectors
+import signal
+import socket
+import threading
+import time
+
+from network.protocol import CODEC_JSON, decode_message, encode_message, frame
+from network.udp import MAX_DATAGRAM_SIZE
+
+
+# Retransmissão TCP de um segmento perdido: pelo menos o RTO mínimo do Linux
+MIN_RTO = 0.2
+# Fila máxima (em segundos de transmissão) antes de descartar datagramas com banda limitada
+DEFAULT_QUEUE_LIMIT = 0.25
+# Intervalo máximo do laço sem eventos (para checar stop())
+_IDLE_TIMEOUT = 0.05
+_LENGTH_BYTES = 4
+DISTRIBUTIONS = ('normal', 'uniform', 'pareto')
+
+
+class Profile:
+    """Condições de um enlace, aplicadas a cada sentido separadamente.
+
+    delay e jitter em segundos (só ida), loss/reorder/duplicate como probabilidades
+    por pacote, burst como tamanho médio das rajadas de perda (1 = perdas isoladas)
+    e bandwidth em bytes/s (0 = sem limite).
+    """
+
+    def __init__(self, delay: float = 0.0, jitter: float = 0.0, distribution: str = 'normal',
+                 loss: float = 0.0, burst: float = 1.0, reorder: float = 0.0, duplicate: float = 0.0,
+                 bandwidth: float = 0.0, queue_limit: float = DEFAULT_QUEUE_LIMIT):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"distribuição desconhecida: {distribution}")
+        self.delay = delay
+        self.jitter = jitter
+        self.distribution = distribution
+        self.loss = loss
+        self.burst = max(1.0, burst)
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.bandwidth = bandwidth
+        self.queue_limit = queue_limit
+
+    def replace(self, **changes) -> 'Profile':
+        values = dict(vars(self))
+        values.update(changes)
+        return Profile(**values)
+
+    def __repr__(self) -> str:
+        return (f"Profile(delay={self.delay * 1000:.0f}ms, jitter={self.jitter * 1000:.0f}ms "
+                f"{self.distribution}, loss={self.loss:.1%} burst={self.burst:g}, "
+                f"reorder={self.reorder:.1%}, duplicate={self.duplicate:.1%}, "
+                f"bandwidth={self.bandwidth * 8 / 1000:.0f}kbps)")
+
+
+# Perfis prontos (valores de um sentido; o RTT é o dobro do delay)
+PROFILES = {
+    'perfect': Profile(),
+    'lan': Profile(delay=0.0005, jitter=0.0002),
+    'broadband': Profile(delay=0.015, jitter=0.002, loss=0.001),
+    'wifi': Profile(delay=0.005, jitter=0.004, distribution='pareto', loss=0.005, burst=2),
+    'wifi-congested': Profile(delay=0.02, jitter=0.02, distribution='pareto', loss=0.03, burst=4,
+                              reorder=0.01, bandwidth=250_000),
+    '4g': Profile(delay=0.03, jitter=0.01, loss=0.005, burst=2, bandwidth=1_500_000),
+    '3g': Profile(delay=0.1, jitter=0.03, loss=0.02, burst=3, reorder=0.005, bandwidth=90_000),
+    'satellite': Profile(delay=0.3, jitter=0.01, loss=0.005, bandwidth=500_000),
+    'transatlantic': Profile(delay=0.045, jitter=0.003, loss=0.002),
+}
+
+
+def get_profile(profile: 'Profile | str') -> Profile:
+    if isinstance(profile, Profile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"perfil desconhecido: {profile} ({', '.join(PROFILES)})") from None
+
+
+class LinkShaper:
+    """Um sentido de um enlace: calcula quando (e se) cada pacote chega do outro lado."""
+
+    def __init__(self, profile: Profile, rng: random.Random, reliable: bool):
+        self.profile = profile
+        self.rng = rng
+        self.reliable = reliable
+        self._busy_until = 0.0    # fim da transmissão do último pacote (banda)
+        self._last_arrival = 0.0  # TCP entrega em ordem
+        self._bad_state = False   # Gilbert: dentro de uma rajada de perdas
+        self.packets = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.reordered = 0
+        self.retransmitted = 0
+        self._delay_sum = 0.0
+
+    def _lost(self) -> bool:
+        profile = self.profile
+        if profile.loss <= 0:
+            return False
+        if profile.burst <= 1:
+            return self.rng.random() < profile.loss
+        # Cadeia de dois estados com rajadas de tamanho médio `burst` e perda média `loss`
+        leave = 1 / profile.burst
+        enter = min(1.0, profile.loss * leave / max(1e-9, 1 - profile.loss))
+        if self._bad_state:
+            self._bad_state = self.rng.random() >= leave
+        else:
+            self._bad_state = self.rng.random() < enter
+        return self._bad_state
+
+    def _latency(self) -> float:
+        profile = self.profile
+        jitter = profile.jitter
+        if jitter <= 0:
+            return profile.delay
+        if profile.distribution == 'uniform':
+            sample = self.rng.uniform(-jitter, jitter)
+        elif profile.distribution == 'pareto':
+            # Cauda longa, sempre para cima, com média igual a jitter
+            sample = 2 * jitter * (self.rng.paretovariate(3.0) - 1)
+        else:
+            sample = self.rng.gauss(0.0, jitter)
+        return max(0.0, profile.delay + sample)
+
+    def schedule(self, size: int, now: float) -> list[float]:
+        """Momentos de chegada do pacote: vazio = perdido, dois = duplicado."""
+        profile = self.profile
+        self.packets += 1
+        self.bytes += size
+
+        departure = now
+        if profile.bandwidth > 0:
+            start = max(now, self._busy_until)
+            if not self.reliable and start - now > profile.queue_limit:
+                self.dropped += 1  # fila cheia: descarte no fim da fila
+                return []
+            self._busy_until = start + size / profile.bandwidth
+            departure = self._busy_until
+
+        latency = self._latency()
+        if self._lost():
+            if not self.reliable:
+                self.dropped += 1
+                return []
+            # TCP: o segmento chega depois da retransmissão
+            self.retransmitted += 1
+            latency += max(MIN_RTO, 2 * (profile.delay + profile.jitter))
+
+        arrival = departure + latency
+        if self.reliable:
+            arrival = max(arrival, self._last_arrival)
+            self._last_arrival = arrival
+        elif profile.reorder > 0 and self.rng.random() < profile.reorder:
+            # Segura este datagrama para que os próximos passem na frente
+            self.reordered += 1
+            arrival += max(0.005, profile.delay)
+        self._delay_sum += arrival - now
+
+        arrivals = [arrival]
+        if not self.reliable and profile.duplicate > 0 and self.rng.random() < profile.duplicate:
+            self.duplicated += 1
+            arrivals.append(arrival + self._latency() * 0.1)
+        return arrivals
+
+    def snapshot(self) -> dict:
+        delivered = self.packets - self.dropped
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'dropped': self.dropped,
+            'duplicated': self.duplicated,
+            'reordered': self.reordered,
+            'retransmitted': self.retransmitted,
+            'mean_delay_ms': self._delay_sum / delivered * 1000 if delivered else 0.0,
+        }
+
+
+class _TcpLink:
+    """Uma conexão TCP repassada: cliente <-> proxy <-> servidor."""
+
+    def __init__(self, client: socket.socket, upstream: socket.socket, up: LinkShaper, down: LinkShaper):
+        self.client = client
+        self.upstream = upstream
+        self.shapers = {client: up, upstream: down}  # sentido de quem lê
+        self.peers = {client: upstream, upstream: client}
+        self.buffers = {client: bytearray(), upstream: bytearray()}
+        self.outgoing = {client: bytearray(), upstream: bytearray()}
+        self.closed = False
+
+
+class ImpairmentProxy:
+    """Proxy TCP + UDP com degradação configurável, numa thread própria."""
+
+    def __init__(self, target: tuple[str, int], profile: Profile | str = 'lan',
+                 listen_host: str = '127.0.0.1', listen_port: int = 0, udp: bool = True,
+                 seed: int | None = None):
+        self.target = target
+        self.profile = get_profile(profile)
+        self.listen_host = listen_host
+        self.port = listen_port
+        self.udp_enabled = udp
+        self.rng = random.Random(seed)
+        self.running = False
+        self._lock = threading.Lock()
+        self._selector: selectors.BaseSelector | None = None
+        self._thread: threading.Thread | None = None
+        self._listener: socket.socket | None = None
+        self._udp: socket.socket | None = None
+        self._links: dict[socket.socket, _TcpLink] = {}
+        # UDP: um socket para o servidor por endereço de cliente (o servidor vê origens distintas)
+        self._udp_sessions: dict[tuple, socket.socket] = {}
+        self._udp_clients: dict[socket.socket, tuple] = {}
+        self._udp_ports: dict[int, int] = {}  # token -> porta UDP real anunciada pelo servidor
+        self._shapers: list[tuple[str, LinkShaper]] = []
+        self._udp_up: LinkShaper | None = None
+        self._udp_down: LinkShaper | None = None
+        self._events: list = []  # heap (chegada, seq, função, argumentos)
+        self._seq = itertools.count()
+
+    def start(self) -> bool:
+        try:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((self.listen_host, self.port))
+            self._listener.listen(64)
+            self._listener.setblocking(False)
+            self.port = self._listener.getsockname()[1]
+
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._listener, selectors.EVENT_READ, ('accept', None))
+            if self.udp_enabled:
+                self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._udp.bind((self.listen_host, self.port))
+                self._udp.setblocking(False)
+                self._selector.register(self._udp, selectors.EVENT_READ, ('udp_client', None))
+                self._udp_up = self._new_shaper('udp_up', reliable=False)
+                self._udp_down = self._new_shaper('udp_down', reliable=False)
+        except OSError as e:
+            print(f"[Impairment] Erro ao iniciar: {e}")
+            self._close_all()
+            return False
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        print(f"[Impairment] {self.listen_host}:{self.port} -> {self.target[0]}:{self.target[1]} "
+              f"com {self.profile}")
+        return True
+
+    def stop(self):
+        self.running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._close_all()
+
+    def set_profile(self, profile: Profile | str):
+        """Troca o perfil em funcionamento (vale para os próximos pacotes de todos os enlaces)."""
+        profile = get_profile(profile)
+        with self._lock:
+            self.profile = profile
+            for _, shaper in self._shapers:
+                shaper.profile = profile
+
+    def get_stats(self) -> dict:
+        """Contadores somados por sentido: tcp_up/tcp_down (cliente -> servidor e volta), udp_up/udp_down."""
+        with self._lock:
+            totals: dict[str, dict] = {}
+            for direction, shaper in self._shapers:
+                stats = shaper.snapshot()
+                total = totals.setdefault(direction, {key: 0 for key in stats})
+                delivered = stats['packets'] - stats['dropped']
+                total['mean_delay_ms'] += stats['mean_delay_ms'] * delivered
+                for key, value in stats.items():
+                    if key != 'mean_delay_ms':
+                        total[key] += value
+            for total in totals.values():
+                delivered = total['packets'] - total['dropped']
+                total['mean_delay_ms'] = total['mean_delay_ms'] / delivered if delivered else 0.0
+            return totals
+
+    def _new_shaper(self, direction: str, reliable: bool) -> LinkShaper:
+        shaper = LinkShaper(self.profile, self.rng, reliable)
+        with self._lock:
+            self._shapers.append((direction, shaper))
+        return shaper
+
+    def _schedule(self, shaper: LinkShaper, size: int, action, *args):
+        now = time.monotonic()
+        with self._lock:
+            arrivals = shaper.schedule(size, now)
+        for arrival in arrivals:
+            heapq.heappush(self._events, (arrival, next(self._seq), action, args))
+
+    def _run_loop(self):
+        while self.running:
+            now = time.monotonic()
+            while self._events and self._events[0][0] <= now:
+                _, _, action, args = heapq.heappop(self._events)
+                action(*args)
+
+            timeout = _IDLE_TIMEOUT
+            if self._events:
+                timeout = min(timeout, max(0.0, self._events[0][0] - time.monotonic()))
+            try:
+                ready = self._selector.select(timeout)
+            except OSError:
+                break
+            for key, mask in ready:
+                kind, link = key.data
+                if kind == 'accept':
+                    self._accept()
+                elif kind == 'udp_client':
+                    self._read_udp_client()
+                elif kind == 'udp_server':
+                    self._read_udp_server(key.fileobj)
+                else:
+                    if mask & selectors.EVENT_WRITE:
+                        self._drain(link, key.fileobj)
+                    if mask & selectors.EVENT_READ:
+                        self._read_tcp(link, key.fileobj)
+
+    # --- TCP ---
+
+    def _accept(self):
+        try:
+            client, _ = self._listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        try:
+            upstream = socket.create_connection(self.target, timeout=5.0)
+        except OSError as e:
+            print(f"[Impairment] Servidor indisponível: {e}")
+            client.close()
+            return
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(False)
+
+        link = _TcpLink(client, upstream, self._new_shaper('tcp_up', reliable=True),
+                        self._new_shaper('tcp_down', reliable=True))
+        for sock in (client, upstream):
+            self._links[sock] = link
+            self._selector.register(sock, selectors.EVENT_READ, ('tcp', link))
+
+    def _read_tcp(self, link: _TcpLink, sock: socket.socket):
+        if link.closed:
+            return
+        try:
+            data = sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            # O fechamento também atravessa o enlace: chega depois dos dados em trânsito
+            self._schedule(link.shapers[sock], 0, self._close_link, link)
+            return
+
+        buffer = link.buffers[sock]
+        buffer += data
+        # Um "pacote" por frame: atraso e banda por mensagem, como no jogo
+        while len(buffer) >= _LENGTH_BYTES:
+            end = _LENGTH_BYTES + int.from_bytes(buffer[:_LENGTH_BYTES], 'big')
+            if len(buffer) < end:
+                break
+            message = bytes(buffer[:end])
+            del buffer[:end]
+            if sock is link.upstream:
+                message = self._rewrite_udp_port(message)
+            self._schedule(link.shapers[sock], len(message), self._deliver_tcp, link, link.peers[sock],
+                           message)
+
+    def _rewrite_udp_port(self, message: bytes) -> bytes:
+        """udp_token do servidor: guarda a porta UDP real e anuncia a do proxy no lugar."""
+        payload = message[_LENGTH_BYTES:]
+        if not self._udp or not payload.startswith(b'{') or b'udp_token' not in payload:
+            return message
+        try:
+            msg = decode_message(payload)
+        except ValueError:
+            return message
+        if msg.get('type') != 'udp_token' or msg.get('token') is None:
+            return message
+        self._udp_ports[msg['token']] = msg.get('port') or self.target[1]
+        msg['port'] = self.port
+        return frame(encode_message(msg, CODEC_JSON))
+
+    def _deliver_tcp(self, link: _TcpLink, sock: socket.socket, message: bytes):
+        if link.closed:
+            return
+        outgoing = link.outgoing[sock]
+        outgoing += message
+        self._drain(link, sock)
+
+    def _drain(self, link: _TcpLink, sock: socket.socket):
+        outgoing = link.outgoing[sock]
+        try:
+            sent = sock.send(outgoing) if outgoing else 0
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._close_link(link)
+            return
+        del outgoing[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if outgoing else 0)
+        try:
+            self._selector.modify(sock, events, ('tcp', link))
+        except (KeyError, ValueError):
+            pass
+
+    def _close_link(self, link: _TcpLink):
+        if link.closed:
+            return
+        link.closed = True
+        for sock in (link.client, link.upstream):
+            self._links.pop(sock, None)
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+            sock.close()
+
+    # --- UDP ---
+
+    def _read_udp_client(self):
+        while True:
+            try:
+                data, address = self._udp.recvfrom(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            session = self._udp_sessions.get(address)
+            if session is None:
+                token = int.from_bytes(data[:4], 'big') if len(data) >= 4 else None
+                port = self._udp_ports.get(token, self.target[1])
+                session = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                session.connect((self.target[0], port))
+                session.setblocking(False)
+                self._udp_sessions[address] = session
+                self._udp_clients[session] = address
+                self._selector.register(session, selectors.EVENT_READ, ('udp_server', None))
+            self._schedule(self._udp_up, len(data), self._send_udp, session, None, data)
+
+    def _read_udp_server(self, session: socket.socket):
+        address = self._udp_clients.get(session)
+        while True:
+            try:
+                data = session.recv(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            self._schedule(self._udp_down, len(data), self._send_udp, self._udp, address, data)
+
+    @staticmethod
+    def _send_udp(sock: socket.socket, address: tuple | None, data: bytes):
+        try:
+            if address is None:
+                sock.send(data)
+            else:
+                sock.sendto(data, address)
+        except OSError:
+            pass  # perda de datagrama é aceitável neste canal
+
+    def _close_all(self):
+        for link in list(self._links.values()):
+            self._close_link(link)
+        for session in list(self._udp_clients):
+            session.close()
+        self._udp_sessions.clear()
+        self._udp_clients.clear()
+        for sock in (self._listener, self._udp):
+            if sock:
+                sock.close()
+        self._listener = None
+        self._udp = None
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+
+
+def _parse_schedule(value: str) -> list[tuple[str, float]]:
+    steps = []
+    for step in value.split(','):
+        name, _, seconds = step.strip().partition(':')
+        get_profile(name)
+        steps.append((name, float(seconds or 10)))
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy de degradação de rede do Ultra-Pong")
+    parser.add_argument('--target', required=True, metavar='HOST:PORTA', help="servidor (TCP e UDP)")
+    parser.add_argument('--listen', type=int, default=5600, help="porta TCP/UDP do proxy")
+    parser.add_argument('--host', default='127.0.0.1', help="endereço de bind")
+    parser.add_argument('--profile', default='lan', help=f"perfil ({', '.join(PROFILES)})")
+    parser.add_argument('--schedule', default=None, metavar='PERFIL:S,...',
+                        help="alterna perfis em ciclo (ex.: broadband:20,3g:10)")
+    parser.add_argument('--delay-ms', type=float, default=None, help="sobrescreve o atraso de ida")
+    parser.add_argument('--jitter-ms', type=float, default=None, help="sobrescreve o jitter")
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default=None, help="distribuição do jitter")
+    parser.add_argument('--loss', type=float, default=None, help="sobrescreve a perda (0-1)")
+    parser.add_argument('--burst', type=float, default=None, help="tamanho médio das rajadas de perda")
+    parser.add_argument('--reorder', type=float, default=None, help="sobrescreve a reordenação (0-1)")
+    parser.add_argument('--duplicate', type=float, default=None, help="sobrescreve a duplicação (0-1)")
+    parser.add_argument('--bandwidth-kbps', type=float, default=None, help="sobrescreve a banda (0 = sem limite)")
+    parser.add_argument('--no-udp', action='store_true', help="só TCP")
+    parser.add_argument('--seed', type=int, default=None, help="semente dos sorteios (reprodutível)")
+    parser.add_argument('--stats-interval', type=float, default=0.0,
+                        help="imprime os contadores a cada N segundos (0 = nunca)")
+    args = parser.parse_args()
+
+    target_host, _, target_port = args.target.rpartition(':')
+    if not target_host or not target_port.isdigit():
+        parser.error("--target deve ser HOST:PORTA")
+    try:
+        schedule = _parse_schedule(args.schedule) if args.schedule else [(args.profile, 0.0)]
+    except ValueError as e:
+        parser.error(str(e))
+
+    overrides = {}
+    for name, value in (('delay', args.delay_ms), ('jitter', args.jitter_ms)):
+        if value is not None:
+            overrides[name] = value / 1000
+    for name in ('distribution', 'loss', 'burst', 'reorder', 'duplicate'):
+        if getattr(args, name) is not None:
+            overrides[name] = getattr(args, name)
+    if args.bandwidth_kbps is not None:
+        overrides['bandwidth'] = args.bandwidth_kbps * 1000 / 8
+
+    def build(name: str) -> Profile:
+        return get_profile(name).replace(**overrides)
+
+    proxy = ImpairmentProxy((target_host, int(target_port)), build(schedule[0][0]), args.host,
+                            args.listen, udp=not args.no_udp, seed=args.seed)
+
+    def signal_handler(sig, frame):
+        print("\nEncerrando...")
+        proxy.running = False
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if not proxy.start():
+        raise SystemExit(1)
+    try:
+        step = 0
+        step_started = last_stats = time.monotonic()
+        while proxy.running:
+            time.sleep(0.1)
+            now = time.monotonic()
+            if len(schedule) > 1 and now - step_started >= schedule[step][1]:
+                step = (step + 1) % len(schedule)
+                step_started = now
+                proxy.set_profile(build(schedule[step][0]))
+                print(f"[Impairment] Perfil {schedule[step][0]}: {proxy.profile}")
+            if args.stats_interval > 0 and now - last_stats >= args.stats_interval:
+                last_stats = now
+                for direction, stats in proxy.get_stats().items():
+                    print(f"[Impairment] {direction}: {stats['packets']} pacotes, {stats['dropped']} perdidos, "
+                          f"{stats['reordered']} reordenados, atraso médio {stats['mean_delay_ms']:.1f} ms")
+    finally:
+        proxy.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Buffer de snapshots para interpolação no cliente (jitter buffer).
+
+Cada snapshot é guardado com o seu tick e o momento de chegada. A renderização
+amostra o buffer num ponto um pouco no passado (interp_delay ticks atrás do
+snapshot mais novo esperado) e interpola entre os dois snapshots em volta dele,
+em vez de puxar a bola uma fração fixa em direção ao último estado recebido.
+
+O atraso se adapta à variação do tempo de trânsito dos snapshots (jitter
+entre chegadas, como no RFC 3550): link estável, atraso pequeno; link com
+jitter, atraso maior para que sempre haja um snapshot depois do ponto amostrado.
+"""
+import time
+from collections import deque
+
+from network.clock import RESYNC_TICKS
+from settings import FPS
+
+
+# Snapshots guardados (~0,5 s a 60 ticks/s); acima disso os mais antigos são descartados
+MAX_SNAPSHOTS = 32
+# Limites do atraso de interpolação, em ticks (o mínimo deixa meio tick de folga
+# para a variação do frame de quem envia)
+MIN_DELAY_TICKS = 1.5
+MAX_DELAY_TICKS = 12.0
+# Margem do atraso: intervalo médio entre snapshots + N vezes o jitter
+JITTER_MULTIPLIER = 2.0
+# Ganhos dos filtros: jitter (RFC 3550), trânsito médio, intervalo entre snapshots e
+# o atraso, que anda devagar até o alvo para a bola não dar saltos no tempo
+JITTER_GAIN = 1 / 16
+TRANSIT_GAIN = 1 / 16
+INTERVAL_GAIN = 1 / 8
+DELAY_GAIN = 1 / 16
+# Campos interpolados; os demais vêm do snapshot mais novo
+INTERPOLATED_FIELDS = ('ball_x', 'ball_y', 'p1_y', 'p2_y')
+
+
+class SnapshotBuffer:
+    """Snapshots marcados por tick, amostrados em now - interp_delay."""
+
+    def __init__(self, tick_rate: int = FPS, max_snapshots: int = MAX_SNAPSHOTS):
+        self.tick_rate = tick_rate
+        self.max_snapshots = max_snapshots
+        self.snapshots: deque[tuple[int, dict]] = deque()
+        self.delay_ticks = MIN_DELAY_TICKS
+        self.jitter_ticks = 0.0
+        self.interval_ticks = 1.0
+        self.underruns = 0  # vezes em que o ponto amostrado passou do snapshot mais novo
+        self.overruns = 0   # snapshots descartados por excesso no buffer
+        self.late = 0       # snapshots que chegaram depois do ponto já amostrado
+        self.resyncs = 0
+        self._transit: float | None = None  # chegada - tick (em ticks), suavizado
+        self._last_transit = 0.0
+        self._render_tick: float | None = None
+        self._starved = False
+
+    def reset(self):
+        self.snapshots.clear()
+        self.delay_ticks = MIN_DELAY_TICKS
+        self.jitter_ticks = 0.0
+        self.interval_ticks = 1.0
+        self.underruns = 0
+        self.overruns = 0
+        self.late = 0
+        self.resyncs = 0
+        self._transit = None
+        self._last_transit = 0.0
+        self._render_tick = None
+        self._starved = False
+
+    @property
+    def delay_ms(self) -> float:
+        return self.delay_ticks * 1000.0 / self.tick_rate
+
+    def push(self, state: dict, received_at: float | None = None) -> bool:
+        """Guarda um snapshot. Retorna False se ele não trouxer um tick novo."""
+        tick = state.get('tick')
+        if tick is None:
+            return False
+        if self.snapshots and tick <= self.snapshots[-1][0]:
+            # Mesmo tick (host pausado) ou fora de ordem: o estado mais novo já está no buffer
+            return False
+
+        received_at = time.monotonic() if received_at is None else received_at
+        transit = received_at * self.tick_rate - tick
+        if self._transit is None or abs(transit - self._transit) > RESYNC_TICKS:
+            # Primeiro snapshot, ou o relógio do servidor saltou (pausa, partida nova)
+            if self._transit is not None:
+                self.resyncs += 1
+            self._transit = transit
+            self._render_tick = None
+        else:
+            self.jitter_ticks += JITTER_GAIN * (abs(transit - self._last_transit) - self.jitter_ticks)
+            self._transit += TRANSIT_GAIN * (transit - self._transit)
+        self._last_transit = transit
+
+        if self.snapshots:
+            spacing = tick - self.snapshots[-1][0]
+            self.interval_ticks += INTERVAL_GAIN * (spacing - self.interval_ticks)
+        if self._render_tick is not None and tick <= self._render_tick:
+            self.late += 1
+
+        self.snapshots.append((tick, state))
+        if len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popleft()
+            self.overruns += 1
+
+        target = self.interval_ticks + JITTER_MULTIPLIER * self.jitter_ticks
+        target = min(MAX_DELAY_TICKS, max(MIN_DELAY_TICKS, target))
+        self.delay_ticks += DELAY_GAIN * (target - self.delay_ticks)
+        return True
+
+    def sample(self, now: float | None = None) -> dict | None:
+        """Campos interpolados no ponto now - interp_delay, ou None com o buffer vazio."""
+        if not self.snapshots:
+            return None
+        now = time.monotonic() if now is None else now
+        render_tick = now * self.tick_rate - self._transit - self.delay_ticks
+        # O ponto amostrado nunca volta no tempo (o trânsito médio oscila um pouco)
+        if self._render_tick is not None and render_tick < self._render_tick:
+            render_tick = self._render_tick
+        self._render_tick = render_tick
+
+        # Descarta o que já ficou para trás, mantendo o snapshot logo antes do ponto
+        snapshots = self.snapshots
+        while len(snapshots) >= 2 and snapshots[1][0] <= render_tick:
+            snapshots.popleft()
+
+        older_tick, older = snapshots[0]
+        if len(snapshots) == 1 or render_tick <= older_tick:
+            if render_tick > older_tick and not self._starved:
+                self._starved = True
+                self.underruns += 1
+            return {field: older.get(field) for field in INTERPOLATED_FIELDS}
+        self._starved = False
+
+        newer_tick, newer = snapshots[1]
+        if (older.get('score_t1'), older.get('score_t2')) != (newer.get('score_t1'), newer.get('score_t2')):
+            # Gol entre os dois: a bola foi recolocada no centro, não atravessa a tela
+            return {field: newer.get(field) for field in INTERPOLATED_FIELDS}
+
+        alpha = (render_tick - older_tick) / (newer_tick - older_tick)
+        sample = {}
+        for field in INTERPOLATED_FIELDS:
+            a, b = older.get(field), newer.get(field)
+            sample[field] = b if a is None or b is None else a + (b - a) * alpha
+        return sample
+
+    def snapshot(self) -> dict:
+        return {
+            'buffered': len(self.snapshots),
+            'delay_ms': self.delay_ms,
+            'jitter_ms': self.jitter_ticks * 1000.0 / self.tick_rate,
+            'underruns': self.underruns,
+            'overruns': self.overruns,
+            'late': self.late,
+            'resyncs': self.resyncs,
+        }
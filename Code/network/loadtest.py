@@ -0,0 +1,510 @@
+"""Teste de carga do servidor: centenas de bots headless jogando partidas 1v1.
+
+Cada bot fala o mesmo protocolo do TCPClient (hello, codec, canal UDP por token,
+join_room) e, depois do game_start, manda um input numerado com histórico a cada
+tick (60 Hz) e confirma os snapshots com state_ack, como o cliente do jogo. Os bots
+rodam em asyncio, repartidos entre processos (--processes), para que o gerador de
+carga não seja o gargalo.
+
+Medidas:
+- vazão: mensagens e bytes por segundo nos dois sentidos, snapshots por segundo;
+- latência de entrega: do envio de um input até o snapshot que o confirma
+  (p{slot}_ack), e o RTT de ping/pong; p50, p99, p99.9 e máximo;
+- servidor: CPU (% de um núcleo) e memória residente do processo e dos filhos
+  (workers), lidos de /proc (só Linux; --spawn ou --server-pid).
+
+Uso (a partir de Code/):
+    python -m network.loadtest --spawn --bots 200 --duration 30
+    python -m network.loadtest --target 127.0.0.1:5555 --server-pid 4242 --bots 400 --json run.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from network.network_handler import DEFAULT_DELIVERY
+from network.prediction import INPUT_HISTORY
+from network.protocol import (CODEC_BINARY, CODEC_JSON, SUPPORTED_CODECS, decode_message,
+                              encode_message, frame, hello_message)
+from network.snapshot import DeltaDecoder
+from network.udp import SequenceCounter, SequenceFilter, pack_datagrams, unpack_datagram
+from settings import FPS
+
+
+DEFAULT_BOTS = 100
+DEFAULT_DURATION = 20.0
+# Tempo para espalhar as conexões (evita uma rajada de connect no backlog do listen)
+DEFAULT_RAMP = 2.0
+# Segundos descartados no início da medição (conexões, countdown do primeiro saque)
+DEFAULT_WARMUP = 3.0
+PING_INTERVAL = 1.0
+# Inputs guardados à espera do ack antes de descartar os mais antigos (~2 s)
+MAX_PENDING_INPUTS = 120
+# udp_hello reenviado a cada N ticks (~100 ms) até o udp_ready, como no TCPClient
+UDP_HELLO_TICKS = 6
+UDP_HELLO_ATTEMPTS = 30
+# Espera pelo servidor iniciado com --spawn
+SPAWN_TIMEOUT = 10.0
+
+
+class BotStats:
+    """Contadores e amostras de latência de todos os bots de um processo."""
+
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.disconnected = 0
+        self.udp_ready = 0
+        self.matches = 0
+        self.sent = 0
+        self.received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+        self.input_ack_ms: list[float] = []
+        self.rtt_ms: list[float] = []
+        self.cpu_seconds = 0.0  # CPU do próprio processo gerador na janela de medição
+        self.measuring = False
+
+    def merge(self, other: dict):
+        for key, value in other.items():
+            if isinstance(value, list):
+                getattr(self, key).extend(value)
+            elif key != 'measuring':
+                setattr(self, key, getattr(self, key) + value)
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class _UdpChannel(asyncio.DatagramProtocol):
+    def __init__(self, bot: 'Bot'):
+        self.bot = bot
+
+    def datagram_received(self, data: bytes, addr):
+        self.bot.on_datagram(data)
+
+
+class Bot:
+    """Um cliente headless: uma conexão TCP (e UDP, se oferecido) e um paddle aleatório."""
+
+    def __init__(self, host: str, port: int, stats: BotStats, codec: str, udp: bool, seed: int):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.preferred_codec = codec
+        self.udp_enabled = udp
+        self.rng = random.Random(seed)
+        self.codec = CODEC_JSON
+        self.writer: asyncio.StreamWriter | None = None
+        self.udp: asyncio.DatagramTransport | None = None
+        self.udp_token: int | None = None
+        self.udp_ready = False
+        self._udp_seq = SequenceCounter()
+        self._udp_filter = SequenceFilter()
+        self._udp_hellos = 0
+        self.slot: int | None = None
+        self.playing = False
+        self.decoder = DeltaDecoder()
+        self.direction = 0
+        self.seq = 0
+        self.pending: dict[int, tuple[float, int]] = {}  # seq -> (envio, direção)
+        self._next_ping = 0.0
+
+    async def run(self, deadline: float):
+        try:
+            reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            self.stats.failed += 1
+            return
+        self.stats.connected += 1
+        sock = self.writer.get_extra_info('socket')
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send(hello_message(self.preferred_codec, udp=self.udp_enabled))
+        self.send({'type': 'join_room', 'room': None})  # qualquer sala pública, como o menu Join
+
+        ticker = asyncio.create_task(self._tick_loop(deadline))
+        try:
+            while time.monotonic() < deadline:
+                header = await asyncio.wait_for(reader.readexactly(4), deadline - time.monotonic())
+                payload = await reader.readexactly(int.from_bytes(header, 'big'))
+                if self.stats.measuring:
+                    self.stats.bytes_received += 4 + len(payload)
+                self.on_message(decode_message(payload))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            if time.monotonic() < deadline:
+                self.stats.disconnected += 1
+        finally:
+            ticker.cancel()
+            self.writer.close()
+            if self.udp:
+                self.udp.close()
+
+    def send(self, msg: dict):
+        if self.stats.measuring:
+            self.stats.sent += 1
+        if not DEFAULT_DELIVERY.get(msg['type'], True) and self.udp_ready:
+            self._send_datagram(msg)
+            return
+        data = frame(encode_message(msg, self.codec))
+        if self.stats.measuring:
+            self.stats.bytes_sent += len(data)
+        self.writer.write(data)
+
+    def _send_datagram(self, msg: dict):
+        record = (self._udp_seq.next(msg['type']), encode_message(msg, self.codec))
+        for datagram in pack_datagrams(self.udp_token, [record]):
+            if self.stats.measuring:
+                self.stats.bytes_sent += len(datagram)
+            self.udp.sendto(datagram)
+
+    async def _open_udp(self, port: int):
+        loop = asyncio.get_running_loop()
+        peer = self.writer.get_extra_info('peername')[0]
+        try:
+            self.udp, _ = await loop.create_datagram_endpoint(lambda: _UdpChannel(self),
+                                                              remote_addr=(peer, port))
+        except OSError:
+            self.udp = None
+
+    def on_datagram(self, data: bytes):
+        if self.stats.measuring:
+            self.stats.bytes_received += len(data)
+        unpacked = unpack_datagram(data)
+        if unpacked is None or unpacked[0] != self.udp_token:
+            return
+        for seq, payload in unpacked[1]:
+            try:
+                msg = decode_message(payload)
+            except ValueError:
+                continue
+            if self._udp_filter.accept(msg.get('type'), seq):
+                self.on_message(msg)
+
+    def on_message(self, msg: dict):
+        stats = self.stats
+        if stats.measuring:
+            stats.received += 1
+        msg_type = msg.get('type')
+
+        if msg_type in ('game_state', 'game_state_delta'):
+            state = self.decoder.apply(msg)
+            if state is None:
+                return
+            if stats.measuring:
+                stats.snapshots += 1
+            self.send({'type': 'state_ack', 'seq': state['seq']})
+            ack = state.get(f'p{self.slot}_ack')
+            sent = self.pending.pop(ack, None) if ack is not None else None
+            if sent is not None and stats.measuring:
+                stats.input_ack_ms.append((time.monotonic() - sent[0]) * 1000.0)
+            for seq in [seq for seq in self.pending if ack is not None and seq < ack]:
+                del self.pending[seq]
+
+        elif msg_type == 'pong':
+            if stats.measuring:
+                stats.rtt_ms.append((time.monotonic() - msg.get('t', 0.0)) * 1000.0)
+
+        elif msg_type == 'codec':
+            if msg.get('codec') in SUPPORTED_CODECS:
+                self.codec = msg['codec']
+
+        elif msg_type == 'udp_token':
+            self.udp_token = msg.get('token')
+            asyncio.get_running_loop().create_task(self._open_udp(msg.get('port') or self.port))
+
+        elif msg_type == 'udp_ready':
+            if not self.udp_ready:
+                self.udp_ready = True
+                stats.udp_ready += 1
+
+        elif msg_type == 'assign_player':
+            self.slot = msg.get('player_id')
+
+        elif msg_type == 'game_start':
+            self.playing = True
+            stats.matches += 1
+
+    async def _tick_loop(self, deadline: float):
+        # Fase aleatória: clientes reais não mandam todos no mesmo instante
+        period = 1.0 / FPS
+        next_tick = time.monotonic() + self.rng.random() * period
+        ticks = 0
+        while next_tick < deadline:
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += period
+            ticks += 1
+            if (self.udp_token is not None and self.udp and not self.udp_ready
+                    and self._udp_hellos < UDP_HELLO_ATTEMPTS and ticks % UDP_HELLO_TICKS == 0):
+                self._udp_hellos += 1
+                self._send_datagram({'type': 'udp_hello'})
+            if not self.playing:
+                continue
+            self._send_input()
+
+    def _send_input(self):
+        now = time.monotonic()
+        if self.rng.random() < 0.1:
+            self.direction = self.rng.choice((-1, 0, 1))
+        self.seq += 1
+        history = [self.pending[seq][1] for seq in range(self.seq - 1, self.seq - 1 - INPUT_HISTORY, -1)
+                   if seq in self.pending]
+        self.pending[self.seq] = (now, self.direction)
+        if len(self.pending) > MAX_PENDING_INPUTS:
+            del self.pending[min(self.pending)]
+        msg = {'type': 'input', 'direction': self.direction, 'seq': self.seq}
+        if history:
+            msg['history'] = history
+        self.send(msg)
+        if now >= self._next_ping:
+            self._next_ping = now + PING_INTERVAL
+            self.send({'type': 'ping', 't': now})
+
+
+async def _run_bots(host: str, port: int, bots: int, first_seed: int, codec: str, udp: bool,
+                    start_at: float, ramp: float, warmup: float, duration: float) -> dict:
+    stats = BotStats()
+    # Início comum a todos os processos (relógio de parede): todos param juntos, e um bot
+    # não vê a sala fechar porque o adversário de outro processo terminou antes
+    start = time.monotonic() + (start_at - time.time())
+    await asyncio.sleep(max(0.0, start - time.monotonic()))
+    deadline = start + ramp + warmup + duration
+
+    async def launch(index: int):
+        await asyncio.sleep(max(0.0, start + ramp * index / max(1, bots) - time.monotonic()))
+        await Bot(host, port, stats, codec, udp, first_seed + index).run(deadline)
+
+    async def measure():
+        await asyncio.sleep(max(0.0, start + ramp + warmup - time.monotonic()))
+        stats.measuring = True
+        cpu_start = time.process_time()
+        await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+        stats.cpu_seconds = time.process_time() - cpu_start
+
+    await asyncio.gather(measure(), *(launch(index) for index in range(bots)))
+    return stats.to_dict()
+
+
+def _bot_process(args: tuple) -> dict:
+    return asyncio.run(_run_bots(*args))
+
+
+class ProcessSampler:
+    """CPU e memória de um processo e dos seus descendentes, lidos de /proc."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.peak_rss = 0
+        self._start: tuple[float, float] | None = None
+
+    @staticmethod
+    def available() -> bool:
+        return os.path.isdir('/proc/self')
+
+    def _tree(self) -> list[int]:
+        children: dict[int, list[int]] = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        tree, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(children.get(pid, ()))
+        return tree
+
+    def sample(self) -> tuple[float, int]:
+        """(segundos de CPU acumulados, bytes residentes) da árvore de processos."""
+        cpu, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                with open(f'/proc/{pid}/statm') as f:
+                    pages = int(f.read().split()[1])
+            except OSError:
+                continue
+            cpu += (int(fields[11]) + int(fields[12])) / self.clock_ticks
+            rss += pages * os.sysconf('SC_PAGE_SIZE')
+        self.peak_rss = max(self.peak_rss, rss)
+        return cpu, rss
+
+    def begin(self):
+        cpu, _ = self.sample()
+        self._start = (time.monotonic(), cpu)
+
+    def result(self) -> dict:
+        cpu, rss = self.sample()
+        elapsed = time.monotonic() - self._start[0]
+        return {
+            'cpu_percent': (cpu - self._start[1]) / elapsed * 100.0 if elapsed > 0 else 0.0,
+            'rss_mb': rss / 2 ** 20,
+            'peak_rss_mb': self.peak_rss / 2 ** 20,
+        }
+
+
+def _latency_summary(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+    return {
+        'count': len(ordered),
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'p999_ms': percentile(0.999),
+        'max_ms': ordered[-1] if ordered else 0.0,
+    }
+
+
+def spawn_server(port: int, bots: int, workers: int) -> subprocess.Popen:
+    """Sobe um servidor dedicado (python -m network.dedicated) e espera a porta abrir."""
+    code_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'network.dedicated', '--port', str(port),
+         '--max-rooms', str(max(1, bots // 2 + 1)), '--workers', str(workers)],
+        cwd=code_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limit = time.monotonic() + SPAWN_TIMEOUT
+    while time.monotonic() < limit:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"servidor não abriu a porta {port}")
+
+
+def run_load_test(host: str, port: int, bots: int = DEFAULT_BOTS, duration: float = DEFAULT_DURATION,
+                  processes: int = 1, codec: str = CODEC_BINARY, udp: bool = True,
+                  ramp: float = DEFAULT_RAMP, warmup: float = DEFAULT_WARMUP,
+                  server_pid: int | None = None, seed: int = 0) -> dict:
+    """Roda os bots contra host:port e devolve o relatório (vazão, latências, servidor)."""
+    processes = max(1, min(processes, bots))
+    start_at = time.time() + 0.5  # tempo para os processos subirem
+    jobs = []
+    for index in range(processes):
+        count = bots // processes + (1 if index < bots % processes else 0)
+        jobs.append((host, port, count, seed + index * 100_000, codec, udp, start_at, ramp, warmup,
+                     duration))
+
+    sampler = ProcessSampler(server_pid) if server_pid and ProcessSampler.available() else None
+    with multiprocessing.Pool(processes) as pool:
+        pending = pool.map_async(_bot_process, jobs)
+        if sampler:
+            time.sleep(max(0.0, start_at + ramp + warmup - time.time()))
+            sampler.begin()
+            while not pending.ready():
+                sampler.sample()
+                pending.wait(0.5)
+        results = pending.get()
+    server = sampler.result() if sampler else None
+
+    stats = BotStats()
+    for result in results:
+        stats.merge(result)
+    return {
+        'config': {'bots': bots, 'processes': processes, 'duration_s': duration, 'codec': codec,
+                   'udp': udp, 'tick_rate': FPS},
+        'connections': {'connected': stats.connected, 'failed': stats.failed,
+                        'disconnected': stats.disconnected, 'udp_ready': stats.udp_ready,
+                        'matches': stats.matches},
+        # Vazão e latências só da janela de medição (depois de ramp + warmup)
+        'throughput': {
+            'sent_per_s': stats.sent / duration,
+            'received_per_s': stats.received / duration,
+            'snapshots_per_s': stats.snapshots / duration,
+            'bytes_sent_per_s': stats.bytes_sent / duration,
+            'bytes_received_per_s': stats.bytes_received / duration,
+        },
+        'input_ack': _latency_summary(stats.input_ack_ms),
+        'rtt': _latency_summary(stats.rtt_ms),
+        'server': server,
+        # Perto de 100% por processo o gerador é o gargalo: aumente --processes
+        'generator': {'cpu_percent': stats.cpu_seconds / duration / processes * 100.0},
+    }
+
+
+def print_report(report: dict):
+    connections, throughput, server = report['connections'], report['throughput'], report['server']
+    print(f"[LoadTest] {connections['connected']} bots conectados ({connections['failed']} falhas, "
+          f"{connections['disconnected']} quedas, {connections['udp_ready']} com UDP), "
+          f"{connections['matches']} em partida")
+    print(f"[LoadTest] Vazão: {throughput['sent_per_s']:.0f} msg/s enviadas, "
+          f"{throughput['received_per_s']:.0f} msg/s recebidas, "
+          f"{throughput['snapshots_per_s']:.0f} snapshots/s, "
+          f"{throughput['bytes_received_per_s'] / 1024:.0f} KiB/s do servidor")
+    for name, label in (('input_ack', 'Input até o ack'), ('rtt', 'RTT')):
+        latency = report[name]
+        print(f"[LoadTest] {label}: p50 {latency['p50_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms, "
+              f"p99.9 {latency['p999_ms']:.1f} ms, máx {latency['max_ms']:.1f} ms "
+              f"({latency['count']} amostras)")
+    print(f"[LoadTest] Geradores: {report['generator']['cpu_percent']:.0f}% de CPU por processo")
+    if server:
+        print(f"[LoadTest] Servidor: {server['cpu_percent']:.0f}% de CPU, "
+              f"{server['rss_mb']:.1f} MiB residentes (pico {server['peak_rss_mb']:.1f} MiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do servidor do Ultra-Pong")
+    parser.add_argument('--target', default=None, metavar='HOST:PORTA', help="servidor já em execução")
+    parser.add_argument('--spawn', action='store_true', help="sobe um servidor dedicado local para o teste")
+    parser.add_argument('--port', type=int, default=5599, help="porta do servidor de --spawn")
+    parser.add_argument('--workers', type=int, default=1, help="workers do servidor de --spawn")
+    parser.add_argument('--server-pid', type=int, default=None, help="pid do servidor (CPU e memória)")
+    parser.add_argument('--bots', type=int, default=DEFAULT_BOTS, help="conexões simultâneas (2 por partida)")
+    parser.add_argument('--processes', type=int, default=0, help="processos geradores (0 = um por núcleo)")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="segundos de medição")
+    parser.add_argument('--ramp', type=float, default=DEFAULT_RAMP, help="segundos para abrir as conexões")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP, help="segundos descartados antes de medir")
+    parser.add_argument('--codec', choices=SUPPORTED_CODECS, default=CODEC_BINARY, help="codec oferecido no hello")
+    parser.add_argument('--no-udp', action='store_true', help="bots só por TCP")
+    parser.add_argument('--seed', type=int, default=0, help="semente dos inputs dos bots")
+    parser.add_argument('--json', default=None, metavar='ARQUIVO', help="grava o relatório em JSON")
+    args = parser.parse_args()
+
+    if args.spawn == bool(args.target):
+        parser.error("use --target HOST:PORTA ou --spawn")
+
+    process = None
+    if args.spawn:
+        process = spawn_server(args.port, args.bots, args.workers)
+        host, port, server_pid = '127.0.0.1', args.port, process.pid
+    else:
+        host, _, port = args.target.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error("--target deve ser HOST:PORTA")
+        port, server_pid = int(port), args.server_pid
+
+    try:
+        report = run_load_test(host, port, args.bots, args.duration, args.processes or os.cpu_count() or 1,
+                               args.codec, not args.no_udp, args.ramp, args.warmup, server_pid, args.seed)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=5)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Lobby de matchmaking: fila de espera por modo e atribuição de salas.
+
+Os jogadores se conectam uma vez ao lobby e pedem uma partida (queue_join com o
+modo). Quando a fila do modo tem jogadores suficientes, os mais antigos são
+agrupados, recebem match_found com o servidor de jogo e uma sala nomeada nova, e
+se conectam a ela com join_room (ver rooms.py / sharding.py).
+
+Uso (a partir de Code/):
+    python -m network.lobby --port 5550 --game-server 203.0.113.7:5555
+"""
+import argparse
+import heapq
+import itertools
+import secrets
+import signal
+import time
+
+from network.metrics import WaitStats
+from network.server import TCPServer
+
+
+# Jogadores por partida em cada modo
+MODES = {'1v1': 2, '2v2': 4}
+# As salas do servidor de jogo comportam dois jogadores; 2v2 só com servidores que suportem
+DEFAULT_MODES = ('1v1',)
+DEFAULT_LOBBY_PORT = 5550
+DEFAULT_MAX_QUEUED = 10000
+# Intervalo do laço do lobby (o I/O roda na thread do TCPServer)
+POLL_INTERVAL = 0.01
+# Partidas formadas por volta: uma rajada de jogadores não trava o laço
+MAX_MATCHES_PER_POLL = 128
+
+
+class WaitQueue:
+    """Fila de um modo: heap por ordem de chegada mais um índice por cliente.
+
+    Entrar é O(log n), sair é O(1) (a entrada vira lixo no heap e é descartada ao
+    aparecer no topo) e formar um grupo é O(k log n). O heap é reconstruído quando
+    o lixo passa do número de jogadores vivos.
+    """
+
+    def __init__(self, group_size: int):
+        self.group_size = group_size
+        self._heap: list[tuple[float, int, int]] = []  # (entrada na fila, seq, client_id)
+        self._entries: dict[int, tuple[float, int, int]] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, client_id: int) -> bool:
+        return client_id in self._entries
+
+    def push(self, client_id: int, enqueued_at: float):
+        entry = (enqueued_at, self._seq, client_id)
+        self._seq += 1
+        self._entries[client_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, client_id: int) -> bool:
+        if self._entries.pop(client_id, None) is None:
+            return False
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+        return True
+
+    def pop_group(self) -> list[tuple[int, float]] | None:
+        """Retira os group_size jogadores mais antigos: [(client_id, entrada na fila)]."""
+        if len(self._entries) < self.group_size:
+            return None
+        group = []
+        while len(group) < self.group_size:
+            entry = heapq.heappop(self._heap)
+            enqueued_at, _, client_id = entry
+            if self._entries.get(client_id) is not entry:
+                continue  # saiu da fila (ou entrou de novo depois)
+            del self._entries[client_id]
+            group.append((client_id, enqueued_at))
+        return group
+
+
+class LobbyServer:
+    """Servidor de matchmaking sobre um TCPServer (sem UDP nem simulação).
+
+    game_servers são os endereços (host, porta) anunciados aos jogadores; host
+    None significa "o mesmo endereço do lobby". As partidas são distribuídas entre
+    eles em rodízio.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = DEFAULT_LOBBY_PORT,
+                 game_servers: list[tuple[str | None, int]] | None = None,
+                 modes: tuple[str, ...] = DEFAULT_MODES, max_queued: int = DEFAULT_MAX_QUEUED):
+        self.server = TCPServer(host, port, max_clients=max_queued, udp=False)
+        self.game_servers = list(game_servers or [(None, 5555)])
+        self._next_game_server = itertools.cycle(self.game_servers)
+        self.queues: dict[str, WaitQueue] = {mode: WaitQueue(MODES[mode]) for mode in modes}
+        self.wait_stats: dict[str, WaitStats] = {mode: WaitStats() for mode in modes}
+        self.client_modes: dict[int, str] = {}  # client_id -> modo em que está na fila
+        self.matches = 0
+        self.running = False
+
+    def start(self) -> bool:
+        if not self.server.start():
+            return False
+        self.running = True
+        print(f"[Lobby] Filas abertas para {', '.join(self.queues)}")
+        return True
+
+    def stop(self):
+        self.running = False
+        self.server.stop()
+
+    def run(self):
+        while self.running and self.server.running:
+            self.poll()
+            time.sleep(POLL_INTERVAL)
+
+    def poll(self):
+        """Processa pedidos de fila e forma até MAX_MATCHES_PER_POLL partidas por modo."""
+        self.server.begin_batch()
+        for msg in self.server.get_messages():
+            self._handle_message(msg)
+
+        now = time.monotonic()
+        for mode, queue in self.queues.items():
+            for _ in range(MAX_MATCHES_PER_POLL):
+                group = queue.pop_group()
+                if group is None:
+                    break
+                self._start_match(mode, group, now)
+        self.server.flush()
+
+    def _handle_message(self, msg: dict):
+        msg_type = msg.get('type')
+        client_id = msg.get('_client_id', msg.get('client_id'))
+
+        if msg_type == 'client_disconnected':
+            self._leave_queue(client_id)
+
+        elif msg_type == 'queue_join':
+            mode = msg.get('mode', '1v1')
+            queue = self.queues.get(mode)
+            if queue is None:
+                self.server.send_to_client(client_id, {'type': 'queue_error', 'mode': mode,
+                                                       'reason': 'modo indisponível'})
+                return
+            self._leave_queue(client_id)
+            queue.push(client_id, time.monotonic())
+            self.client_modes[client_id] = mode
+            self.server.send_to_client(client_id, {'type': 'queued', 'mode': mode,
+                                                   'waiting': len(queue)})
+
+        elif msg_type == 'queue_leave':
+            self._leave_queue(client_id)
+
+    def _leave_queue(self, client_id: int):
+        mode = self.client_modes.pop(client_id, None)
+        if mode is not None:
+            self.queues[mode].remove(client_id)
+
+    def _start_match(self, mode: str, group: list[tuple[int, float]], now: float):
+        host, port = next(self._next_game_server)
+        # Sala nomeada e imprevisível: só os jogadores deste grupo entram nela
+        room = f"mm-{secrets.token_urlsafe(9)}"
+        self.matches += 1
+        for client_id, enqueued_at in group:
+            self.client_modes.pop(client_id, None)
+            self.wait_stats[mode].record(now - enqueued_at)
+            self.server.send_to_client(client_id, {
+                'type': 'match_found',
+                'mode': mode,
+                'host': host,
+                'port': port,
+                'room': room,
+            })
+            # kick_client entrega o match_found antes de fechar
+            self.server.kick_client(client_id)
+
+    def get_stats(self) -> dict:
+        """Jogadores conectados e na fila, partidas formadas e percentis de espera por modo."""
+        return {
+            'clients': self.server.get_client_count(),
+            'queued': {mode: len(queue) for mode, queue in self.queues.items()},
+            'matches': self.matches,
+            'wait': {mode: stats.snapshot() for mode, stats in self.wait_stats.items()},
+        }
+
+
+def _parse_address(value: str) -> tuple[str | None, int]:
+    host, _, port = value.rpartition(':')
+    return (host or None), int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lobby de matchmaking do Ultra-Pong")
+    parser.add_argument('--host', default='0.0.0.0', help="endereço de bind")
+    parser.add_argument('--port', type=int, default=DEFAULT_LOBBY_PORT, help="porta TCP do lobby")
+    parser.add_argument('--game-server', action='append', type=_parse_address, default=None,
+                        metavar='HOST:PORTA',
+                        help="servidor de salas anunciado aos jogadores (repetível; padrão :5555 no host do lobby)")
+    parser.add_argument('--modes', default=','.join(DEFAULT_MODES),
+                        help=f"modos com fila, separados por vírgula ({', '.join(MODES)})")
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED,
+                        help="conexões simultâneas no lobby")
+    parser.add_argument('--stats-interval', type=float, default=0.0,
+                        help="imprime filas e percentis de espera a cada N segundos (0 = nunca)")
+    args = parser.parse_args()
+
+    modes = tuple(mode.strip() for mode in args.modes.split(',') if mode.strip())
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"modos desconhecidos: {', '.join(unknown)}")
+
+    lobby = LobbyServer(args.host, args.port, args.game_server, modes=modes,
+                        max_queued=args.max_queued)
+
+    def signal_handler(sig, frame):
+        print("\nEncerrando...")
+        lobby.running = False
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if not lobby.start():
+        raise SystemExit(1)
+    try:
+        last_stats = time.monotonic()
+        while lobby.running and lobby.server.running:
+            lobby.poll()
+            if args.stats_interval > 0 and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                stats = lobby.get_stats()
+                for mode, wait in stats['wait'].items():
+                    print(f"[Lobby] {mode}: {stats['queued'][mode]} na fila, {wait['count']} pareados, "
+                          f"espera p50 {wait['p50_s']:.2f}s p90 {wait['p90_s']:.2f}s "
+                          f"p99 {wait['p99_s']:.2f}s")
+            time.sleep(POLL_INTERVAL)
+    finally:
+        lobby.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from collections import deque
+
+from network.metrics import ConnectionStats, SendStats
+
+
+class LoopbackClient:
+    """Cliente do próprio processo do host, ligado ao TCPServer em memória.
+
+    Troca os dicts de mensagem direto com o servidor: sem serialização, sem
+    socket e sem thread de recepção. Implementa a parte da interface do
+    TCPClient usada pelo NetworkHandler.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.client_id: int | None = None
+        self.connected = False
+        self.receive_queue: deque = deque()
+        self.send_stats = SendStats()
+        self.stats = ConnectionStats()  # sem bytes: as mensagens não são serializadas
+
+    def connect(self) -> bool:
+        if not self.server.running:
+            return False
+        self.client_id = self.server.attach_local(self)
+        self.connected = self.client_id is not None
+        return self.connected
+
+    def disconnect(self):
+        if self.connected and self.client_id is not None:
+            self.server.detach_local(self.client_id)
+        self.connected = False
+        self.client_id = None
+        self.receive_queue.clear()
+
+    def send(self, data: dict, reliable: bool = True) -> bool:
+        if not self.connected:
+            return False
+        self.send_stats.messages += 1
+        self.stats.record_out(data.get('type'), 0)
+        self.server.receive_local(self.client_id, data)
+        return True
+
+    def deliver(self, data: dict) -> bool:
+        """Chamado pelo servidor: enfileira a mensagem como se tivesse chegado pela rede."""
+        if not self.connected:
+            return False
+        # Cópia rasa: o mesmo dict pode ter sido enviado a outros clientes
+        self.receive_queue.append(dict(data))
+        self.stats.record_in(data.get('type'), 0)
+        return True
+
+    def begin_batch(self):
+        pass  # nada a coalescer: as mensagens já ficam na fila até o update()
+
+    def flush(self) -> bool:
+        return self.connected
+
+    def get_messages(self) -> list:
+        messages = list(self.receive_queue)
+        self.receive_queue.clear()
+        return messages
+
+    def get_send_stats(self) -> dict:
+        return self.send_stats.snapshot()
+
+    def get_connection_stats(self) -> dict:
+        stats = self.stats.snapshot()
+        stats.update({
+            'connected': self.connected,
+            'codec': None,
+            'udp': False,
+            'received_queue': len(self.receive_queue),
+            'batched_messages': 0,
+        })
+        return stats
+
+    @property
+    def is_connected(self) -> bool:
+        return self.connected
@@ -0,0 +1,179 @@
+import time
+from collections import deque
+
+
+# Amostras mantidas por TickStats para média e percentil
+DEFAULT_TICK_WINDOW = 600
+# Esperas mais recentes mantidas por WaitStats
+DEFAULT_WAIT_WINDOW = 2048
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SendStats:
+    """Contadores de envio: mensagens por flush e syscalls por segundo."""
+
+    def __init__(self):
+        self.messages = 0
+        self.syscalls = 0
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.dropped = 0  # mensagens substituídas na fila de um cliente lento
+        self.encodes = 0  # serializações (um broadcast codifica uma vez por codec)
+        self._window_start = time.monotonic()
+        self._window_syscalls = 0
+
+    def record_syscalls(self, count: int = 1):
+        self.syscalls += count
+        self._window_syscalls += count
+
+    def record_flush(self, messages: int):
+        self.flushes += 1
+        self.flushed_messages += messages
+
+    @property
+    def messages_per_flush(self) -> float:
+        return self.flushed_messages / self.flushes if self.flushes else 0.0
+
+    def syscalls_per_second(self, reset: bool = True) -> float:
+        """Taxa de syscalls desde a última leitura (ou desde a criação)."""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        rate = self._window_syscalls / elapsed if elapsed > 0 else 0.0
+        if reset:
+            self._window_start = now
+            self._window_syscalls = 0
+        return rate
+
+    def snapshot(self) -> dict:
+        return {
+            'messages': self.messages,
+            'syscalls': self.syscalls,
+            'flushes': self.flushes,
+            'messages_per_flush': self.messages_per_flush,
+            'syscalls_per_second': self.syscalls_per_second(reset=False),
+            'dropped': self.dropped,
+            'encodes': self.encodes,
+        }
+
+
+class TickStats:
+    """Tempo gasto por tick, numa janela das últimas N amostras."""
+
+    def __init__(self, window: int = DEFAULT_TICK_WINDOW):
+        self.ticks = 0
+        self.max_ms = 0.0
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        ms = seconds * 1000.0
+        self.ticks += 1
+        self._samples.append(ms)
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, fraction: float) -> float:
+        return _percentile(self._samples, fraction)
+
+    @property
+    def mean_ms(self) -> float:
+        return sum(self._samples) / len(self._samples) if self._samples else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            'ticks': self.ticks,
+            'mean_ms': self.mean_ms,
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms,
+        }
+
+
+class WaitStats:
+    """Tempos de espera (em segundos), p.ex. da entrada na fila até a partida encontrada."""
+
+    def __init__(self, window: int = DEFAULT_WAIT_WINDOW):
+        self.count = 0
+        self.max_s = 0.0
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self._samples.append(seconds)
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    def percentile(self, fraction: float) -> float:
+        return _percentile(self._samples, fraction)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self._samples)
+        return {
+            'count': self.count,
+            'p50_s': _percentile(ordered, 0.50),
+            'p90_s': _percentile(ordered, 0.90),
+            'p99_s': _percentile(ordered, 0.99),
+            'max_s': self.max_s,
+        }
+
+
+class ConnectionStats:
+    """Contadores de uma conexão: tráfego por tipo de mensagem nos dois sentidos e falhas.
+
+    Bytes por tipo incluem o enquadramento (prefixo TCP ou cabeçalho do registro UDP);
+    os totais bytes_in/bytes_out incluem também os cabeçalhos dos datagramas.
+    """
+
+    def __init__(self):
+        self.connected_at = time.monotonic()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in: dict[str, list[int]] = {}   # tipo -> [mensagens, bytes]
+        self.messages_out: dict[str, list[int]] = {}
+        self.decode_errors = 0
+        self.send_stalls = 0    # vezes em que o kernel não aceitou tudo e a fila de escrita começou
+        self.stalled_s = 0.0    # tempo total com a fila de escrita parada
+        self.reconnects = 0
+        self.last_receive: float | None = None
+
+    def record_in(self, msg_type: str | None, size: int):
+        counts = self.messages_in.get(msg_type)
+        if counts is None:
+            counts = self.messages_in[msg_type] = [0, 0]
+        counts[0] += 1
+        counts[1] += size
+        self.last_receive = time.monotonic()
+
+    def record_out(self, msg_type: str | None, size: int):
+        counts = self.messages_out.get(msg_type)
+        if counts is None:
+            counts = self.messages_out[msg_type] = [0, 0]
+        counts[0] += 1
+        counts[1] += size
+
+    @property
+    def last_receive_age(self) -> float | None:
+        """Segundos desde a última mensagem recebida (None se nada chegou)."""
+        return time.monotonic() - self.last_receive if self.last_receive is not None else None
+
+    def snapshot(self) -> dict:
+        return {
+            'uptime_s': time.monotonic() - self.connected_at,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'messages_in': sum(counts[0] for counts in self.messages_in.values()),
+            'messages_out': sum(counts[0] for counts in self.messages_out.values()),
+            'in_by_type': {str(msg_type): {'messages': counts[0], 'bytes': counts[1]}
+                           for msg_type, counts in self.messages_in.items()},
+            'out_by_type': {str(msg_type): {'messages': counts[0], 'bytes': counts[1]}
+                            for msg_type, counts in self.messages_out.items()},
+            'decode_errors': self.decode_errors,
+            'send_stalls': self.send_stalls,
+            'stalled_s': self.stalled_s,
+            'reconnects': self.reconnects,
+            'last_receive_age_s': self.last_receive_age,
+        }
@@ -1,43 +1,179 @@
+import random
+import secrets
+import threading
+import time
+
 from network.client import TCPClient
+from network.clock import ClockSync
+from network.interpolation import SnapshotBuffer
+from network.loopback import LoopbackClient
+from network.prediction import InputBuffer, expand_history
+from network.rollback import ROLLBACK_MESSAGES
 from network.server import TCPServer
+from network.snapshot import DeltaDecoder, DeltaEncoder
+
+
+# Modos de netcode: 'server' (host/servidor autoritativo, cliente prevê o próprio paddle)
+# ou 'rollback' (os dois lados simulam e ressimulam ao receber os inputs reais)
+NETCODE_MODES = ('server', 'rollback')
+
+# Entrega por tipo de mensagem: True = confiável (TCP), False = não-confiável (UDP).
+# Tipos ausentes são sempre confiáveis; sem canal UDP tudo cai no TCP.
+DEFAULT_DELIVERY = {
+    'input': False,
+    'opponent_input': False,
+    'game_state': False,
+    'game_state_delta': False,
+    'state_ack': False,
+    'ping': False,
+    'pong': False,
+    'rollback_input': False,  # o histórico em cada mensagem cobre as perdas
+}
+
+# Retomada de sessão: depois de uma queda o cliente tem RESUME_GRACE segundos para
+# reconectar e reassumir o slot com o token recebido no assign_player
+RESUME_GRACE = 10.0
+# Intervalo entre tentativas de reconexão e o timeout de cada connect
+RECONNECT_INTERVAL = 0.5
+RECONNECT_TIMEOUT = 1.0
+# Host em partida: prazo de uma conexão nova para mandar o resume antes de ser derrubada
+RESUME_HANDSHAKE_TIMEOUT = 1.0
+# Segundos sem receber nada durante a partida para dar o link como morto sem esperar o TCP
+LINK_TIMEOUT = 2.0
+# Host: espera máxima pelo ack do keyframe de resync antes de retomar a partida mesmo assim
+RESYNC_TIMEOUT = 1.0
+
+
+def pong_message(ping: dict, tick: int) -> dict:
+    """Resposta a um ping: devolve o relógio do cliente e o tick atual da simulação."""
+    return {'type': 'pong', 't': ping.get('t', 0.0), 'tick': tick}
 
 
 class NetworkHandler:
     def __init__(self, mode: str = 'client'):
         self.mode = mode
-        self.client: TCPClient | None = None
+        self.delivery: dict[str, bool] = dict(DEFAULT_DELIVERY)
+        self.client: TCPClient | LoopbackClient | None = None
         self.server: TCPServer | None = None
         self.player_id: int = 0
+        self.room_id: str | None = None  # sala atribuída por um servidor de salas
+        self.spectator_delay_ms = 0  # espectador: atraso do stream anunciado pelo servidor
+        # Matchmaking: modo pedido ao lobby, tamanho da fila e a partida encontrada
+        self.matchmaking_mode: str | None = None
+        self.queued_players = 0
+        self._lobby_host: str | None = None
+        self._match_found: dict | None = None
         self.opponent_direction: float = 0.0
         self.opponent_position: float | None = None  # Posição Y do paddle do oponente
+        # Host: inputs numerados do oponente, consumidos um por passo (ack no snapshot)
+        self.opponent_inputs = InputBuffer()
         self.game_state: dict = {}
+        # RTT/jitter e relógio de ticks do servidor, estimados por ping/pong (cliente)
+        self.clock = ClockSync()
+        self.server_tick = 0  # host: tick da simulação local, devolvido nos pongs
+        # Netcode da partida (escolhido pelo host e anunciado no game_start) e a semente
+        # dos sorteios da simulação, que precisa ser a mesma nos dois lados no rollback
+        self.netcode = 'server'
+        self.match_seed = 0
+        self._peer_messages: list[dict] = []
+        # Cliente: snapshots por tick para interpolação com atraso adaptativo
+        self.snapshots = SnapshotBuffer()
+        # Snapshots em delta: o host codifica contra o último ack de cada cliente
+        self.delta_encoder = DeltaEncoder()
+        self.delta_decoder = DeltaDecoder()
+        self._keyframe_requested = False
+        self._pending_ack: int | None = None
         self.connected = False
         self.waiting_for_opponent = False
         self.opponent_disconnected = False  # NEW: Track if opponent left during game
+        # Sessão: token da partida (vem no assign_player) e a retomada depois de uma queda.
+        # reconnecting: cliente reconectando / host esperando a volta do adversário
+        self.session_token: str | None = None
+        self.opponent_id: int | None = None  # host: client_id do adversário
+        self.reconnecting = False
+        self._resume_deadline = 0.0
+        self._reconnect_thread: threading.Thread | None = None
+        self._reconnected: TCPClient | None = None  # conexão nova, com o resume já enviado
+        self._awaiting_resumed = False
+        self._next_reconnect = 0.0
+        self._resume_candidates: dict[int, float] = {}  # host: conexões novas -> chegada
+        self._resync_client: int | None = None  # host: cliente que ainda não confirmou o keyframe
+        self._resync_deadline = 0.0
         # pause sync
         self.remote_pause_state = False
         self.pause_initiator = ""  # "host" or "client"
         self.pause_received = False  # Flag to know when we received a pause state
+        # Despacho por tipo de mensagem (servidor do host e cliente) e contadores por tipo;
+        # tipos sem handler são só contados. Um tipo novo entra com register_handler()
+        self.message_counts: dict[str, dict[str, int]] = {'server': {}, 'client': {}}
+        self.server_handlers: dict = {
+            'client_connected': self._on_client_connected,
+            'client_disconnected': self._on_client_disconnected,
+            'pause_request': self._on_pause_request,
+            'state_ack': self._on_state_ack,
+            'keyframe_request': self._on_keyframe_request,
+            'ping': self._on_ping,
+            'input': self._on_input,
+            'resume': self._on_resume,
+            'session_end': self._on_session_end_from_client,
+        }
+        self.client_handlers: dict = {
+            'welcome': self._on_welcome,
+            'assign_player': self._on_assign_player,
+            'room_assigned': self._on_room_assigned,
+            'spectate_start': self._on_spectate_start,
+            'spectate_error': self._on_spectate_error,
+            'queued': self._on_queued,
+            'match_found': self._on_match_found,
+            'queue_error': self._on_queue_error,
+            'game_start': self._on_game_start,
+            'game_state': self._apply_snapshot,
+            'game_state_delta': self._apply_snapshot,
+            'pong': self._on_pong,
+            'opponent_input': self._on_opponent_input,
+            'pause_state': self._on_pause_state,
+            'resumed': self._on_resumed,
+            'resume_rejected': self._on_resume_rejected,
+            'session_end': self._on_session_end,
+        }
+        for msg_type in ROLLBACK_MESSAGES:
+            self.server_handlers[msg_type] = self._on_peer_message_from_client
+            self.client_handlers[msg_type] = self._on_peer_message
     
-    def host(self, port: int = 5555) -> bool:
+    def host(self, port: int = 5555, loopback: bool = True, netcode: str = 'server') -> bool:
         # Ensure previous sockets/threads are closed before re-hosting
         self.disconnect()
 
+        if netcode not in NETCODE_MODES:
+            raise ValueError(f"netcode desconhecido: {netcode}")
         self.mode = 'host'
+        self.netcode = netcode
+        self.match_seed = random.getrandbits(32)
+        self._peer_messages = []
         self.connected = False
         self.waiting_for_opponent = False
         self.opponent_disconnected = False
         self.game_state = {}
+        self.delta_encoder = DeltaEncoder()
+        self.delta_decoder = DeltaDecoder()
+        self._keyframe_requested = False
+        self._pending_ack = None
         self.opponent_direction = 0.0
+        self.opponent_inputs.reset()
         self.remote_pause_state = False
         self.pause_initiator = ""
         self.pause_received = False
-        self.server = TCPServer('0.0.0.0', port, max_clients=2)
+        self.server_tick = 0
+        self._reset_session()
+        # Uma vaga além dos dois jogadores: a reconexão do adversário pode chegar
+        # antes de a conexão antiga cair
+        self.server = TCPServer('0.0.0.0', port, max_clients=3)
 
         if not self.server.start():
             return False
 
-        self.client = TCPClient('localhost', port)
+        # O jogador do host fala com o próprio servidor em memória (sem socket nem serialização)
+        self.client = LoopbackClient(self.server) if loopback else TCPClient('localhost', port)
         if not self.client.connect():
             self.server.stop()
             return False
@@ -47,7 +183,7 @@ class NetworkHandler:
         self.connected = True
         return True
     
-    def join(self, host: str, port: int = 5555) -> bool:
+    def join(self, host: str, port: int = 5555, room: str | None = None, role: str = 'player') -> bool:
         # Ensure previous sockets/threads are closed before joining again
         self.disconnect()
 
@@ -56,114 +192,510 @@ class NetworkHandler:
         self.waiting_for_opponent = False
         self.opponent_disconnected = False
         self.game_state = {}
+        self.delta_encoder = DeltaEncoder()
+        self.delta_decoder = DeltaDecoder()
+        self._keyframe_requested = False
+        self._pending_ack = None
         self.opponent_direction = 0.0
+        self.opponent_inputs.reset()
         self.remote_pause_state = False
         self.pause_initiator = ""
         self.pause_received = False
+        self.room_id = None
+        self.spectator_delay_ms = 0
+        self.netcode = 'server'
+        self.match_seed = 0
+        self._peer_messages = []
+        self.clock.reset()
+        self.snapshots.reset()
+        self.matchmaking_mode = None
+        self._match_found = None
+        self._reset_session()
         self.client = TCPClient(host, port)
         
         if not self.client.connect():
             return False
         
+        # Servidores de salas roteiam pela sala pedida (None = qualquer sala pública);
+        # um host comum ignora a mensagem
+        join_msg = {'type': 'join_room', 'room': room}
+        if role != 'player':
+            join_msg['role'] = role
+        self.client.send(join_msg)
+        
         self.waiting_for_opponent = True
         self.connected = True
         return True
     
+    def spectate(self, host: str, port: int = 5555, room: str | None = None) -> bool:
+        """Assiste a uma partida de um servidor de salas (ou de um relay): sem slot, sem input."""
+        if not self.join(host, port, room=room, role='spectator'):
+            return False
+        self.mode = 'spectator'
+        return True
+    
+    def find_match(self, lobby_host: str, lobby_port: int, mode: str = '1v1') -> bool:
+        """Entra na fila do lobby; ao receber match_found, conecta ao servidor de jogo (ver update)."""
+        if not self.join(lobby_host, lobby_port):
+            return False
+        
+        self.matchmaking_mode = mode
+        self.queued_players = 0
+        self._lobby_host = lobby_host
+        self.client.send({'type': 'queue_join', 'mode': mode})
+        return True
+    
     def update(self):
         if self.server:
             self._process_server_messages()
+            if self.opponent_id is not None:
+                self._check_opponent_session()
         
         if self.client:
             self._process_client_messages()
+            if self._match_found:
+                # O lobby fecha a conexão depois do match_found: segue para a sala atribuída
+                match, self._match_found = self._match_found, None
+                if not self.join(match.get('host') or self._lobby_host, match.get('port', 5555),
+                                 room=match.get('room')):
+                    self.opponent_disconnected = True
+                    return
+            if self.reconnecting and self.mode == 'client':
+                self._continue_reconnect()
             # Check if client lost connection to host
-            if not self.client.is_connected and self.connected:
-                self.opponent_disconnected = True
-                self.connected = False
+            elif self.connected and (not self.client.is_connected or self._link_lost()):
+                if self.session_token and self.mode == 'client':
+                    self._begin_reconnect()
+                else:
+                    self.opponent_disconnected = True
+                    self.connected = False
+            
+            if self.mode != 'host':
+                # Pausa e retomada param o tick do servidor: o tick estimado para junto
+                self.clock.set_frozen(self.remote_pause_state or self.is_resuming())
+            
+            if self.mode != 'host' and self.connected:
+                ping = self.clock.make_ping()
+                if ping:
+                    self.client.send(ping, reliable=self.is_reliable('ping'))
     
     def _process_server_messages(self):
         if not self.server:
             return
-        
-        for msg in self.server.get_messages():
-            msg_type = msg.get('type')
-            
-            if msg_type == 'client_connected':
-                if self.server.get_client_count() == 2:
-                    self.waiting_for_opponent = False
-                    self.server.send_to_client(msg['client_id'], {
-                        'type': 'assign_player',
-                        'player_id': 2
-                    })
-                    self.server.send_to_all({'type': 'game_start'})
-            
-            elif msg_type == 'client_disconnected':
-                self.waiting_for_opponent = True
-                self.opponent_disconnected = True  # Opponent left during game
-
-            elif msg_type == 'pause_request':
-                # Cliente pediu para pausar/despausar - broadcast para todos
-                paused = msg.get('paused', True)
-                initiator = "client" if msg.get('_client_id') != self.player_id else "local"
-                
-                self.remote_pause_state = paused
-                self.pause_initiator = initiator
-                self.pause_received = True
-
-                # Envia para todos exceto quem pediu
-                self.server.send_to_all_except(msg.get('_client_id'), {
-                    'type': 'pause_state',
-                    'paused': paused,
-                    'initiator': initiator
-                })
-            
-            elif msg_type == 'input':
-                client_id = msg.get('_client_id')
-                if client_id != self.player_id:
-                    self.opponent_direction = msg.get('direction', 0)
-                    # Armazena posição Y do paddle do oponente para sincronização
-                    if 'paddle_y' in msg:
-                        self.opponent_position = msg.get('paddle_y')
+        self._dispatch(self.server.get_messages(), self.server_handlers, self.message_counts['server'])
     
     def _process_client_messages(self):
         if not self.client:
             return
-        
-        for msg in self.client.get_messages():
+        self._dispatch(self.client.get_messages(), self.client_handlers, self.message_counts['client'])
+    
+    @staticmethod
+    def _dispatch(messages: list, handlers: dict, counts: dict):
+        for msg in messages:
             msg_type = msg.get('type')
-            
-            if msg_type == 'welcome':
-                if self.mode != 'host':
-                    self.player_id = msg.get('your_id', 0)
-            
-            elif msg_type == 'assign_player':
-                self.player_id = msg.get('player_id', 0)
-            
-            elif msg_type == 'game_start':
-                self.waiting_for_opponent = False
-            
-            elif msg_type == 'game_state':
-                self.game_state = msg
-            
-            elif msg_type == 'opponent_input':
-                self.opponent_direction = msg.get('direction', 0)
-                # Armazena posição Y do paddle do oponente para sincronização
-                if 'paddle_y' in msg:
-                    self.opponent_position = msg.get('paddle_y')
-
-            elif msg_type == 'pause_state':
-                # Recebeu estado de pausa do host
-                self.remote_pause_state = msg.get('paused', False)
-                self.pause_initiator = msg.get('initiator', 'host')
-                self.pause_received = True
-    
-    def send_input(self, direction: float, paddle_y: float | None = None):
-        """Envia input do jogador local com direção e posição Y do paddle."""
+            counts[msg_type] = counts.get(msg_type, 0) + 1
+            handler = handlers.get(msg_type)
+            if handler is not None:
+                handler(msg)
+    
+    def register_handler(self, msg_type: str, handler, side: str = 'client'):
+        """Trata um tipo de mensagem recebido pelo cliente ('client') ou pelo servidor do host ('server').
+        
+        O handler recebe o dict da mensagem; registrar de novo substitui o anterior.
+        """
+        handlers = self.server_handlers if side == 'server' else self.client_handlers
+        handlers[msg_type] = handler
+    
+    def get_message_stats(self) -> dict:
+        """Mensagens recebidas por tipo, no servidor do host e no cliente."""
+        return {side: dict(counts) for side, counts in self.message_counts.items()}
+    
+    # --- handlers do servidor (host) ---
+    
+    def _on_client_connected(self, msg: dict):
+        if msg['client_id'] == self.player_id:
+            return  # o próprio jogador do host
+        if self.opponent_id is not None:
+            # Partida em andamento: a conexão nova só pode reassumir o slot do adversário
+            self._resume_candidates[msg['client_id']] = time.monotonic()
+            return
+        if self.server.get_client_count() >= 2:
+            self.waiting_for_opponent = False
+            self.opponent_id = msg['client_id']
+            self.session_token = secrets.token_hex(8)
+            self.server.send_to_client(msg['client_id'], {
+                'type': 'assign_player',
+                'player_id': 2,
+                'session': self.session_token
+            })
+            self.server.send_to_all({'type': 'game_start', 'netcode': self.netcode,
+                                     'seed': self.match_seed})
+    
+    def _on_client_disconnected(self, msg: dict):
+        client_id = msg.get('client_id')
+        self.delta_encoder.remove_client(client_id)
+        if self._resume_candidates.pop(client_id, None) is not None:
+            return
+        if self.opponent_id is not None and client_id != self.opponent_id:
+            return  # conexão antiga do adversário, já substituída pela retomada
+        if client_id == self._resync_client:
+            self._resync_client = None
+        if self.session_token:
+            # A partida fica congelada esperando o adversário voltar com o token
+            self.reconnecting = True
+            self._resume_deadline = time.monotonic() + RESUME_GRACE
+            print(f"[Network] Oponente caiu: aguardando reconexão por {RESUME_GRACE:.0f}s")
+            return
+        self.waiting_for_opponent = True
+        self.opponent_disconnected = True  # Opponent left during game
+    
+    def _on_pause_request(self, msg: dict):
+        # Cliente pediu para pausar/despausar - broadcast para todos
+        paused = msg.get('paused', True)
+        initiator = "client" if msg.get('_client_id') != self.player_id else "local"
+        
+        self.remote_pause_state = paused
+        self.pause_initiator = initiator
+        self.pause_received = True
+
+        # Envia para todos exceto quem pediu
+        self.server.send_to_all_except(msg.get('_client_id'), {
+            'type': 'pause_state',
+            'paused': paused,
+            'initiator': initiator
+        })
+    
+    def _on_state_ack(self, msg: dict):
+        self.delta_encoder.ack(msg.get('_client_id'), msg.get('seq', 0))
+        if msg.get('_client_id') == self._resync_client:
+            # O primeiro ack da conexão nova é o do keyframe: a partida pode seguir
+            self._resync_client = None
+    
+    def _on_keyframe_request(self, msg: dict):
+        self.delta_encoder.request_keyframe(msg.get('_client_id'))
+    
+    def _on_ping(self, msg: dict):
+        self.server.send_to_client(msg.get('_client_id'), pong_message(msg, self.server_tick),
+                                   reliable=self.is_reliable('pong'))
+    
+    def _on_peer_message_from_client(self, msg: dict):
+        if msg.get('_client_id') == self.opponent_id:
+            self._peer_messages.append(msg)
+    
+    def _on_input(self, msg: dict):
+        client_id = msg.get('_client_id')
+        if client_id == self.opponent_id:
+            self.opponent_direction = msg.get('direction', 0)
+            if msg.get('seq') is not None:
+                # Cliente com predição: o host simula o paddle a partir dos inputs
+                # (os repetidos do histórico são descartados pelo buffer)
+                for seq, direction in expand_history(msg['seq'], self.opponent_direction,
+                                                     msg.get('history')):
+                    self.opponent_inputs.push(seq, direction)
+            # Armazena posição Y do paddle do oponente para sincronização
+            elif 'paddle_y' in msg:
+                self.opponent_position = msg.get('paddle_y')
+    
+    def _on_resume(self, msg: dict):
+        client_id = msg.get('_client_id')
+        if self._resume_candidates.pop(client_id, None) is None:
+            return
+        if not self.session_token or msg.get('session') != self.session_token:
+            print(f"[Network] Retomada recusada para o cliente {client_id}: token inválido")
+            self.server.send_to_client(client_id, {'type': 'resume_rejected', 'reason': 'sessão desconhecida'})
+            self.server.kick_client(client_id)
+            return
+        
+        previous, self.opponent_id = self.opponent_id, client_id
+        if not self.reconnecting:
+            # A conexão antiga ainda não tinha caído (meio-aberta): a nova a substitui
+            self.server.kick_client(previous)
+        self.delta_encoder.remove_client(previous)
+        self.reconnecting = False
+        self.server.send_to_client(client_id, {'type': 'resumed', 'player_id': 2})
+        if self.remote_pause_state and self.pause_initiator == 'host':
+            # A pausa feita durante a queda não chegou ao cliente
+            self.server.send_to_client(client_id, {'type': 'pause_state', 'paused': True, 'initiator': 'host'})
+        if self.netcode == 'server':
+            # Partida congelada até o cliente confirmar um keyframe (a conexão nova não tem base)
+            self._resync_client = client_id
+            self._resync_deadline = time.monotonic() + RESYNC_TIMEOUT
+            self.delta_encoder.request_keyframe(client_id)
+        print(f"[Network] Oponente reconectado (cliente {client_id}): sessão retomada")
+    
+    def _on_session_end_from_client(self, msg: dict):
+        if msg.get('_client_id') == self.opponent_id:
+            # Saída voluntária: a queda que vem a seguir não espera reconexão
+            self.session_token = None
+    
+    def _check_opponent_session(self):
+        """Host: prazos da retomada (candidatos, janela de reconexão, resync) e link silencioso."""
+        now = time.monotonic()
+        for client_id, connected_at in list(self._resume_candidates.items()):
+            if now - connected_at >= RESUME_HANDSHAKE_TIMEOUT:
+                del self._resume_candidates[client_id]
+                self.server.kick_client(client_id)
+        
+        if self.reconnecting:
+            if now >= self._resume_deadline:
+                print("[Network] Oponente não voltou a tempo: partida encerrada")
+                self.reconnecting = False
+                self.session_token = None
+                self.waiting_for_opponent = True
+                self.opponent_disconnected = True
+            return
+        
+        if self._resync_client is not None and now >= self._resync_deadline:
+            self._resync_client = None  # segue sem o ack; o keyframe continua até ele chegar
+        
+        if self.session_token:
+            stats = self.server.get_connection_stats(self.opponent_id).get(self.opponent_id)
+            age = stats['last_receive_age_s'] if stats else None
+            if age is not None and age > LINK_TIMEOUT:
+                print(f"[Network] Nada do oponente há {age:.1f}s: conexão dada como perdida")
+                self.server.kick_client(self.opponent_id)
+    
+    # --- handlers do cliente ---
+    
+    def _on_welcome(self, msg: dict):
+        if self.mode != 'host':
+            self.player_id = msg.get('your_id', 0)
+    
+    def _on_assign_player(self, msg: dict):
+        self.player_id = msg.get('player_id', 0)
+        self.session_token = msg.get('session')
+    
+    def _on_room_assigned(self, msg: dict):
+        self.room_id = msg.get('room')
+    
+    def _on_spectate_start(self, msg: dict):
+        self.room_id = msg.get('room')
+        self.spectator_delay_ms = msg.get('delay_ms', 0)
+    
+    def _on_spectate_error(self, msg: dict):
+        print(f"[Network] Servidor recusou o espectador: {msg.get('reason')}")
+        self.connected = False
+        self.opponent_disconnected = True
+    
+    def _on_queued(self, msg: dict):
+        self.queued_players = msg.get('waiting', 0)
+    
+    def _on_match_found(self, msg: dict):
+        self._match_found = msg
+    
+    def _on_queue_error(self, msg: dict):
+        print(f"[Network] Lobby recusou a fila: {msg.get('reason')}")
+        self.connected = False
+        self.opponent_disconnected = True
+    
+    def _on_game_start(self, msg: dict):
+        self.waiting_for_opponent = False
+        if self.mode != 'host':
+            # Servidores de salas não anunciam netcode: sempre autoritativo
+            self.netcode = msg.get('netcode', 'server')
+            self.match_seed = msg.get('seed', 0)
+    
+    def _on_peer_message(self, msg: dict):
+        self._peer_messages.append(msg)
+    
+    def _on_pong(self, msg: dict):
+        self.clock.on_pong(msg)
+    
+    def _on_opponent_input(self, msg: dict):
+        self.opponent_direction = msg.get('direction', 0)
+        # Armazena posição Y do paddle do oponente para sincronização
+        if 'paddle_y' in msg:
+            self.opponent_position = msg.get('paddle_y')
+    
+    def _on_pause_state(self, msg: dict):
+        # Recebeu estado de pausa do host
+        self.remote_pause_state = msg.get('paused', False)
+        self.pause_initiator = msg.get('initiator', 'host')
+        self.pause_received = True
+    
+    def _on_resumed(self, msg: dict):
+        self.reconnecting = False
+        self._awaiting_resumed = False
+        self.player_id = msg.get('player_id', self.player_id)
+        # O relógio ficou parado junto com o host: reestima a partir dos próximos pongs
+        self.clock.reset()
+        print("[Network] Sessão retomada")
+    
+    def _on_resume_rejected(self, msg: dict):
+        print(f"[Network] Host recusou a retomada: {msg.get('reason')}")
+        self._fail_resume()
+    
+    def _on_session_end(self, msg: dict):
+        # O host encerrou a partida: a queda que vem a seguir não é retomada
+        self.session_token = None
+    
+    # --- retomada de sessão (cliente) ---
+    
+    def _link_lost(self) -> bool:
+        """Cliente em partida sem receber nada (snapshots, pongs) há mais de LINK_TIMEOUT."""
+        if not self.session_token or self.mode != 'client':
+            return False
+        age = self.client.stats.last_receive_age
+        return age is not None and age > LINK_TIMEOUT
+    
+    def _begin_reconnect(self):
+        print(f"[Network] Conexão com o host perdida: tentando retomar a sessão por {RESUME_GRACE:.0f}s")
+        self.client.disconnect()
+        self.reconnecting = True
+        self._awaiting_resumed = False
+        self._resume_deadline = time.monotonic() + RESUME_GRACE
+        self._next_reconnect = 0.0
+        # Nada do stream antigo vale na conexão nova: o host manda um keyframe
+        self.delta_decoder = DeltaDecoder()
+        self.snapshots.reset()
+        self._keyframe_requested = False
+        self._pending_ack = None
+    
+    def _continue_reconnect(self):
+        """Uma tentativa de conexão por vez, em outra thread (o connect bloqueia)."""
+        if self._reconnect_thread is not None:
+            if self._reconnect_thread.is_alive():
+                return
+            self._reconnect_thread = None
+            if self._reconnected is not None:
+                # Conectou e mandou o resume: espera o resumed do host nessa conexão
+                self.client, self._reconnected = self._reconnected, None
+                self._awaiting_resumed = True
+                return
+        
+        now = time.monotonic()
+        if now >= self._resume_deadline:
+            print("[Network] Não foi possível retomar a sessão")
+            self._fail_resume()
+            return
+        
+        if self._awaiting_resumed:
+            if self.client.is_connected:
+                return
+            self.client.disconnect()  # caiu de novo antes do resumed
+            self._awaiting_resumed = False
+        
+        if now >= self._next_reconnect:
+            self._next_reconnect = now + RECONNECT_INTERVAL
+            self._reconnect_thread = threading.Thread(target=self._reconnect, args=(self.client,), daemon=True)
+            self._reconnect_thread.start()
+    
+    def _reconnect(self, previous: TCPClient):
+        client = TCPClient(*previous.server_addr, codec=previous.preferred_codec, udp=previous.udp_enabled,
+                           stats=previous.stats)
+        if not client.connect(timeout=RECONNECT_TIMEOUT):
+            return
+        if self._reconnect_thread is not threading.current_thread():
+            client.disconnect()  # sessão abandonada (disconnect/join) durante a tentativa
+            return
+        # Primeira mensagem depois do hello: o host só aceita a conexão com o token
+        client.send({'type': 'resume', 'session': self.session_token})
+        self._reconnected = client
+    
+    def _fail_resume(self):
+        self.reconnecting = False
+        self._awaiting_resumed = False
+        self.session_token = None
+        self.connected = False
+        self.opponent_disconnected = True
+    
+    def _reset_session(self):
+        self.session_token = None
+        self.opponent_id = None
+        self.reconnecting = False
+        self._reconnect_thread = None
+        self._reconnected = None
+        self._awaiting_resumed = False
+        self._resume_candidates.clear()
+        self._resync_client = None
+    
+    def begin_tick(self):
+        """Início do tick: os envios passam a ser acumulados por conexão até flush()."""
+        if self.server:
+            self.server.begin_batch()
+        if self.client:
+            self.client.begin_batch()
+    
+    def flush(self):
+        """Fim do tick: envia tudo o que foi acumulado com uma escrita por conexão."""
+        if self.client and self._pending_ack is not None:
+            self.client.send({'type': 'state_ack', 'seq': self._pending_ack},
+                             reliable=self.is_reliable('state_ack'))
+            self._pending_ack = None
+        
+        if self.server:
+            self.server.flush()
+        if self.client:
+            self.client.flush()
+    
+    @property
+    def rtt_ms(self) -> float:
+        """RTT suavizado até o servidor (0 no host)."""
+        return self.clock.rtt_ms
+    
+    @property
+    def jitter_ms(self) -> float:
+        """Variação média do RTT."""
+        return self.clock.jitter_ms
+    
+    @property
+    def estimated_server_tick(self) -> float | None:
+        """Tick em que a simulação do servidor está agora (None antes da primeira medição)."""
+        if self.mode == 'host':
+            return self.server_tick
+        return self.clock.estimated_server_tick()
+    
+    def get_send_stats(self) -> dict:
+        """Contadores de envio (mensagens por flush, syscalls por segundo) por papel."""
+        stats = {}
+        if self.server:
+            stats['server'] = self.server.get_send_stats()
+        if self.client:
+            stats['client'] = self.client.get_send_stats()
+        return stats
+    
+    def get_network_metrics(self) -> dict:
+        """Métricas de rede para overlays e exportadores.
+        
+        'client': a conexão deste jogador com o host/servidor (RTT, jitter, tráfego por
+        tipo, filas, falhas); 'server' (só no host): uma entrada por cliente remoto;
+        'snapshots': o jitter buffer; 'messages': mensagens despachadas por tipo.
+        """
+        metrics = {'mode': self.mode, 'player_id': self.player_id, 'netcode': self.netcode}
+        if self.client:
+            client = self.client.get_connection_stats()
+            client['rtt_ms'] = self.clock.rtt_ms
+            client['jitter_ms'] = self.clock.jitter_ms
+            metrics['client'] = client
+        if self.server:
+            metrics['server'] = self.server.get_connection_stats()
+        metrics['snapshots'] = self.snapshots.snapshot()
+        metrics['messages'] = self.get_message_stats()
+        return metrics
+    
+    def set_delivery(self, msg_type: str, reliable: bool):
+        """Define se um tipo de mensagem vai pelo canal confiável (TCP) ou não (UDP)."""
+        self.delivery[msg_type] = reliable
+    
+    def is_reliable(self, msg_type: str) -> bool:
+        return self.delivery.get(msg_type, True)
+    
+    def send_input(self, direction: float, paddle_y: float | None = None, seq: int | None = None,
+                   history: list[int] | None = None):
+        """Envia input do jogador local com direção, posição Y do paddle e o passo (seq) previsto.
+
+        history: direções dos passos anteriores ainda não confirmados, do mais novo ao mais antigo.
+        """
         msg = {'type': 'input', 'direction': direction}
         if paddle_y is not None:
             msg['paddle_y'] = paddle_y
+        if seq is not None:
+            msg['seq'] = seq
+        if history:
+            msg['history'] = history
         
         if self.client:
-            self.client.send(msg)
+            self.client.send(msg, reliable=self.is_reliable('input'))
         
         if self.server:
             opponent_msg = {
@@ -172,16 +704,68 @@ class NetworkHandler:
             }
             if paddle_y is not None:
                 opponent_msg['paddle_y'] = paddle_y
-            self.server.send_to_all_except(self.player_id, opponent_msg)
+            self.server.send_to_all_except(self.player_id, opponent_msg,
+                                           reliable=self.is_reliable('opponent_input'))
+    
+    def send_peer(self, msg: dict):
+        """Rollback: mensagem para o outro jogador (o host repassa direto, o cliente via host)."""
+        if self.server and self.is_host():
+            self.server.send_to_all_except(self.player_id, msg, reliable=self.is_reliable(msg['type']))
+        elif self.client:
+            self.client.send(msg, reliable=self.is_reliable(msg['type']))
+    
+    def take_peer_messages(self) -> list[dict]:
+        messages, self._peer_messages = self._peer_messages, []
+        return messages
+    
+    def _apply_snapshot(self, msg: dict):
+        """Reconstrói o estado completo a partir de keyframe/delta e confirma ao host."""
+        state = self.delta_decoder.apply(msg)
+        
+        if state is None:
+            # Delta sem base conhecida: pede keyframe uma vez e espera
+            if self.delta_decoder.awaiting_keyframe and not self._keyframe_requested:
+                self._keyframe_requested = True
+                self.client.send({'type': 'keyframe_request'})
+            return
+        
+        self._keyframe_requested = False
+        self.game_state = state
+        self.snapshots.push(state, msg.get('_received_at'))
+        if self.mode == 'spectator':
+            # O stream de espectador só tem keyframes: sem ack; a partida começa no primeiro
+            self.waiting_for_opponent = False
+            return
+        if 'seq' in state:
+            # O ack sai junto com o input do próximo tick (ver flush)
+            self._pending_ack = state['seq']
     
     def send_game_state(self, state: dict):
-        if self.server:
-            state['type'] = 'game_state'
-            self.server.send_to_all(state)
+        """Host: keyframe ou delta para cada cliente, conforme o último ack recebido."""
+        if not self.server:
+            return
+        
+        self.delta_encoder.push(state)
+        for client_id in self.server.get_client_ids():
+            # O cliente local do host não aplica snapshots; conexões sem resume ainda não jogam
+            if client_id == self.player_id or client_id in self._resume_candidates:
+                continue
+            msg = self.delta_encoder.encode_for(client_id)
+            self.server.send_to_client(client_id, msg, reliable=self.is_reliable(msg['type']))
+    
+    def request_keyframe(self, client_id: int | None = None):
+        """Força um snapshot completo no próximo envio."""
+        self.delta_encoder.request_keyframe(client_id)
     
     def get_opponent_direction(self) -> float:
         return self.opponent_direction
     
+    def next_opponent_direction(self) -> float:
+        """Direção do oponente para o próximo passo: no host, um input bufferizado por passo."""
+        if self.opponent_inputs.active:
+            return self.opponent_inputs.next()
+        return self.opponent_direction
+    
     def get_opponent_position(self) -> float | None:
         """Retorna a última posição Y conhecida do paddle do oponente."""
         return self.opponent_position
@@ -196,14 +780,36 @@ class NetworkHandler:
     def is_host(self) -> bool:
         return self.mode == 'host'
     
+    def is_spectator(self) -> bool:
+        return self.mode == 'spectator'
+    
     def is_ready(self) -> bool:
         return self.connected and not self.waiting_for_opponent
     
     def is_opponent_connected(self) -> bool:
         """Returns True if opponent is still connected during gameplay"""
         return self.connected and not self.opponent_disconnected
+    
+    def is_resuming(self) -> bool:
+        """True enquanto a sessão está interrompida: reconectando ou, no host, esperando
+        o cliente retomado confirmar o keyframe. A partida fica congelada."""
+        return self.reconnecting or self._resync_client is not None
+    
+    def resume_time_left(self) -> float | None:
+        """Segundos que restam da janela de reconexão (None fora dela)."""
+        if not self.reconnecting:
+            return None
+        return max(0.0, self._resume_deadline - time.monotonic())
 
     def disconnect(self):
+        if self.session_token:
+            # Saída voluntária: avisa o outro lado para não esperar uma reconexão
+            if self.server and self.opponent_id is not None:
+                self.server.send_to_client(self.opponent_id, {'type': 'session_end'})
+            elif self.client and self.mode == 'client':
+                self.client.send({'type': 'session_end'})
+        self._reset_session()
+        
         if self.client:
             self.client.disconnect()
             self.client = None
@@ -222,6 +828,9 @@ class NetworkHandler:
                 'type': 'pause_request', 
                 'paused': paused
             })
+            # O host não devolve o pause_state a quem pediu; sem pause_received,
+            # serve só para o relógio (o PauseManager local já sabe da pausa)
+            self.remote_pause_state = paused
         elif self.server and self.is_host():
             # Host pausa diretamente e notifica todos
             self.remote_pause_state = paused
@@ -4,7 +4,8 @@ class NetworkInputHandler:
         self._direction = 0.0
     
     def get_direction(self) -> float:
-        return self.network.get_opponent_direction()
+        # Chamado uma vez por passo pelo Player
+        return self.network.next_opponent_direction()
     
     def set_direction(self, direction: float):
         self._direction = direction
@@ -0,0 +1,235 @@
+"""Predição do paddle local e inputs bufferizados no lado autoritativo.
+
+O cliente numera cada passo de simulação (seq) e guarda o input até o servidor
+confirmá-lo. O servidor consome exatamente um input por passo, na ordem, e
+publica no snapshot o último seq aplicado e o estado do paddle (posição,
+velocidade, carga). Ao receber esse estado o cliente volta o paddle para ele e
+reaplica os inputs ainda não confirmados.
+
+Cada mensagem de input leva também as direções dos inputs anteriores ainda não
+confirmados (history, do mais novo para o mais antigo): um datagrama perdido é
+coberto pelo próximo, sem esperar retransmissão. O receptor descarta o que já tem.
+
+O cliente não manda todo passo: só quando a direção muda (a mudança se repete
+algumas vezes, para sobreviver a perdas) e, sem mudança, um heartbeat periódico
+com a posição. Os passos entre mensagens têm a mesma direção da última
+enviada, e o servidor os simula mantendo essa direção (held).
+"""
+from collections import deque
+
+
+# Passos de folga entre o servidor e o input mais novo do cliente (~66 ms a 60 ticks/s).
+# Cada input atrasado recua o servidor um passo; acima do limite ele pula passos para alcançar o cliente
+MAX_BUFFERED_INPUTS = 4
+# Passos simulados com a direção mantida além do input mais novo (~0,5 s); depois disso
+# o cliente está travado ou a conexão parou, e o servidor repete sem consumir passos
+MAX_HELD_INPUTS = 30
+# Inputs não confirmados guardados pelo cliente (cerca de 2 s a 60 ticks/s)
+MAX_PENDING_INPUTS = 120
+# Inputs anteriores repetidos em cada mensagem (~133 ms de perdas seguidas a 60 ticks/s)
+INPUT_HISTORY = 8
+# Passos entre mensagens sem mudança de direção (heartbeat com a posição, ~5 Hz)
+INPUT_HEARTBEAT_STEPS = 12
+# Uma mudança sai de novo INPUT_CHANGE_REPEATS vezes, a cada INPUT_RESEND_STEPS passos: perdida a
+# primeira mensagem, a mudança ainda está no histórico das seguintes (dentro de INPUT_HISTORY)
+INPUT_RESEND_STEPS = 4
+INPUT_CHANGE_REPEATS = 2
+
+
+class InputBuffer:
+    """Lado autoritativo: inputs de um jogador remoto, aplicados um por passo de simulação.
+
+    Cada passo do servidor consome o passo seguinte do cliente (last_seq + 1). Só as
+    mudanças de direção ficam na fila; os passos entre elas mantêm a última direção.
+    """
+
+    def __init__(self, max_size: int = MAX_BUFFERED_INPUTS, max_held: int = MAX_HELD_INPUTS):
+        self.max_size = max_size
+        self.max_held = max_held
+        self.direction = 0
+        self.last_seq: int | None = None  # último passo aplicado (vai no snapshot como ack)
+        self.repeated = 0  # passos sem consumir input (repetiu a direção sem avançar last_seq)
+        self.dropped = 0   # passos pulados para alcançar o cliente
+        self.held = 0      # passos consumidos mantendo a direção (sem mensagem para eles)
+        self.late = 0      # mudanças que chegaram depois do passo delas já simulado
+        self._queue: deque[tuple[int, int]] = deque()
+        self._newest: int | None = None
+
+    @property
+    def active(self) -> bool:
+        """True depois do primeiro input numerado (clientes antigos não mandam seq)."""
+        return self._newest is not None
+
+    def push(self, seq: int, direction: int):
+        if self._newest is not None and seq <= self._newest:
+            return  # duplicado ou atrasado
+        self._newest = seq
+        queued = self._queue[-1][1] if self._queue else self.direction
+        if self.last_seq is None or direction != queued:
+            self._queue.append((seq, direction))
+
+    def next(self) -> int:
+        """Direção para o próximo passo. Sem input para ele, mantém a última."""
+        queue = self._queue
+        if self.last_seq is None:
+            if queue:
+                self.last_seq, self.direction = queue.popleft()
+            else:
+                self.repeated += 1
+            return self.direction
+
+        # Mudança para um passo já simulado: vale daqui em diante
+        late = bool(queue) and queue[0][0] <= self.last_seq
+        ahead = self._newest - self.last_seq - self.max_size
+        if ahead > 0:
+            # Cliente à frente da folga: pula passos para alcançá-lo
+            self.last_seq += ahead
+            self.dropped += ahead
+        while queue and queue[0][0] <= self.last_seq:
+            _, self.direction = queue.popleft()
+
+        if queue and queue[0][0] == self.last_seq + 1:
+            self.last_seq, self.direction = queue.popleft()
+        elif late and ahead <= 0:
+            # Recua um passo (não consome): as próximas mudanças chegam a tempo
+            self.late += 1
+            self.repeated += 1
+        elif self.last_seq - self._newest < self.max_held:
+            self.last_seq += 1
+            self.held += 1
+        else:
+            self.repeated += 1
+        return self.direction
+
+    def reset(self):
+        self.direction = 0
+        self.last_seq = None
+        self._queue.clear()
+        self._newest = None
+
+
+class InputThrottle:
+    """Lado do remetente: escolhe os passos que viram mensagem de input.
+
+    Sai mensagem quando a direção muda (repetida repeats vezes, a cada resend passos)
+    e, sem mudança, a cada heartbeat passos. A carga do paddle depende só da direção,
+    então mudar a direção cobre também o início e a soltura. O ack não encerra as
+    repetições: ele cobre também os passos que o servidor manteve sem a mudança.
+    """
+
+    def __init__(self, heartbeat: int = INPUT_HEARTBEAT_STEPS, resend: int = INPUT_RESEND_STEPS,
+                 repeats: int = INPUT_CHANGE_REPEATS):
+        self.heartbeat = heartbeat
+        self.resend = resend
+        self.repeats = repeats
+        self.direction: int | None = None  # direção da última mudança enviada
+        self.sent = 0     # passos que viraram mensagem
+        self.skipped = 0  # passos cobertos pela direção mantida
+        self._since_send = 0
+        self._repeats_left = 0
+
+    def should_send(self, direction: int) -> bool:
+        self._since_send += 1
+        if direction != self.direction:
+            self.direction = direction
+            self._repeats_left = self.repeats
+        elif self._repeats_left and self._since_send >= self.resend:
+            self._repeats_left -= 1
+        elif self._since_send < self.heartbeat:
+            self.skipped += 1
+            return False
+        self._since_send = 0
+        self.sent += 1
+        return True
+
+
+class PredictedInput:
+    """Lado do cliente: controlador do paddle local que numera e guarda cada passo.
+
+    Envolve o controlador real (teclado). O Player chama get_direction() uma vez
+    por passo; cada chamada gera um input (seq, direção) para enviar e guardar até
+    o ack. Durante a reconciliação, get_direction() devolve os inputs guardados.
+    """
+
+    def __init__(self, source, max_pending: int = MAX_PENDING_INPUTS):
+        self.source = source
+        self.seq = 0
+        self.pending: deque[tuple[int, int]] = deque(maxlen=max_pending)
+        self.outgoing: list[tuple[int, int]] = []
+        self._replay: deque[int] | None = None
+
+    def get_direction(self) -> int:
+        if self._replay is not None:
+            return self._replay.popleft() if self._replay else 0
+        direction = self.source.get_direction()
+        self.seq += 1
+        self.pending.append((self.seq, direction))
+        self.outgoing.append((self.seq, direction))
+        return direction
+
+    def take_outgoing(self) -> list[tuple[int, int]]:
+        outgoing, self.outgoing = self.outgoing, []
+        return outgoing
+
+    def history(self, seq: int, limit: int = INPUT_HISTORY) -> list[int]:
+        """Direções dos inputs não confirmados antes de seq, do mais novo para o mais antigo."""
+        if not self.pending:
+            return []
+        end = seq - self.pending[0][0]  # pending é contíguo a partir do primeiro não confirmado
+        start = max(0, end - limit)
+        return [self.pending[i][1] for i in range(end - 1, start - 1, -1)]
+
+    def acknowledge(self, seq: int) -> int | None:
+        """Descarta os inputs até seq. Retorna a direção do input confirmado (se ainda guardado)."""
+        direction = None
+        while self.pending and self.pending[0][0] <= seq:
+            acked_seq, acked_direction = self.pending.popleft()
+            if acked_seq == seq:
+                direction = acked_direction
+        return direction
+
+    def begin_replay(self):
+        self._replay = deque(direction for _, direction in self.pending)
+
+    def end_replay(self):
+        self._replay = None
+
+
+def expand_history(newest: int, direction: int, history) -> list[tuple[int, int]]:
+    """(número, direção) do input mais novo e dos anteriores no histórico, do mais antigo ao mais novo."""
+    inputs = [(newest - i, previous) for i, previous in enumerate(history or (), start=1)
+              if newest - i >= 0]
+    inputs.reverse()
+    inputs.append((newest, direction))
+    return inputs
+
+
+def paddle_state(slot: int, player, ack: int | None) -> dict:
+    """Campos do snapshot com o estado de um paddle, o último input aplicado e a direção usada nele."""
+    return {
+        f'p{slot}_y': player.rect.centery,
+        f'p{slot}_vel': player.vel,
+        f'p{slot}_charge': player.charge_time,
+        f'p{slot}_ack': ack,
+        f'p{slot}_dir': player.direction,
+    }
+
+
+def restore_paddle(player, state: dict, slot: int, direction: int | None):
+    """Volta o paddle ao estado do snapshot (direction = input confirmado, se conhecido).
+
+    A direção que o servidor aplicou tem prioridade: num passo mantido (held) ela
+    pode ser a anterior à mudança que ainda não tinha chegado.
+    """
+    if state.get(f'p{slot}_dir') is not None:
+        direction = state[f'p{slot}_dir']
+    player.rect.centery = state[f'p{slot}_y']
+    player.vel = state.get(f'p{slot}_vel') or 0.0
+    player.charge_time = state.get(f'p{slot}_charge') or 0.0
+    # Carregando <=> charge_time > 0, e prev_input é a direção do último passo carregando
+    player.is_charging = player.charge_time > 0
+    if direction is not None:
+        player.direction = direction
+        if player.is_charging:
+            player.prev_input = direction
+    player.old_rect = player.rect.copy()
@@ -0,0 +1,345 @@
+import json
+import math
+import struct
+from functools import lru_cache
+
+
+# Versão do codec binário. Peers com versões diferentes caem para JSON.
+PROTOCOL_VERSION = 5
+
+CODEC_JSON = 'json'
+CODEC_BINARY = 'binary'
+SUPPORTED_CODECS = (CODEC_BINARY, CODEC_JSON)
+
+# IDs de tipo de mensagem do codec binário (1 byte)
+MSG_INPUT = 1
+MSG_OPPONENT_INPUT = 2
+MSG_GAME_STATE = 3
+MSG_PAUSE_STATE = 4
+MSG_STATE_DELTA = 5
+MSG_STATE_ACK = 6
+MSG_ROLLBACK_INPUT = 7
+
+# Direções anteriores carregadas em cada input (2 bits cada no corpo binário)
+MAX_INPUT_HISTORY = 16
+
+# Cabeçalho de todo payload binário: versão + tipo.
+# A versão nunca vale ord('{'), então JSON e binário são distinguidos pelo primeiro byte.
+_HEADER = struct.Struct('!BB')
+_JSON_MARKER = ord('{')
+
+_INPUT = struct.Struct('!bfIBI')                   # direction, paddle_y (NaN = ausente), seq (0 = ausente), histórico
+_GAME_STATE = struct.Struct('!IfffffHHBIiffffffIIbb')  # seq, bola, placar, fase, tick, countdown, paddles
+_PAUSE_STATE = struct.Struct('!?B')                # paused, initiator
+_DELTA_HEADER = struct.Struct('!III')              # seq, base, máscara de campos presentes
+_STATE_ACK = struct.Struct('!I')                   # seq confirmado
+_ROLLBACK_INPUT = struct.Struct('!IbBIih')         # tick, direction, histórico, ack (-1 = nenhum), adv
+
+_PHASES = ('play', 'countdown', 'pause_countdown')
+_INITIATORS = ('host', 'client', 'local')
+
+_GAME_STATE_FIELDS = ('ball_x', 'ball_y', 'ball_dx', 'ball_dy', 'ball_speed',
+                      'score_t1', 'score_t2', 'phase', 'tick', 'countdown_end',
+                      'p1_y', 'p2_y', 'p1_vel', 'p2_vel', 'p1_charge', 'p2_charge',
+                      'p1_ack', 'p2_ack', 'p1_dir', 'p2_dir')
+# Formato struct de cada campo, na mesma ordem (usado pelos deltas)
+_GAME_STATE_FORMATS = ('f', 'f', 'f', 'f', 'f', 'H', 'H', 'B', 'I', 'i', 'f', 'f',
+                       'f', 'f', 'f', 'f', 'I', 'I', 'b', 'b')
+# Campos opcionais: float NaN ou inteiro 0 representam None
+_OPTIONAL_FLOATS = frozenset(('p1_y', 'p2_y', 'p1_vel', 'p2_vel', 'p1_charge', 'p2_charge'))
+_OPTIONAL_SEQS = frozenset(('p1_ack', 'p2_ack'))
+# Direção aplicada a cada paddle: None (paddle ausente) vira 0
+_DIRECTIONS = frozenset(('p1_dir', 'p2_dir'))
+
+
+class ProtocolError(ValueError):
+    """Payload binário malformado ou de versão desconhecida."""
+
+
+def _opt_float(value) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _from_opt_float(value: float) -> float | None:
+    return None if math.isnan(value) else value
+
+
+def _opt_seq(value) -> int:
+    return 0 if value is None else int(value)
+
+
+def _from_opt_seq(value: int) -> int | None:
+    return value or None
+
+
+# --- histórico de direções: 2 bits por entrada (-1, 0, 1), a mais nova nos bits baixos ---
+
+def _pack_history(history) -> tuple[int, int]:
+    if len(history) > MAX_INPUT_HISTORY:
+        raise ValueError("histórico de input longo demais")
+    bits = 0
+    for i, direction in enumerate(history):
+        direction = int(direction)
+        if direction not in (-1, 0, 1):
+            raise ValueError(f"direção inválida no histórico: {direction}")
+        bits |= (direction + 1) << (2 * i)
+    return len(history), bits
+
+
+def _unpack_history(count: int, bits: int) -> list[int]:
+    if count > MAX_INPUT_HISTORY:
+        raise ProtocolError(f"histórico de input longo demais: {count}")
+    return [((bits >> (2 * i)) & 3) - 1 for i in range(count)]
+
+
+# --- input / opponent_input ---
+
+def _encode_input(data: dict) -> bytes:
+    count, bits = _pack_history(data.get('history') or ())
+    return _INPUT.pack(int(data.get('direction', 0)), _opt_float(data.get('paddle_y')),
+                       _opt_seq(data.get('seq')), count, bits)
+
+
+def _decode_input(msg_type: str, body: memoryview) -> dict:
+    direction, paddle_y, seq, count, bits = _INPUT.unpack(body)
+    msg = {'type': msg_type, 'direction': direction}
+    if not math.isnan(paddle_y):
+        msg['paddle_y'] = paddle_y
+    if seq:
+        msg['seq'] = seq
+    if count:
+        msg['history'] = _unpack_history(count, bits)
+    return msg
+
+
+# --- rollback_input ---
+
+def _encode_rollback_input(data: dict) -> bytes:
+    count, bits = _pack_history(data.get('history') or ())
+    ack = data.get('ack')
+    return _ROLLBACK_INPUT.pack(data['tick'], int(data.get('direction', 0)), count, bits,
+                                -1 if ack is None else ack, data.get('adv', 0))
+
+
+def _decode_rollback_input(msg_type: str, body: memoryview) -> dict:
+    tick, direction, count, bits, ack, adv = _ROLLBACK_INPUT.unpack(body)
+    return {'type': msg_type, 'tick': tick, 'direction': direction,
+            'history': _unpack_history(count, bits), 'ack': None if ack < 0 else ack, 'adv': adv}
+
+
+# --- game_state ---
+
+def _encode_game_state(data: dict) -> bytes:
+    countdown_end = data.get('countdown_end')
+    return _GAME_STATE.pack(
+        data['seq'],
+        data['ball_x'], data['ball_y'],
+        data['ball_dx'], data['ball_dy'], data['ball_speed'],
+        data['score_t1'], data['score_t2'],
+        _PHASES.index(data['phase']),
+        data['tick'],
+        -1 if countdown_end is None else countdown_end,
+        _opt_float(data.get('p1_y')), _opt_float(data.get('p2_y')),
+        _opt_float(data.get('p1_vel')), _opt_float(data.get('p2_vel')),
+        _opt_float(data.get('p1_charge')), _opt_float(data.get('p2_charge')),
+        _opt_seq(data.get('p1_ack')), _opt_seq(data.get('p2_ack')),
+        int(data.get('p1_dir') or 0), int(data.get('p2_dir') or 0),
+    )
+
+
+def _decode_game_state(msg_type: str, body: memoryview) -> dict:
+    (seq, ball_x, ball_y, ball_dx, ball_dy, ball_speed, score_t1, score_t2,
+     phase, tick, countdown_end, p1_y, p2_y, p1_vel, p2_vel, p1_charge, p2_charge,
+     p1_ack, p2_ack, p1_dir, p2_dir) = _GAME_STATE.unpack(body)
+    return {
+        'type': msg_type,
+        'seq': seq,
+        'ball_x': ball_x,
+        'ball_y': ball_y,
+        'ball_dx': ball_dx,
+        'ball_dy': ball_dy,
+        'ball_speed': ball_speed,
+        'score_t1': score_t1,
+        'score_t2': score_t2,
+        'phase': _PHASES[phase],
+        'tick': tick,
+        'countdown_end': None if countdown_end < 0 else countdown_end,
+        'p1_y': _from_opt_float(p1_y),
+        'p2_y': _from_opt_float(p2_y),
+        'p1_vel': _from_opt_float(p1_vel),
+        'p2_vel': _from_opt_float(p2_vel),
+        'p1_charge': _from_opt_float(p1_charge),
+        'p2_charge': _from_opt_float(p2_charge),
+        'p1_ack': _from_opt_seq(p1_ack),
+        'p2_ack': _from_opt_seq(p2_ack),
+        'p1_dir': p1_dir,
+        'p2_dir': p2_dir,
+    }
+
+
+# --- game_state_delta: só os campos que mudaram desde o snapshot base ---
+
+def _field_to_wire(field: str, value):
+    if field == 'phase':
+        return _PHASES.index(value)
+    if field == 'countdown_end':
+        return -1 if value is None else value
+    if field in _OPTIONAL_FLOATS:
+        return _opt_float(value)
+    if field in _OPTIONAL_SEQS:
+        return _opt_seq(value)
+    if field in _DIRECTIONS:
+        return int(value or 0)
+    return value
+
+
+def _field_from_wire(field: str, value):
+    if field == 'phase':
+        return _PHASES[value]
+    if field == 'countdown_end':
+        return None if value < 0 else value
+    if field in _OPTIONAL_FLOATS:
+        return _from_opt_float(value)
+    if field in _OPTIONAL_SEQS:
+        return _from_opt_seq(value)
+    return value
+
+
+@lru_cache(maxsize=None)
+def _delta_body(mask: int) -> tuple[struct.Struct, tuple[str, ...]]:
+    fields = tuple(f for i, f in enumerate(_GAME_STATE_FIELDS) if mask & (1 << i))
+    formats = ''.join(_GAME_STATE_FORMATS[i] for i, f in enumerate(_GAME_STATE_FIELDS) if mask & (1 << i))
+    return struct.Struct('!' + formats), fields
+
+
+def _encode_state_delta(data: dict) -> bytes:
+    mask = 0
+    for i, field in enumerate(_GAME_STATE_FIELDS):
+        if field in data:
+            mask |= 1 << i
+    body, fields = _delta_body(mask)
+    values = [_field_to_wire(field, data[field]) for field in fields]
+    return _DELTA_HEADER.pack(data['seq'], data['base'], mask) + body.pack(*values)
+
+
+def _decode_state_delta(msg_type: str, body: memoryview) -> dict:
+    if len(body) < _DELTA_HEADER.size:
+        raise ProtocolError("delta sem cabeçalho")
+    seq, base, mask = _DELTA_HEADER.unpack_from(body)
+    fields_struct, fields = _delta_body(mask & ((1 << len(_GAME_STATE_FIELDS)) - 1))
+    if len(body) != _DELTA_HEADER.size + fields_struct.size:
+        raise ProtocolError(f"tamanho inválido para {msg_type}: {len(body)}")
+    msg = {'type': msg_type, 'seq': seq, 'base': base}
+    for field, value in zip(fields, fields_struct.unpack_from(body, _DELTA_HEADER.size)):
+        msg[field] = _field_from_wire(field, value)
+    return msg
+
+
+# --- state_ack ---
+
+def _encode_state_ack(data: dict) -> bytes:
+    return _STATE_ACK.pack(data['seq'])
+
+
+def _decode_state_ack(msg_type: str, body: memoryview) -> dict:
+    (seq,) = _STATE_ACK.unpack(body)
+    return {'type': msg_type, 'seq': seq}
+
+
+# --- pause_state ---
+
+def _encode_pause_state(data: dict) -> bytes:
+    return _PAUSE_STATE.pack(bool(data.get('paused', False)),
+                             _INITIATORS.index(data.get('initiator', 'host')))
+
+
+def _decode_pause_state(msg_type: str, body: memoryview) -> dict:
+    paused, initiator = _PAUSE_STATE.unpack(body)
+    return {'type': msg_type, 'paused': paused, 'initiator': _INITIATORS[initiator]}
+
+
+# tipo -> (id, campos aceitos, encoder, decoder, struct do corpo ou None se o tamanho varia)
+_BINARY_TYPES = {
+    'input': (MSG_INPUT, {'direction', 'paddle_y', 'seq', 'history'}, _encode_input, _decode_input, _INPUT),
+    'opponent_input': (MSG_OPPONENT_INPUT, {'direction', 'paddle_y', 'seq', 'history'},
+                       _encode_input, _decode_input, _INPUT),
+    'game_state': (MSG_GAME_STATE, {'seq', *_GAME_STATE_FIELDS}, _encode_game_state, _decode_game_state, _GAME_STATE),
+    'pause_state': (MSG_PAUSE_STATE, {'paused', 'initiator'}, _encode_pause_state, _decode_pause_state, _PAUSE_STATE),
+    'game_state_delta': (MSG_STATE_DELTA, {'seq', 'base', *_GAME_STATE_FIELDS},
+                         _encode_state_delta, _decode_state_delta, None),
+    'state_ack': (MSG_STATE_ACK, {'seq'}, _encode_state_ack, _decode_state_ack, _STATE_ACK),
+    'rollback_input': (MSG_ROLLBACK_INPUT, {'tick', 'direction', 'history', 'ack', 'adv'},
+                       _encode_rollback_input, _decode_rollback_input, _ROLLBACK_INPUT),
+}
+_BINARY_BY_ID = {entry[0]: (msg_type, entry[3], entry[4]) for msg_type, entry in _BINARY_TYPES.items()}
+
+
+def _encode_json(data: dict) -> bytes:
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def encode_message(data: dict, codec: str = CODEC_JSON) -> bytes:
+    """Serializa uma mensagem (sem o prefixo de tamanho).
+
+    Com o codec binário, tipos sem layout fixo (ou com campos extras) caem para JSON.
+    """
+    if codec == CODEC_BINARY:
+        entry = _BINARY_TYPES.get(data.get('type'))
+        if entry is not None and data.keys() - entry[1] <= {'type'}:
+            msg_id, _, encoder, _, _ = entry
+            try:
+                return _HEADER.pack(PROTOCOL_VERSION, msg_id) + encoder(data)
+            except (struct.error, KeyError, ValueError, TypeError):
+                pass
+    return _encode_json(data)
+
+
+def decode_message(payload) -> dict:
+    """Desserializa um payload JSON ou binário. Levanta ValueError se for inválido."""
+    if not payload:
+        raise ProtocolError("payload vazio")
+
+    if payload[0] == _JSON_MARKER:
+        return json.loads(bytes(payload).decode('utf-8'))
+
+    view = memoryview(payload)
+    if len(view) < _HEADER.size:
+        raise ProtocolError("cabeçalho binário incompleto")
+
+    version, msg_id = _HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"versão de protocolo desconhecida: {version}")
+
+    entry = _BINARY_BY_ID.get(msg_id)
+    if entry is None:
+        raise ProtocolError(f"tipo de mensagem desconhecido: {msg_id}")
+
+    msg_type, decoder, body_struct = entry
+    body = view[_HEADER.size:]
+    if body_struct is not None and len(body) != body_struct.size:
+        raise ProtocolError(f"tamanho inválido para {msg_type}: {len(body)}")
+
+    try:
+        return decoder(msg_type, body)
+    except (struct.error, IndexError) as e:
+        raise ProtocolError(f"{msg_type} malformado: {e}") from e
+
+
+def frame(payload: bytes) -> bytes:
+    """Adiciona o prefixo de tamanho de 4 bytes (big-endian)."""
+    return len(payload).to_bytes(4, byteorder='big') + payload
+
+
+def hello_message(codec: str = CODEC_BINARY, udp: bool = False) -> dict:
+    """Mensagem que o cliente envia ao conectar oferecendo seus codecs (e o canal UDP)."""
+    codecs = [codec] if codec == CODEC_JSON else list(SUPPORTED_CODECS)
+    return {'type': 'hello', 'version': PROTOCOL_VERSION, 'codecs': codecs, 'udp': udp}
+
+
+def negotiate_codec(hello: dict, preferred: str = CODEC_BINARY) -> str:
+    """Escolhe o codec a partir do hello do cliente. JSON é sempre o fallback."""
+    offered = hello.get('codecs') or []
+    if (preferred == CODEC_BINARY and CODEC_BINARY in offered
+            and hello.get('version') == PROTOCOL_VERSION):
+        return CODEC_BINARY
+    return CODEC_JSON
@@ -0,0 +1,196 @@
+"""Relay de espectadores: repete o stream de uma sala para muitas conexões.
+
+O relay entra na sala como espectador (join_room com role 'spectator') num
+servidor de salas, ou em outro relay, e repassa cada snapshot recebido aos seus
+próprios espectadores com broadcast (serializado uma vez por codec). O servidor
+da partida paga uma conexão por relay, não uma por espectador; relays em árvore
+(F conexões por nível) chegam a F^n espectadores sem carregar o host.
+
+Os espectadores se conectam ao relay exatamente como ao servidor de salas
+(NetworkHandler.spectate com a mesma sala).
+
+Uso (a partir de Code/):
+    python -m network.relay --upstream 203.0.113.7:5555 --room final --port 5560
+    python -m network.relay --upstream 127.0.0.1:5560 --room final --port 5561
+"""
+import argparse
+import signal
+import time
+
+from network.client import TCPClient
+from network.network_handler import DEFAULT_DELIVERY, pong_message
+from network.server import TCPServer
+
+
+DEFAULT_RELAY_PORT = 5560
+DEFAULT_MAX_SPECTATORS = 10000
+# Intervalo do laço do relay: cada snapshot espera no máximo isso para ser repassado
+POLL_INTERVAL = 0.005
+# Espera entre tentativas de (re)conectar ao upstream (sala ainda não criada, queda)
+RECONNECT_INTERVAL = 2.0
+
+
+class RelayServer:
+    """Espectador de uma sala no upstream e servidor de espectadores dessa sala."""
+
+    def __init__(self, upstream: tuple[str, int], room: str, host: str = '0.0.0.0',
+                 port: int = DEFAULT_RELAY_PORT, max_spectators: int = DEFAULT_MAX_SPECTATORS,
+                 udp: bool = True):
+        self.upstream_addr = upstream
+        self.room = str(room)
+        self.server = TCPServer(host, port, max_clients=max_spectators, udp=udp)
+        self.delivery: dict[str, bool] = dict(DEFAULT_DELIVERY)
+        self.upstream: TCPClient | None = None
+        self.spectators: dict[int, None] = {}
+        self.delay_ms = 0       # atraso acumulado anunciado pelo upstream
+        self.snapshot_tick = 0  # tick do último snapshot repassado (vai nos pongs)
+        self.relayed = 0
+        self._latest: dict | None = None  # último snapshot, para quem acabou de entrar
+        self._next_connect = 0.0
+        self.running = False
+
+    def start(self) -> bool:
+        if not self.server.start():
+            return False
+        self.running = True
+        print(f"[Relay] Repassando a sala {self.room} de "
+              f"{self.upstream_addr[0]}:{self.upstream_addr[1]}")
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.upstream:
+            self.upstream.disconnect()
+            self.upstream = None
+        self.server.stop()
+
+    def poll(self):
+        """Mantém a conexão com o upstream e repassa o que chegou desde a última volta."""
+        self.server.begin_batch()
+        self._check_upstream()
+        if self.upstream:
+            for msg in self.upstream.get_messages():
+                self._handle_upstream(msg)
+        for msg in self.server.get_messages():
+            self._handle_downstream(msg)
+        self.server.flush()
+
+    def _check_upstream(self):
+        if self.upstream and not self.upstream.is_connected:
+            print("[Relay] Upstream desconectado")
+            self.upstream.disconnect()
+            self.upstream = None
+        if self.upstream or time.monotonic() < self._next_connect:
+            return
+
+        self._next_connect = time.monotonic() + RECONNECT_INTERVAL
+        # Só TCP no upstream: uma perda ali seria uma perda para toda a árvore abaixo
+        upstream = TCPClient(*self.upstream_addr, udp=False)
+        if upstream.connect():
+            upstream.send({'type': 'join_room', 'room': self.room, 'role': 'spectator'})
+            self.upstream = upstream
+
+    def _handle_upstream(self, msg: dict):
+        msg_type = msg.get('type')
+
+        if msg_type == 'spectate_start':
+            self.delay_ms = msg.get('delay_ms', 0)
+            print(f"[Relay] Assistindo à sala {self.room} ({self.delay_ms} ms de atraso)")
+
+        elif msg_type == 'spectate_error':
+            # Sala ainda não existe (ou upstream cheio): tenta de novo mais tarde
+            print(f"[Relay] Upstream recusou: {msg.get('reason')}")
+            if self.upstream:
+                self.upstream.disconnect()
+                self.upstream = None
+
+        elif msg_type == 'game_state':
+            # Campos locais (_received_at) não seguem adiante
+            state = {key: value for key, value in msg.items() if not key.startswith('_')}
+            self._latest = state
+            self.snapshot_tick = state.get('tick') or self.snapshot_tick
+            self.relayed += 1
+            self.server.broadcast(self.spectators, state, reliable=self.delivery.get('game_state', True))
+
+    def _handle_downstream(self, msg: dict):
+        msg_type = msg.get('type')
+        client_id = msg.get('_client_id', msg.get('client_id'))
+
+        if msg_type == 'client_disconnected':
+            self.spectators.pop(client_id, None)
+
+        elif msg_type == 'join_room':
+            room = msg.get('room')
+            if msg.get('role') != 'spectator' or (room is not None and str(room) != self.room):
+                self.server.send_to_client(client_id, {'type': 'spectate_error', 'room': room,
+                                                       'reason': 'relay só transmite a sala ' + self.room})
+                self.server.kick_client(client_id)
+                return
+            self.spectators[client_id] = None
+            self.server.send_to_client(client_id, {'type': 'spectate_start', 'room': self.room,
+                                                   'delay_ms': self.delay_ms})
+            if self._latest is not None:
+                self.server.send_to_client(client_id, self._latest,
+                                           reliable=self.delivery.get('game_state', True))
+
+        elif msg_type == 'ping':
+            self.server.send_to_client(client_id, pong_message(msg, self.snapshot_tick),
+                                       reliable=self.delivery.get('pong', True))
+
+    def get_stats(self) -> dict:
+        send_stats = self.server.get_send_stats()
+        return {
+            'spectators': len(self.spectators),
+            'upstream': self.upstream is not None and self.upstream.is_connected,
+            'relayed': self.relayed,
+            'messages': send_stats['messages'],
+            'encodes': send_stats['encodes'],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay de espectadores do Ultra-Pong")
+    parser.add_argument('--upstream', required=True, metavar='HOST:PORTA',
+                        help="servidor de salas (ou outro relay) de onde vem o stream")
+    parser.add_argument('--room', required=True, help="sala transmitida")
+    parser.add_argument('--host', default='0.0.0.0', help="endereço de bind")
+    parser.add_argument('--port', type=int, default=DEFAULT_RELAY_PORT, help="porta TCP/UDP do relay")
+    parser.add_argument('--max-spectators', type=int, default=DEFAULT_MAX_SPECTATORS,
+                        help="conexões simultâneas de espectadores")
+    parser.add_argument('--no-udp', action='store_true', help="espectadores só por TCP")
+    parser.add_argument('--stats-interval', type=float, default=0.0,
+                        help="imprime espectadores e repasses a cada N segundos (0 = nunca)")
+    args = parser.parse_args()
+
+    upstream_host, _, upstream_port = args.upstream.rpartition(':')
+    if not upstream_host or not upstream_port.isdigit():
+        parser.error("--upstream deve ser HOST:PORTA")
+
+    relay = RelayServer((upstream_host, int(upstream_port)), args.room, args.host, args.port,
+                        max_spectators=args.max_spectators, udp=not args.no_udp)
+
+    def signal_handler(sig, frame):
+        print("\nEncerrando...")
+        relay.running = False
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if not relay.start():
+        raise SystemExit(1)
+    try:
+        last_stats = time.monotonic()
+        while relay.running and relay.server.running:
+            relay.poll()
+            if args.stats_interval > 0 and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                stats = relay.get_stats()
+                print(f"[Relay] {stats['spectators']} espectadores, {stats['relayed']} snapshots repassados, "
+                      f"{stats['messages']} envios com {stats['encodes']} serializações")
+            time.sleep(POLL_INTERVAL)
+    finally:
+        relay.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""Netcode de rollback (estilo GGPO) para partidas 1v1 entre host e cliente.
+
+Os dois lados simulam a partida inteira localmente. Cada passo usa o input local
+na hora e, para o adversário, o input real daquele tick se já chegou ou uma
+previsão (a última direção confirmada). Quando o input real chega e difere da
+previsão, o estado salvo antes daquele tick é restaurado e os ticks seguintes
+são ressimulados com os inputs corrigidos.
+
+Requisitos da simulação: estado pequeno e salvável (World, Ball e dois paddles),
+passo fixo e determinístico (mesma ordem de sprites, dt fixo e o lançamento da
+bola sorteado com uma semente combinada no game_start).
+"""
+import random
+import zlib
+
+from audio_manager import get_audio_manager
+from network.prediction import expand_history
+from network.protocol import MAX_INPUT_HISTORY
+
+
+# Ticks que um lado pode avançar além do último input confirmado do adversário;
+# acima disso a sessão espera (stall) em vez de prever mais
+MAX_ROLLBACK_TICKS = 8
+# Atraso aplicado ao input local (0 = sem latência percebida; 1-2 reduz rollbacks)
+INPUT_DELAY_TICKS = 0
+# Inputs locais ainda não confirmados pelo adversário repetidos em cada rollback_input
+ROLLBACK_HISTORY = MAX_INPUT_HISTORY
+# A cada N ticks os lados trocam um checksum do estado confirmado
+CHECKSUM_INTERVAL = 60
+# A cada N ticks o lado adiantado compara a vantagem de frames e espera um pouco
+TIME_SYNC_INTERVAL = 30
+MAX_TIME_SYNC_WAIT = 4
+
+ROLLBACK_MESSAGES = frozenset(('rollback_input', 'rollback_checksum'))
+
+
+class SlotInput:
+    """Controlador de um paddle no modo rollback: a sessão define a direção de cada passo."""
+
+    def __init__(self):
+        self.direction = 0
+
+    def get_direction(self) -> int:
+        return self.direction
+
+
+def launch_rng(seed: int, tick: int) -> random.Random:
+    """Gerador do lançamento da bola: mesmo (semente, tick) nos dois lados, mesmo sorteio."""
+    return random.Random(seed * 1_000_003 + tick)
+
+
+def save_state(world, ball, paddles: dict) -> tuple:
+    """Estado completo da simulação em tuplas de valores (cópia barata, restaurável)."""
+    paddle_states = tuple(
+        (paddle.rect.x, paddle.rect.y, paddle.old_rect.x, paddle.old_rect.y, paddle.direction,
+         paddle.vel, paddle.charge_time, paddle.is_charging, paddle.prev_input)
+        for _, paddle in sorted(paddles.items())
+    )
+    return (
+        (world.score['TEAM_1'], world.score['TEAM_2'], world.phase, world.tick,
+         world.countdownEndTick, world.pause_countdownEndTick),
+        (ball.rect.x, ball.rect.y, ball.old_rect.x, ball.old_rect.y,
+         ball.direction.x, ball.direction.y, ball.speed),
+        paddle_states,
+    )
+
+
+def load_state(world, ball, paddles: dict, state: tuple):
+    world_state, ball_state, paddle_states = state
+    (world.score['TEAM_1'], world.score['TEAM_2'], world.phase, world.tick,
+     world.countdownEndTick, world.pause_countdownEndTick) = world_state
+    (ball.rect.x, ball.rect.y, ball.old_rect.x, ball.old_rect.y,
+     ball.direction.x, ball.direction.y, ball.speed) = ball_state
+    for (_, paddle), paddle_state in zip(sorted(paddles.items()), paddle_states):
+        (paddle.rect.x, paddle.rect.y, paddle.old_rect.x, paddle.old_rect.y, paddle.direction,
+         paddle.vel, paddle.charge_time, paddle.is_charging, paddle.prev_input) = paddle_state
+
+
+def state_checksum(state: tuple) -> int:
+    # repr de float é exato: estados iguais bit a bit têm o mesmo checksum
+    return zlib.crc32(repr(state).encode('ascii'))
+
+
+class RollbackSession:
+    """Avança a simulação local com inputs previstos e corrige ao receber os reais.
+
+    step(directions) avança um tick com {slot: direção}; a sessão salva e
+    restaura o estado com save_state/load_state sobre world, ball e paddles.
+    """
+
+    def __init__(self, network, local_slot: int, controller, world, ball, paddles: dict, step,
+                 max_rollback: int = MAX_ROLLBACK_TICKS, input_delay: int = INPUT_DELAY_TICKS):
+        self.network = network
+        self.local_slot = local_slot
+        self.remote_slot = 2 if local_slot == 1 else 1
+        self.controller = controller
+        self.world = world
+        self.ball = ball
+        self.paddles = paddles
+        self.step = step
+        self.max_rollback = max_rollback
+        self.input_delay = input_delay
+
+        self.frame = 0  # próximo tick a simular
+        # Inputs confirmados por slot (tick -> direção); os primeiros input_delay ticks são parados
+        self.inputs: dict[int, dict[int, int]] = {
+            slot: {tick: 0 for tick in range(input_delay)} for slot in (1, 2)
+        }
+        self.predicted: dict[int, int] = {}  # tick -> direção prevista do adversário
+        self.states: dict[int, tuple] = {}   # tick -> estado salvo antes de simulá-lo
+        self.remote_confirmed = input_delay - 1  # último tick com inputs do adversário contíguos
+        self.remote_ack = input_delay - 1  # último tick nosso que o adversário confirmou
+        self._last_sent: int | None = None
+        self._rollback_from: int | None = None
+
+        # Sincronia de tempo: quantos ticks cada lado está à frente dos inputs do outro,
+        # somados ao longo de cada intervalo (uma amostra isolada oscila com perdas e jitter)
+        self.remote_advantage = 0
+        self._advantage_sums = [0, 0, 0, 0]  # soma local, amostras locais, soma remota, amostras remotas
+        self._wait_frames = 0
+
+        # Checksums do estado confirmado, para detectar dessincronia
+        self._next_checksum = CHECKSUM_INTERVAL
+        self._local_checksums: dict[int, int] = {}
+        self._remote_checksums: dict[int, int] = {}
+
+        self.rollbacks = 0
+        self.resimulated_ticks = 0
+        self.max_rollback_depth = 0
+        self.stalls = 0
+        self.time_sync_waits = 0
+        self.desyncs = 0
+
+    @property
+    def local_advantage(self) -> int:
+        return self.frame - (self.remote_confirmed + 1)
+
+    def poll(self):
+        """Incorpora inputs e checksums recebidos do adversário."""
+        for msg in self.network.take_peer_messages():
+            if msg.get('type') == 'rollback_input':
+                self._on_remote_input(msg)
+            elif msg.get('type') == 'rollback_checksum':
+                self._remote_checksums[msg.get('tick')] = msg.get('crc')
+        self._compare_checksums()
+
+    def _on_remote_input(self, msg: dict):
+        newest = msg.get('tick')
+        if newest is None:
+            return
+        if msg.get('ack') is not None and msg['ack'] > self.remote_ack:
+            self.remote_ack = msg['ack']
+        if newest > self.remote_confirmed:
+            self.remote_advantage = msg.get('adv', 0)
+            self._advantage_sums[2] += self.remote_advantage
+            self._advantage_sums[3] += 1
+
+        remote_inputs = self.inputs[self.remote_slot]
+        for tick, direction in expand_history(newest, msg.get('direction', 0), msg.get('history')):
+            if tick <= self.remote_confirmed or tick in remote_inputs:
+                continue  # repetido pelo histórico
+            remote_inputs[tick] = direction
+
+            predicted = self.predicted.pop(tick, None)
+            if predicted is not None and predicted != direction:
+                # A previsão errou: ressimula a partir deste tick no próximo advance()
+                if self._rollback_from is None or tick < self._rollback_from:
+                    self._rollback_from = tick
+
+        while self.remote_confirmed + 1 in remote_inputs:
+            self.remote_confirmed += 1
+
+    def advance(self) -> bool:
+        """Simula um tick. Retorna False se a sessão esperou (stall ou sincronia de tempo)."""
+        self._rollback()
+
+        if self.frame - self.remote_confirmed > self.max_rollback:
+            self.stalls += 1
+            # Os dois lados podem estar parados esperando um input perdido: reenvia o último
+            # (com o histórico do que o adversário ainda não confirmou) a cada tentativa
+            if self._last_sent is not None:
+                self._send_input(self._last_sent)
+            return False
+
+        sums = self._advantage_sums
+        sums[0] += self.local_advantage
+        sums[1] += 1
+        if self.frame % TIME_SYNC_INTERVAL == 0 and self._wait_frames == 0 and sums[3]:
+            # O lado adiantado espera metade da diferença média para os dois se encontrarem
+            gap = (sums[0] / sums[1] - sums[2] / sums[3]) / 2
+            self._wait_frames = min(MAX_TIME_SYNC_WAIT, int(gap)) if gap >= 1 else 0
+            self._advantage_sums = [0, 0, 0, 0]
+        if self._wait_frames > 0:
+            self._wait_frames -= 1
+            self.time_sync_waits += 1
+            return False
+
+        input_tick = self.frame + self.input_delay
+        self.inputs[self.local_slot][input_tick] = self.controller.get_direction()
+        self._send_input(input_tick)
+
+        self._simulate(self.frame)
+        self.frame += 1
+        self._send_checksums()
+        self._prune()
+        return True
+
+    def _send_input(self, tick: int):
+        local_inputs = self.inputs[self.local_slot]
+        oldest = max(self.remote_ack + 1, tick - ROLLBACK_HISTORY)
+        self.network.send_peer({
+            'type': 'rollback_input',
+            'tick': tick,
+            'direction': local_inputs[tick],
+            'history': [local_inputs[previous] for previous in range(tick - 1, oldest - 1, -1)],
+            'ack': self.remote_confirmed,
+            'adv': self.local_advantage,
+        })
+        self._last_sent = tick
+
+    def _simulate(self, tick: int):
+        self.states[tick] = save_state(self.world, self.ball, self.paddles)
+        remote_inputs = self.inputs[self.remote_slot]
+        if tick in remote_inputs:
+            remote = remote_inputs[tick]
+            self.predicted.pop(tick, None)
+        else:
+            # Previsão: o adversário continua com a última direção confirmada
+            remote = remote_inputs.get(self.remote_confirmed, 0)
+            self.predicted[tick] = remote
+        self.step({self.local_slot: self.inputs[self.local_slot][tick], self.remote_slot: remote})
+
+    def _rollback(self):
+        start, self._rollback_from = self._rollback_from, None
+        if start is None or start >= self.frame:
+            return
+        load_state(self.world, self.ball, self.paddles, self.states[start])
+
+        # Ressimulação silenciosa: os sons desses ticks já tocaram
+        audio = get_audio_manager()
+        was_muted = audio.muted
+        audio.muted = True
+        try:
+            for tick in range(start, self.frame):
+                self._simulate(tick)
+        finally:
+            audio.muted = was_muted
+
+        depth = self.frame - start
+        self.rollbacks += 1
+        self.resimulated_ticks += depth
+        self.max_rollback_depth = max(self.max_rollback_depth, depth)
+
+    def _send_checksums(self):
+        # O estado salvo antes do tick t é final quando os inputs até t - 1 estão confirmados
+        while self._next_checksum <= self.remote_confirmed + 1 and self._next_checksum in self.states:
+            tick = self._next_checksum
+            crc = state_checksum(self.states[tick])
+            self._local_checksums[tick] = crc
+            self.network.send_peer({'type': 'rollback_checksum', 'tick': tick, 'crc': crc})
+            self._next_checksum += CHECKSUM_INTERVAL
+        self._compare_checksums()
+
+    def _compare_checksums(self):
+        for tick in [tick for tick in self._remote_checksums if tick in self._local_checksums]:
+            if self._remote_checksums.pop(tick) != self._local_checksums.pop(tick):
+                self.desyncs += 1
+                print(f"[Rollback] Estado divergiu do adversário no tick {tick}")
+
+    def _prune(self):
+        # Ninguém volta para antes do primeiro tick não confirmado, e o histórico enviado
+        # começa no primeiro input nosso que o adversário ainda não confirmou
+        keep_from = min(self.remote_confirmed + 1, self.frame - self.max_rollback, self._next_checksum,
+                        self.remote_ack + 1)
+        for table in (self.states, self.inputs[1], self.inputs[2]):
+            for tick in [tick for tick in table if tick < keep_from - 1]:
+                del table[tick]
+
+    def get_stats(self) -> dict:
+        return {
+            'frame': self.frame,
+            'remote_confirmed': self.remote_confirmed,
+            'rollbacks': self.rollbacks,
+            'resimulated_ticks': self.resimulated_ticks,
+            'max_rollback_depth': self.max_rollback_depth,
+            'stalls': self.stalls,
+            'time_sync_waits': self.time_sync_waits,
+            'desyncs': self.desyncs,
+        }
@@ -0,0 +1,469 @@
+import heapq
+import time
+from collections import deque
+
+from network.metrics import TickStats
+from network.network_handler import DEFAULT_DELIVERY, pong_message
+from network.server import TCPServer
+from network.simulation import SLOTS, Match
+from network.snapshot import STATE_FIELDS, DeltaEncoder
+from settings import FPS
+
+
+# Atraso máximo (em ticks) que uma sala tenta recuperar antes de descartar o tempo perdido
+MAX_CATCHUP_TICKS = 10
+# Segundos sem mensagens antes de uma sala ser coletada (vazia) ou encerrada (em partida)
+DEFAULT_IDLE_TIMEOUT = 30.0
+# Clientes que não mandam join_room nesse prazo vão para uma sala pública qualquer
+PLACEMENT_TIMEOUT = 1.0
+# Intervalo entre varreduras de salas ociosas
+GC_INTERVAL = 1.0
+DEFAULT_MAX_ROOMS = 256
+# Espectadores: veem a partida com atraso (sem vantagem para quem joga assistindo a
+# própria partida), só keyframes e no máximo um snapshot a cada N ticks
+DEFAULT_SPECTATOR_DELAY = 2.0
+SPECTATOR_INTERVAL = 2
+DEFAULT_MAX_SPECTATORS = 1024
+
+
+class Room:
+    """Uma sala: até dois jogadores, sua própria Match e o encoder de snapshots.
+
+    Espectadores não ocupam slot: recebem keyframes da partida atrasados em
+    spectator_delay ticks, a mesma mensagem para todos (serializada uma vez).
+    """
+
+    def __init__(self, room_id: str, server: TCPServer, tick_rate: int = FPS,
+                 public: bool = True, delivery: dict[str, bool] | None = None,
+                 spectator_delay: float = DEFAULT_SPECTATOR_DELAY):
+        self.room_id = room_id
+        self.server = server
+        self.tick_rate = tick_rate
+        self.public = public  # salas nomeadas (join_room com id) não recebem desconhecidos
+        self.delivery = delivery if delivery is not None else dict(DEFAULT_DELIVERY)
+        self.slots: dict[int, int] = {}  # client_id -> slot do jogador
+        self.match: Match | None = None
+        self.delta_encoder = DeltaEncoder()
+        self.inbox: list[dict] = []
+        self.tick_stats = TickStats()
+        self.last_activity = time.monotonic()
+
+        self.spectators: dict[int, None] = {}  # client_ids, em ordem de chegada
+        self.spectator_delay = max(0, round(spectator_delay * tick_rate))
+        self.spectator_tick = 0  # tick do último snapshot liberado aos espectadores
+        self._spectator_queue: deque[tuple[int, dict]] = deque()  # (liberação, keyframe)
+        self._spectator_frames = 0
+        self._spectator_seq = 0
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.slots) >= len(SLOTS)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.slots
+
+    @property
+    def is_open(self) -> bool:
+        """Aceita um jogador qualquer: pública, sem partida e com slot livre."""
+        return self.public and self.match is None and not self.is_full
+
+    def add_client(self, client_id: int) -> int | None:
+        free = [slot for slot in SLOTS if slot not in self.slots.values()]
+        if not free or self.match is not None:
+            return None
+
+        slot = free[0]
+        self.slots[client_id] = slot
+        self.last_activity = time.monotonic()
+        self.server.send_to_client(client_id, {'type': 'room_assigned', 'room': self.room_id})
+        self.server.send_to_client(client_id, {'type': 'assign_player', 'player_id': slot})
+
+        if self.is_full:
+            self.delta_encoder = DeltaEncoder()
+            self.match = Match(self.tick_rate)
+            self.match.start()
+            self._send_to_room({'type': 'game_start'})
+            print(f"[Rooms] Sala {self.room_id}: partida iniciada")
+        return slot
+
+    def remove_client(self, client_id: int):
+        if self.slots.pop(client_id, None) is None:
+            return
+        self.delta_encoder.remove_client(client_id)
+        self.last_activity = time.monotonic()
+
+        if self.match:
+            # Sem adversário a partida acaba: os outros veem a queda e voltam ao menu
+            self.close("jogador saiu")
+
+    def add_spectator(self, client_id: int):
+        self.spectators[client_id] = None
+        self.server.send_to_client(client_id, {
+            'type': 'spectate_start',
+            'room': self.room_id,
+            'delay_ms': self.spectator_delay * 1000 // self.tick_rate,
+        })
+
+    def remove_spectator(self, client_id: int):
+        self.spectators.pop(client_id, None)
+        if not self.spectators:
+            self._spectator_queue.clear()
+
+    def close(self, reason: str):
+        self.match = None
+        print(f"[Rooms] Sala {self.room_id}: partida encerrada ({reason})")
+        for other_id in list(self.slots):
+            self.slots.pop(other_id)
+            self.delta_encoder.remove_client(other_id)
+            self.server.kick_client(other_id)
+        self.close_spectators()
+
+    def close_spectators(self):
+        for spectator_id in list(self.spectators):
+            self.server.kick_client(spectator_id)
+        self.spectators.clear()
+        self._spectator_queue.clear()
+
+    def tick(self):
+        start = time.perf_counter()
+
+        inbox, self.inbox = self.inbox, []
+        for msg in inbox:
+            self._handle_message(msg)
+
+        if self.match:
+            self.match.step()
+            self._send_snapshots()
+
+        self.tick_stats.record(time.perf_counter() - start)
+
+    def _reliable(self, msg_type: str) -> bool:
+        return self.delivery.get(msg_type, True)
+
+    def _send_to_room(self, data: dict, exclude: int | None = None, reliable: bool = True):
+        for client_id in self.slots:
+            if client_id != exclude:
+                self.server.send_to_client(client_id, data, reliable=reliable)
+
+    def _handle_message(self, msg: dict):
+        msg_type = msg.get('type')
+        client_id = msg.get('_client_id')
+        self.last_activity = time.monotonic()
+
+        if msg_type == 'input':
+            slot = self.slots.get(client_id)
+            if slot is None or not self.match:
+                return
+            self.match.apply_input(slot, msg)
+
+            opponent_msg = {'type': 'opponent_input', 'direction': msg.get('direction', 0)}
+            if msg.get('paddle_y') is not None:
+                opponent_msg['paddle_y'] = msg['paddle_y']
+            self._send_to_room(opponent_msg, exclude=client_id,
+                               reliable=self._reliable('opponent_input'))
+
+        elif msg_type == 'pause_request':
+            if not self.match:
+                return
+            paused = msg.get('paused', True)
+            self.match.set_pause(paused)
+            self._send_to_room({
+                'type': 'pause_state',
+                'paused': paused,
+                'initiator': 'client'
+            }, exclude=client_id)
+
+        elif msg_type == 'state_ack':
+            self.delta_encoder.ack(client_id, msg.get('seq', 0))
+
+        elif msg_type == 'keyframe_request':
+            self.delta_encoder.request_keyframe(client_id)
+
+    def _send_snapshots(self):
+        snapshot = self.match.snapshot()
+        self.delta_encoder.push(snapshot)
+        for client_id in self.slots:
+            msg = self.delta_encoder.encode_for(client_id)
+            self.server.send_to_client(client_id, msg, reliable=self._reliable(msg['type']))
+
+        if self.spectators:
+            self._send_spectator_snapshots(snapshot)
+
+    def _send_spectator_snapshots(self, snapshot: dict):
+        # Keyframes sem estado por espectador (nada de acks): um só objeto de mensagem
+        # por snapshot, entregue com broadcast depois do atraso
+        self._spectator_frames += 1
+        if self._spectator_frames % SPECTATOR_INTERVAL == 0:
+            self._spectator_seq += 1
+            msg = {'type': 'game_state', 'seq': self._spectator_seq}
+            msg.update((field, snapshot.get(field)) for field in STATE_FIELDS)
+            self._spectator_queue.append((self._spectator_frames + self.spectator_delay, msg))
+
+        queue = self._spectator_queue
+        while queue and queue[0][0] <= self._spectator_frames:
+            _, msg = queue.popleft()
+            self.spectator_tick = msg['tick']
+            self.server.broadcast(self.spectators, msg, reliable=self._reliable('game_state'))
+
+    def get_stats(self) -> dict:
+        stats = {
+            'players': len(self.slots),
+            'spectators': len(self.spectators),
+            'phase': self.match.world.phase if self.match else 'waiting',
+        }
+        stats.update(self.tick_stats.snapshot())
+        return stats
+
+
+class RoomManager:
+    """Várias partidas 1v1 num só processo, sobre um único TCPServer.
+
+    Cada conexão é roteada para uma sala (pelo join_room do cliente ou para a
+    primeira sala pública com vaga). Todas as salas são avançadas por um único
+    escalonador: um heap de prazos, com as salas defasadas entre si para espalhar
+    o custo dos ticks ao longo do período.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 5555, tick_rate: int = FPS,
+                 max_rooms: int = DEFAULT_MAX_ROOMS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 listen: bool = True, udp_port: int | None = None,
+                 max_spectators: int = DEFAULT_MAX_SPECTATORS,
+                 spectator_delay: float = DEFAULT_SPECTATOR_DELAY):
+        self.server = TCPServer(host, port, max_clients=max_rooms * len(SLOTS) + max_spectators,
+                                listen=listen, udp_port=udp_port)
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.max_rooms = max_rooms
+        self.idle_timeout = idle_timeout
+        self.max_spectators = max_spectators
+        self.spectator_delay = spectator_delay
+        self.delivery: dict[str, bool] = dict(DEFAULT_DELIVERY)
+
+        self.rooms: dict[str, Room] = {}
+        self.client_rooms: dict[int, Room] = {}
+        self.spectator_rooms: dict[int, Room] = {}
+        self._unplaced: dict[int, float] = {}    # client_id -> momento da conexão
+        self._open_rooms: dict[str, None] = {}  # salas públicas com vaga, em ordem de criação
+        self._schedule: list[tuple[float, int, str]] = []
+        self._schedule_seq = 0
+        self._room_seq = 0
+        self._last_gc = 0.0
+        self.running = False
+
+    def start(self) -> bool:
+        if not self.server.start():
+            return False
+        self.running = True
+        print(f"[Rooms] Aguardando jogadores (até {self.max_rooms} salas, {self.tick_rate} ticks/s)")
+        return True
+
+    def stop(self):
+        self.running = False
+        self.server.stop()
+
+    def run(self):
+        while self.running and self.server.running:
+            self.poll()
+            self.wait()
+
+    def wait(self):
+        """Dorme até o próximo prazo do escalonador (no máximo um tick)."""
+        if self._schedule:
+            delay = self._schedule[0][0] - time.perf_counter()
+        else:
+            delay = self.dt
+        if delay > 0:
+            time.sleep(min(delay, self.dt))
+
+    def poll(self):
+        """Roteia as mensagens e avança todas as salas cujo prazo venceu."""
+        self.server.begin_batch()
+        self._route_messages()
+
+        now = time.perf_counter()
+        while self._schedule and self._schedule[0][0] <= now:
+            deadline, seq, room_id = heapq.heappop(self._schedule)
+            room = self.rooms.get(room_id)
+            if room is None:
+                continue  # sala coletada
+
+            room.tick()
+
+            deadline += self.dt
+            if now - deadline > MAX_CATCHUP_TICKS * self.dt:
+                deadline = now + self.dt
+            heapq.heappush(self._schedule, (deadline, seq, room_id))
+
+        self.server.flush()
+
+        if time.monotonic() - self._last_gc >= GC_INTERVAL:
+            self._collect_idle_rooms()
+
+    def _route_messages(self):
+        for msg in self.server.get_messages():
+            msg_type = msg.get('type')
+
+            if msg_type == 'client_connected':
+                self._unplaced[msg['client_id']] = time.monotonic()
+
+            elif msg_type == 'client_disconnected':
+                client_id = msg['client_id']
+                self._unplaced.pop(client_id, None)
+                room = self.client_rooms.pop(client_id, None)
+                if room:
+                    room.remove_client(client_id)
+                    self._update_open(room)
+                room = self.spectator_rooms.pop(client_id, None)
+                if room:
+                    room.remove_spectator(client_id)
+
+            elif msg_type == 'join_room':
+                if msg.get('role') == 'spectator':
+                    self._spectate(msg.get('_client_id'), msg.get('room'))
+                else:
+                    self._join_room(msg.get('_client_id'), msg.get('room'))
+
+            elif msg_type == 'ping':
+                # Respondido já no roteamento: o RTT não inclui a espera pelo tick da sala
+                client_id = msg.get('_client_id')
+                room = self.client_rooms.get(client_id)
+                tick = room.match.world.tick if room and room.match else 0
+                if client_id in self.spectator_rooms:
+                    # O relógio do espectador acompanha o stream atrasado
+                    tick = self.spectator_rooms[client_id].spectator_tick
+                self.server.send_to_client(client_id, pong_message(msg, tick),
+                                           reliable=self.delivery.get('pong', True))
+
+            else:
+                # Mensagens de espectadores (inputs, pausa) não chegam à sala
+                room = self.client_rooms.get(msg.get('_client_id'))
+                if room:
+                    room.inbox.append(msg)
+
+        # Clientes sem join_room (versões antigas, outros programas): sala pública
+        if self._unplaced:
+            now = time.monotonic()
+            for client_id, connected_at in list(self._unplaced.items()):
+                if now - connected_at >= PLACEMENT_TIMEOUT:
+                    self._join_room(client_id, None)
+
+    def _join_room(self, client_id: int, room_id: str | None):
+        if client_id is None or client_id in self.spectator_rooms:
+            return
+        current = self.client_rooms.get(client_id)
+        if current is not None:
+            if current.match is not None or current.room_id == room_id:
+                return  # já está jogando (ou já está nessa sala)
+            current.remove_client(client_id)
+            del self.client_rooms[client_id]
+            self._update_open(current)
+        self._unplaced.pop(client_id, None)
+
+        if room_id is None:
+            room = self._first_open_room() or self._create_room(public=True)
+        else:
+            room_id = str(room_id)
+            room = self.rooms.get(room_id) or self._create_room(room_id, public=False)
+
+        if room is None or room.add_client(client_id) is None:
+            print(f"[Rooms] Cliente {client_id} sem sala disponível")
+            self.server.send_to_client(client_id, {'type': 'room_full', 'room': room_id})
+            self.server.kick_client(client_id)
+            return
+
+        self.client_rooms[client_id] = room
+        self._update_open(room)
+
+    def _spectate(self, client_id: int, room_id: str | None):
+        if client_id is None or client_id in self.client_rooms or client_id in self.spectator_rooms:
+            return
+        self._unplaced.pop(client_id, None)
+
+        room = self.rooms.get(str(room_id)) if room_id is not None else None
+        if room is None or len(self.spectator_rooms) >= self.max_spectators:
+            reason = 'sala inexistente' if room is None else 'limite de espectadores'
+            self.server.send_to_client(client_id, {'type': 'spectate_error', 'room': room_id,
+                                                   'reason': reason})
+            self.server.kick_client(client_id)
+            return
+
+        room.add_spectator(client_id)
+        self.spectator_rooms[client_id] = room
+
+    def _first_open_room(self) -> Room | None:
+        for room_id in self._open_rooms:
+            return self.rooms[room_id]
+        return None
+
+    def _update_open(self, room: Room):
+        if room.is_open and room.room_id in self.rooms:
+            self._open_rooms[room.room_id] = None
+        else:
+            self._open_rooms.pop(room.room_id, None)
+
+    def _create_room(self, room_id: str | None = None, public: bool = True) -> Room | None:
+        if len(self.rooms) >= self.max_rooms:
+            return None
+        if room_id is None:
+            self._room_seq += 1
+            room_id = str(self._room_seq)
+            while room_id in self.rooms:
+                self._room_seq += 1
+                room_id = str(self._room_seq)
+
+        room = Room(room_id, self.server, self.tick_rate, public=public, delivery=self.delivery,
+                    spectator_delay=self.spectator_delay)
+        self.rooms[room_id] = room
+
+        # Prazo inicial defasado dentro do período: as salas não tickam todas juntas
+        offset = (self._schedule_seq * 0.618034 % 1.0) * self.dt
+        heapq.heappush(self._schedule, (time.perf_counter() + offset, self._schedule_seq, room_id))
+        self._schedule_seq += 1
+        return room
+
+    def _collect_idle_rooms(self):
+        now = time.monotonic()
+        self._last_gc = now
+        for room_id, room in list(self.rooms.items()):
+            if now - room.last_activity < self.idle_timeout:
+                continue
+            if room.match:
+                # Ninguém mandou nada por idle_timeout: partida abandonada
+                room.close("ociosa")
+            if room.is_empty:
+                # Sala sem jogadores: quem só assistia também sai
+                room.close_spectators()
+                del self.rooms[room_id]
+                self._open_rooms.pop(room_id, None)
+
+    def get_room_stats(self) -> dict:
+        """Estatísticas por sala: jogadores, fase e tempo de tick (média, p99, máximo)."""
+        return {room_id: room.get_stats() for room_id, room in self.rooms.items()}
+
+    def get_stats(self) -> dict:
+        matches = sum(1 for room in self.rooms.values() if room.match)
+        # Jogadores sozinhos em salas públicas (o próximo jogador qualquer fecha a partida)
+        waiting = sum(1 for room_id in self._open_rooms if len(self.rooms[room_id].slots) == 1)
+        connections = self.server.get_connection_stats().values()
+        return {
+            'rooms': len(self.rooms),
+            'matches': matches,
+            'waiting': waiting,
+            'spectators': len(self.spectator_rooms),
+            'clients': self.server.get_client_count(),
+            # Totais das conexões (detalhe por conexão em get_connection_stats)
+            'bytes_in': sum(stats['bytes_in'] for stats in connections),
+            'bytes_out': sum(stats['bytes_out'] for stats in connections),
+            'decode_errors': sum(stats['decode_errors'] for stats in connections),
+            'send_stalls': sum(stats['send_stalls'] for stats in connections),
+            'max_receive_age_s': max((stats['last_receive_age_s'] or 0.0 for stats in connections), default=0.0),
+        }
+
+    def get_connection_stats(self) -> dict:
+        """Métricas de cada conexão (client_id -> tráfego, filas, falhas), com a sala de cada uma."""
+        connections = self.server.get_connection_stats()
+        for client_id, stats in connections.items():
+            room = self.client_rooms.get(client_id) or self.spectator_rooms.get(client_id)
+            stats['room'] = room.room_id if room else None
+        return connections
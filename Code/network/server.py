@@ -1,42 +1,126 @@
 import socket
-import json
 import threading
-import select
+import selectors
+import secrets
+import time
 from collections import deque
 
+from network.framing import (DEFAULT_MAX_FRAME_SIZE, LENGTH_PREFIX_SIZE, FrameBuffer, FrameTooLargeError,
+                             send_vectored)
+from network.metrics import ConnectionStats, SendStats
+from network.protocol import (CODEC_BINARY, CODEC_JSON, decode_message, encode_message,
+                              frame, negotiate_codec)
+from network.udp import (MAX_DATAGRAM_SIZE, RECORD_OVERHEAD, SequenceCounter, SequenceFilter,
+                         pack_datagrams, unpack_datagram)
+
+
+# Limite da fila de escrita por cliente; acima disso o cliente é desconectado
+DEFAULT_MAX_QUEUE_BYTES = 256 * 1024
+# Tempo máximo (s) com a fila de escrita sem esvaziar antes de desconectar o cliente
+DEFAULT_MAX_LAG = 3.0
+# Com fila pendente, o reator acorda pelo menos nesse intervalo para checar o atraso
+BACKLOG_CHECK_INTERVAL = 0.25
+# Frames por chamada de sendmsg ao drenar a fila
+_MAX_IOV = 64
+
+# Mensagens que só valem pela mais recente: na fila, uma nova descarta as anteriores do grupo
+SUPERSEDED_GROUPS = {
+    'game_state': 'snapshot',
+    'game_state_delta': 'snapshot',
+    'opponent_input': 'opponent_input',
+}
+
 
 class TCPServer:
-    def __init__(self, host: str = '0.0.0.0', port: int = 5555, max_clients: int = 2):
+    def __init__(self, host: str = '0.0.0.0', port: int = 5555, max_clients: int = 2,
+                 codec: str = CODEC_BINARY, udp: bool = True,
+                 max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+                 max_queue_bytes: int = DEFAULT_MAX_QUEUE_BYTES,
+                 max_lag: float = DEFAULT_MAX_LAG,
+                 listen: bool = True, udp_port: int | None = None):
         self.host = host
         self.port = port
+        # listen=False: sem socket de escuta, as conexões chegam por adopt_client()
+        # (worker de um servidor fragmentado)
+        self.listen = listen
         self.max_clients = max_clients
+        self.codec = codec  # codec preferido; cada cliente negocia o seu no hello
+        self.max_frame_size = max_frame_size
+        # Backpressure: clientes lentos perdem snapshots antigos e, se não alcançarem, são removidos
+        self.max_queue_bytes = max_queue_bytes
+        self.max_lag = max_lag
         
         self.server_socket: socket.socket | None = None
         self.running = False
         
+        # Canal UDP não-confiável (mesma porta do TCP) para estado por tick e input
+        self.udp_enabled = udp
+        self.udp_port = udp_port  # None = mesma porta do TCP; 0 = porta efêmera
+        self.udp_socket: socket.socket | None = None
+        self._udp_tokens: dict[int, socket.socket] = {}
+        
         self.clients: dict[socket.socket, dict] = {}
-        self.client_lock = threading.Lock()
+        # Índice client_id -> socket: envios e kicks por id sem varrer todas as conexões
+        self._client_sockets: dict[int, socket.socket] = {}
+        # Clientes no mesmo processo (LoopbackClient): client_id -> cliente, sem socket
+        self._local_clients: dict[int, object] = {}
+        # Ids nunca são reutilizados: com entradas e saídas, len(clients) + 1 colidiria
+        self._next_client_id = 1
+        # RLock: um erro de envio (com o lock já adquirido) pode disparar a desconexão
+        self.client_lock = threading.RLock()
         
         self.receive_queue: deque = deque()
         
-        self._accept_thread: threading.Thread | None = None
-        self._receive_thread: threading.Thread | None = None
+        # Reator único (epoll/kqueue/select): accept, leitura e escrita no mesmo loop
+        self._selector: selectors.BaseSelector | None = None
+        self._loop_thread: threading.Thread | None = None
+        self._wakeup_r: socket.socket | None = None
+        self._wakeup_w: socket.socket | None = None
+        self._wake_pending = False
+        # Alterações no selector só acontecem na thread do reator
+        self._want_write: set[socket.socket] = set()
+        self._closing: list[socket.socket] = []
+        # Clientes com fila de escrita pendente (checados pelo reator)
+        self._backlogged: set[socket.socket] = set()
+        # Conexões aceitas em outro processo, registradas pelo reator: (socket, endereço, bytes já lidos)
+        self._adopting: list[tuple[socket.socket, tuple, bytes]] = []
+        
+        # Coalescência por tick: entre begin_batch() e flush() os envios só são enfileirados
+        self._batching = False
+        # Conexões com envios acumulados no tick atual (flush não varre as ociosas)
+        self._dirty: dict[socket.socket, None] = {}
+        self.send_stats = SendStats()
     
     def start(self) -> bool:
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(self.max_clients)
-            self.server_socket.setblocking(False)
+            if self.listen:
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.server_socket.bind((self.host, self.port))
+                self.server_socket.listen(self.max_clients)
+                self.server_socket.setblocking(False)
             
-            self.running = True
+            if self.udp_enabled:
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.bind((self.host, self.port if self.udp_port is None else self.udp_port))
+                self.udp_socket.setblocking(False)
             
-            self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
-            self._accept_thread.start()
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._wake_pending = False
+            self._wakeup_r.setblocking(False)
+            self._wakeup_w.setblocking(False)
             
-            self._receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
-            self._receive_thread.start()
+            self._selector = selectors.DefaultSelector()
+            if self.server_socket:
+                self._selector.register(self.server_socket, selectors.EVENT_READ, 'accept')
+            self._selector.register(self._wakeup_r, selectors.EVENT_READ, 'wakeup')
+            if self.udp_socket:
+                self._selector.register(self.udp_socket, selectors.EVENT_READ, 'udp')
+            
+            self.running = True
+            
+            self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._loop_thread.start()
             
             print(f"[TCP Server] Servidor iniciado em {self.host}:{self.port}")
             return True
@@ -48,7 +132,22 @@ class TCPServer:
     def stop(self):
         self.running = False
         
-        # Fechar o socket do servidor primeiro para desbloquear accept()
+        # Acorda o reator e espera ele sair antes de fechar os sockets
+        self._wake()
+        if (self._loop_thread and self._loop_thread.is_alive()
+                and self._loop_thread is not threading.current_thread()):
+            self._loop_thread.join(timeout=1.0)
+        self._loop_thread = None
+        
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+        
+        for sock in (self._wakeup_r, self._wakeup_w):
+            if sock:
+                sock.close()
+        self._wakeup_r = self._wakeup_w = None
+        
         if self.server_socket:
             try:
                 self.server_socket.close()
@@ -56,6 +155,13 @@ class TCPServer:
                 pass
             self.server_socket = None
         
+        if self.udp_socket:
+            try:
+                self.udp_socket.close()
+            except:
+                pass
+            self.udp_socket = None
+        
         # Fechar conexões dos clientes sem esperar
         with self.client_lock:
             for client_socket in list(self.clients.keys()):
@@ -64,125 +170,322 @@ class TCPServer:
                 except:
                     pass
             self.clients.clear()
+            self._client_sockets.clear()
+            self._dirty.clear()
+            self._udp_tokens.clear()
+            self._want_write.clear()
+            self._backlogged.clear()
+            # Clientes locais percebem o encerramento como uma queda de conexão
+            for local in self._local_clients.values():
+                local.connected = False
+            self._local_clients.clear()
+            for client_socket in self._closing:
+                client_socket.close()
+            self._closing.clear()
+            for client_socket, _, _ in self._adopting:
+                client_socket.close()
+            self._adopting.clear()
         
         print("[TCP Server] Servidor encerrado")
     
-    def _accept_loop(self):
-        while self.running and self.server_socket:
+    def _wake(self):
+        """Interrompe o select() do reator (chamado de outras threads)."""
+        # Um byte pendente basta: rajadas de kicks/escritas não viram uma syscall cada
+        if self._wakeup_w and not self._wake_pending:
+            self._wake_pending = True
             try:
-                ready, _, _ = select.select([self.server_socket], [], [], 0.1)
-                
-                if not ready:
+                self._wakeup_w.send(b'\0')
+            except (BlockingIOError, OSError):
+                pass  # já há um wakeup pendente
+    
+    def _run_loop(self):
+        """Loop do reator: bloqueia até haver I/O, sem polling."""
+        while self.running and self._selector:
+            timeout = BACKLOG_CHECK_INTERVAL if self._backlogged else None
+            try:
+                events = self._selector.select(timeout)
+            except (OSError, ValueError):
+                if self.running:
                     continue
+                break
+            
+            for key, mask in events:
+                kind = key.data
                 
+                if kind == 'accept':
+                    self._accept_clients()
+                elif kind == 'udp':
+                    self._handle_udp_data()
+                elif kind == 'wakeup':
+                    self._drain_wakeup()
+                else:
+                    if mask & selectors.EVENT_READ:
+                        self._handle_client_data(key.fileobj)
+                    if mask & selectors.EVENT_WRITE:
+                        self._flush_outbox(key.fileobj)
+            
+            if self._backlogged:
+                self._check_backlogs()
+            self._apply_selector_changes()
+    
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(512):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        # Limpa só depois de drenar: quem pulou o envio já enfileirou sua mudança,
+        # e _apply_selector_changes roda ainda nesta volta do loop
+        self._wake_pending = False
+    
+    def _apply_selector_changes(self):
+        with self.client_lock:
+            closing, self._closing = self._closing, []
+            want_write, self._want_write = self._want_write, set()
+            adopting, self._adopting = self._adopting, []
+        
+        for client_socket, address, initial_data in adopting:
+            self._register_client(client_socket, address, initial_data)
+        
+        for client_socket in closing:
+            try:
+                self._selector.unregister(client_socket)
+            except (KeyError, ValueError):
+                pass
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
+            finally:
+                client_socket.close()
+        
+        for client_socket in want_write:
+            if client_socket.fileno() == -1:
+                continue
+            try:
+                self._selector.modify(client_socket, selectors.EVENT_READ | selectors.EVENT_WRITE, 'client')
+            except (KeyError, ValueError):
+                pass
+    
+    def _accept_clients(self):
+        while self.running and self.server_socket:
+            try:
                 client_socket, address = self.server_socket.accept()
-                
-                with self.client_lock:
-                    if len(self.clients) >= self.max_clients:
-                        print(f"[TCP Server] Conexão recusada (servidor cheio): {address}")
-                        client_socket.close()
-                        continue
-                
-                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                
-                client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-                try:
-                    client_socket.setsockopt(socket.IPPROTO_TCP, 4, 10)   # TCP_KEEPIDLE
-                    client_socket.setsockopt(socket.IPPROTO_TCP, 5, 3)    # TCP_KEEPINTVL
-                    client_socket.setsockopt(socket.IPPROTO_TCP, 6, 3)    # TCP_KEEPCNT
-                except (AttributeError, OSError):
-                    pass
-                
-                client_socket.setblocking(False)
-                
-                client_id = len(self.clients) + 1
-                
-                with self.client_lock:
-                    self.clients[client_socket] = {
-                        'id': client_id,
-                        'address': address,
-                        'buffer': b''
-                    }
-                
-                print(f"[TCP Server] Cliente {client_id} conectado: {address}")
-                
-                self.receive_queue.append({
-                    'type': 'client_connected',
-                    'client_id': client_id,
-                    'address': address
-                })
-                
+            except (BlockingIOError, InterruptedError):
+                return  # nenhuma conexão pendente
             except Exception as e:
                 if self.running:
                     print(f"[TCP Server] Erro ao aceitar conexão: {e}")
+                return
+            
+            self._register_client(client_socket, address)
+    
+    def adopt_client(self, client_socket: socket.socket, address: tuple, initial_data: bytes = b''):
+        """Assume uma conexão aceita em outro lugar (ex.: passada por outro processo).
+        
+        `initial_data` são bytes que já foram lidos do socket; eles são processados
+        como se tivessem acabado de chegar. O registro acontece na thread do reator.
+        """
+        with self.client_lock:
+            self._adopting.append((client_socket, address, initial_data))
+        self._wake()
     
-    def _receive_loop(self):
-        while self.running:
+    def _register_client(self, client_socket: socket.socket, address: tuple,
+                         initial_data: bytes = b'') -> int | None:
+        try:
             with self.client_lock:
-                if not self.clients:
-                    continue
-                client_sockets = list(self.clients.keys())
+                if self.get_client_count() >= self.max_clients:
+                    print(f"[TCP Server] Conexão recusada (servidor cheio): {address}")
+                    client_socket.close()
+                    return None
+            
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
             try:
-                if not client_sockets:
-                    select.select([], [], [], 0.1)
-                    continue
-                    
-                ready_to_read, _, _ = select.select(client_sockets, [], [], 0.1)
-                
-                for client_socket in ready_to_read:
-                    self._handle_client_data(client_socket)
-                    
-            except Exception as e:
-                if self.running:
-                    continue
-    
-    def _handle_client_data(self, client_socket: socket.socket):
-        try:
-            chunk = client_socket.recv(4096)
+                client_socket.setsockopt(socket.IPPROTO_TCP, 4, 10)   # TCP_KEEPIDLE
+                client_socket.setsockopt(socket.IPPROTO_TCP, 5, 3)    # TCP_KEEPINTVL
+                client_socket.setsockopt(socket.IPPROTO_TCP, 6, 3)    # TCP_KEEPCNT
+            except (AttributeError, OSError):
+                pass
             
-            if not chunk:
-                self._handle_disconnect(client_socket)
-                return
+            client_socket.setblocking(False)
             
-            with self.client_lock:
-                if client_socket not in self.clients:
-                    return
-                self.clients[client_socket]['buffer'] += chunk
-                client_info = self.clients[client_socket]
+            client_id = self._allocate_client_id()
             
-            self._process_client_buffer(client_socket, client_info)
+            with self.client_lock:
+                self.clients[client_socket] = {
+                    'id': client_id,
+                    'address': address,
+                    'buffer': FrameBuffer(max_frame_size=self.max_frame_size),
+                    'codec': CODEC_JSON,  # até o hello do cliente
+                    'udp_token': None,
+                    'udp_addr': None,
+                    'udp_seq': SequenceCounter(),
+                    'udp_filter': SequenceFilter(),
+                    'outbox': deque(),      # [tipo, bytes restantes, já começou] ainda não aceitos pelo socket
+                    'outbox_bytes': 0,
+                    'backlog_since': None,  # quando a fila de escrita deixou de estar vazia
+                    'dropped': 0,           # mensagens substituídas enquanto estavam na fila
+                    'pending': [],          # frames TCP do tick atual (até o flush)
+                    'udp_pending': [],      # registros (seq, payload) do tick atual
+                    'stats': ConnectionStats()
+                }
+                self._client_sockets[client_id] = client_socket
             
+            self._selector.register(client_socket, selectors.EVENT_READ, 'client')
+        except Exception as e:
+            if self.running:
+                print(f"[TCP Server] Erro ao aceitar conexão: {e}")
+            client_socket.close()
+            return None
+        
+        print(f"[TCP Server] Cliente {client_id} conectado: {address}")
+        
+        self.receive_queue.append({
+            'type': 'client_connected',
+            'client_id': client_id,
+            'address': address
+        })
+        
+        if initial_data:
+            client_info = self.clients[client_socket]
+            client_info['stats'].bytes_in += len(initial_data)
+            client_info['buffer'].feed(initial_data)
+            try:
+                self._process_client_buffer(client_socket, client_info)
+            except ValueError as e:
+                print(f"[TCP Server] Cliente {client_id} enviou frame inválido: {e}")
+                self._handle_disconnect(client_socket)
+        return client_id
+    
+    def _handle_client_data(self, client_socket: socket.socket):
+        with self.client_lock:
+            client_info = self.clients.get(client_socket)
+        if client_info is None:
+            return
+        
+        try:
+            received = client_info['buffer'].recv_from(client_socket)
+        except (BlockingIOError, InterruptedError):
+            return
         except ConnectionResetError:
             self._handle_disconnect(client_socket)
+            return
+        except Exception as e:
+            if self.running:
+                print(f"[TCP Server] Erro ao receber dados: {e}")
+            self._handle_disconnect(client_socket)
+            return
+        
+        if not received:
+            self._handle_disconnect(client_socket)
+            return
+        client_info['stats'].bytes_in += received
+        
+        try:
+            self._process_client_buffer(client_socket, client_info)
+        except FrameTooLargeError as e:
+            print(f"[TCP Server] Cliente {client_info['id']} enviou frame inválido: {e}")
+            self._handle_disconnect(client_socket)
         except Exception as e:
             if self.running:
                 print(f"[TCP Server] Erro ao receber dados: {e}")
             self._handle_disconnect(client_socket)
     
     def _process_client_buffer(self, client_socket: socket.socket, client_info: dict):
-        buffer = client_info['buffer']
-        
-        while len(buffer) >= 4:
-            msg_length = int.from_bytes(buffer[:4], byteorder='big')
-            
-            if len(buffer) < 4 + msg_length:
-                break
-            
-            payload = buffer[4:4 + msg_length]
-            buffer = buffer[4 + msg_length:]
-            
+        # Payloads são fatias do buffer da conexão: decodifica antes da próxima recepção
+        stats = client_info['stats']
+        for payload in client_info['buffer'].frames():
             try:
-                data = json.loads(payload.decode('utf-8'))
-                data['_client_id'] = client_info['id']
-                self.receive_queue.append(data)
-            except json.JSONDecodeError as e:
-                print(f"[TCP Server] Erro ao decodificar JSON: {e}")
-        
+                data = decode_message(payload)
+            except ValueError as e:
+                stats.decode_errors += 1
+                print(f"[TCP Server] Erro ao decodificar mensagem: {e}")
+                continue
+            stats.record_in(data.get('type'), LENGTH_PREFIX_SIZE + len(payload))
+
+            if data.get('type') == 'hello':
+                self._handle_hello(client_socket, client_info, data)
+                continue
+
+            data['_client_id'] = client_info['id']
+            self.receive_queue.append(data)
+    
+    def _handle_hello(self, client_socket: socket.socket, client_info: dict, hello: dict):
+        """Negocia o codec com o cliente. A resposta sai em JSON, antes da troca."""
+        codec = negotiate_codec(hello, self.codec)
         with self.client_lock:
-            if client_socket in self.clients:
-                self.clients[client_socket]['buffer'] = buffer
+            if client_socket not in self.clients:
+                return
+            self._send_to_socket(client_socket, {'type': 'codec', 'codec': codec})
+            client_info['codec'] = codec
+            
+            # Oferece o canal UDP: o cliente se identifica nos datagramas pelo token
+            if self.udp_socket and hello.get('udp'):
+                token = secrets.randbits(32)
+                while token in self._udp_tokens:
+                    token = secrets.randbits(32)
+                client_info['udp_token'] = token
+                self._udp_tokens[token] = client_socket
+                self._send_to_socket(client_socket, {
+                    'type': 'udp_token',
+                    'token': token,
+                    'port': self.udp_socket.getsockname()[1]  # pode ser diferente da porta TCP
+                })
+        print(f"[TCP Server] Cliente {client_info['id']} usando codec {codec}")
     
+    def _handle_udp_data(self):
+        while self.udp_socket:
+            try:
+                data, address = self.udp_socket.recvfrom(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except (ConnectionRefusedError, ConnectionResetError):
+                # ICMP port unreachable de um cliente que já saiu
+                continue
+            except OSError:
+                return
+            
+            unpacked = unpack_datagram(data)
+            if unpacked is None:
+                continue
+            token, records = unpacked
+            
+            with self.client_lock:
+                client_socket = self._udp_tokens.get(token)
+                if client_socket is None or client_socket not in self.clients:
+                    continue
+                client_info = self.clients[client_socket]
+                stats = client_info['stats']
+                stats.bytes_in += len(data)
+                
+                first_datagram = client_info['udp_addr'] is None
+                # Atualiza o endereço mesmo depois (rebinding de NAT)
+                client_info['udp_addr'] = address
+                if first_datagram:
+                    self._send_to_socket(client_socket, {'type': 'udp_ready'})
+            
+            for seq, payload in records:
+                try:
+                    msg = decode_message(payload)
+                except ValueError as e:
+                    stats.decode_errors += 1
+                    print(f"[TCP Server] Datagrama inválido: {e}")
+                    continue
+                
+                msg_type = msg.get('type')
+                stats.record_in(msg_type, RECORD_OVERHEAD + len(payload))
+                if msg_type == 'udp_hello':
+                    continue
+                
+                # Descarta datagramas antigos ou fora de ordem
+                if not client_info['udp_filter'].accept(msg_type, seq):
+                    continue
+                
+                msg['_client_id'] = client_info['id']
+                self.receive_queue.append(msg)
+
     def _handle_disconnect(self, client_socket: socket.socket):
         with self.client_lock:
             if client_socket not in self.clients:
@@ -200,46 +503,313 @@ class TCPServer:
         print(f"[TCP Server] Cliente {client_id} desconectado")
     
     def _disconnect_client(self, client_socket: socket.socket):
-        try:
-            client_socket.shutdown(socket.SHUT_RDWR)
-        except:
-            pass
-        finally:
-            client_socket.close()
-        
+        # O fechamento real acontece na thread do reator (_apply_selector_changes)
         with self.client_lock:
             if client_socket in self.clients:
-                del self.clients[client_socket]
+                client_info = self.clients.pop(client_socket)
+                self._udp_tokens.pop(client_info['udp_token'], None)
+                self._client_sockets.pop(client_info['id'], None)
+                self._want_write.discard(client_socket)
+                self._backlogged.discard(client_socket)
+                self._closing.append(client_socket)
+        self._wake()
+    
+    def _allocate_client_id(self) -> int:
+        with self.client_lock:
+            client_id = self._next_client_id
+            self._next_client_id += 1
+            return client_id
+    
+    def attach_local(self, local_client) -> int | None:
+        """Registra um cliente do próprio processo. Retorna o client_id ou None se estiver cheio."""
+        with self.client_lock:
+            if self.get_client_count() >= self.max_clients:
+                print("[TCP Server] Conexão recusada (servidor cheio): loopback")
+                return None
+            client_id = self._allocate_client_id()
+            self._local_clients[client_id] = local_client
+        
+        print(f"[TCP Server] Cliente {client_id} conectado: loopback")
+        self.receive_queue.append({
+            'type': 'client_connected',
+            'client_id': client_id,
+            'address': None
+        })
+        return client_id
     
-    def send_to_client(self, client_id: int, data: dict) -> bool:
+    def detach_local(self, client_id: int):
         with self.client_lock:
-            for client_socket, info in self.clients.items():
-                if info['id'] == client_id:
-                    return self._send_to_socket(client_socket, data)
+            if self._local_clients.pop(client_id, None) is None:
+                return
+        
+        self.receive_queue.append({
+            'type': 'client_disconnected',
+            'client_id': client_id
+        })
+        print(f"[TCP Server] Cliente {client_id} desconectado")
+    
+    def receive_local(self, client_id: int, data: dict):
+        """Mensagem de um cliente local: entra na fila como se tivesse vindo do socket."""
+        msg = dict(data)
+        msg['_client_id'] = client_id
+        self.receive_queue.append(msg)
+    
+    def kick_client(self, client_id: int) -> bool:
+        """Desconecta um cliente pelo id (gera client_disconnected como uma queda normal)."""
+        with self.client_lock:
+            local = self._local_clients.get(client_id)
+            if local is not None:
+                local.connected = False
+                self.detach_local(client_id)
+                return True
+            client_socket = self._client_sockets.get(client_id)
+            if client_socket is None:
+                return False
+            info = self.clients[client_socket]
+            
+            # O que já foi enfileirado neste tick (ex.: o motivo) sai antes do fechamento
+            if info['pending']:
+                frames, info['pending'] = info['pending'], []
+                self._write(client_socket, info, frames)
+        
+        self._handle_disconnect(client_socket)
+        return True
+    
+    def send_to_client(self, client_id: int, data: dict, reliable: bool = True) -> bool:
+        with self.client_lock:
+            local = self._local_clients.get(client_id)
+            if local is not None:
+                return local.deliver(data)
+            client_socket = self._client_sockets.get(client_id)
+            if client_socket is not None:
+                return self._send_to_socket(client_socket, data, reliable)
         return False
     
-    def send_to_all(self, data: dict):
+    def send_to_all(self, data: dict, reliable: bool = True):
         with self.client_lock:
-            for client_socket in list(self.clients.keys()):
-                self._send_to_socket(client_socket, data)
+            self.broadcast(self.get_client_ids(), data, reliable)
     
-    def send_to_all_except(self, exclude_client_id: int, data: dict):
+    def send_to_all_except(self, exclude_client_id: int, data: dict, reliable: bool = True):
         with self.client_lock:
-            for client_socket, info in list(self.clients.items()):
-                if info['id'] != exclude_client_id:
-                    self._send_to_socket(client_socket, data)
+            self.broadcast([client_id for client_id in self.get_client_ids() if client_id != exclude_client_id],
+                           data, reliable)
     
-    def _send_to_socket(self, client_socket: socket.socket, data: dict) -> bool:
-        try:
-            payload = json.dumps(data).encode('utf-8')
-            length_prefix = len(payload).to_bytes(4, byteorder='big')
-            message = length_prefix + payload
-            client_socket.sendall(message)
+    def broadcast(self, client_ids, data: dict, reliable: bool = True) -> int:
+        """Envia a mesma mensagem a vários clientes, serializada uma vez por codec.
+        
+        Todos os destinos compartilham os mesmos bytes (inclusive na fila de escrita):
+        com muitos espectadores o custo por destino é só a escrita. Retorna quantos
+        clientes receberam a mensagem.
+        """
+        encoded: dict = {}
+        delivered = 0
+        with self.client_lock:
+            for client_id in client_ids:
+                local = self._local_clients.get(client_id)
+                if local is not None:
+                    delivered += local.deliver(data)
+                    continue
+                client_socket = self._client_sockets.get(client_id)
+                if client_socket is not None and self._send_to_socket(client_socket, data, reliable, encoded):
+                    delivered += 1
+        return delivered
+    
+    def begin_batch(self):
+        """Passa a acumular os envios até flush(), tipicamente um tick de simulação."""
+        with self.client_lock:
+            self._batching = True
+    
+    def flush(self):
+        """Envia tudo o que foi acumulado: uma syscall por conexão TCP (e por datagrama)."""
+        with self.client_lock:
+            self._batching = False
+            dirty, self._dirty = self._dirty, {}
+            for client_socket in dirty:
+                info = self.clients.get(client_socket)
+                if info is None:
+                    continue  # desconectou durante o tick
+                if info['udp_pending']:
+                    records, info['udp_pending'] = info['udp_pending'], []
+                    self.send_stats.record_flush(len(records))
+                    self._send_datagrams(info, records)
+                if info['pending']:
+                    frames, info['pending'] = info['pending'], []
+                    self.send_stats.record_flush(len(frames))
+                    self._write(client_socket, info, frames)
+    
+    def _encode(self, data: dict, codec: str, framed: bool, encoded: dict | None) -> bytes:
+        """Payload (ou frame TCP) da mensagem; `encoded` guarda o resultado entre destinos."""
+        if encoded is not None and (codec, framed) in encoded:
+            return encoded[(codec, framed)]
+        if framed:
+            payload = frame(self._encode(data, codec, False, encoded))
+        else:
+            payload = encode_message(data, codec)
+            self.send_stats.encodes += 1
+        if encoded is not None:
+            encoded[(codec, framed)] = payload
+        return payload
+    
+    def _send_to_socket(self, client_socket: socket.socket, data: dict, reliable: bool = True,
+                        encoded: dict | None = None) -> bool:
+        info = self.clients.get(client_socket)
+        if info is None:
+            return False
+        
+        self.send_stats.messages += 1
+        
+        # Não-confiável só depois que o cliente provou que o UDP funciona; senão cai no TCP
+        if not reliable and info['udp_addr'] and self.udp_socket:
+            record = (info['udp_seq'].next(data.get('type')), self._encode(data, info['codec'], False, encoded))
+            info['stats'].record_out(data.get('type'), RECORD_OVERHEAD + len(record[1]))
+            if self._batching:
+                info['udp_pending'].append(record)
+                self._dirty[client_socket] = None
+            else:
+                self._send_datagrams(info, [record])
+            return True
+        
+        message = (data.get('type'), self._encode(data, info['codec'], True, encoded))
+        stats = info['stats']
+        stats.record_out(message[0], len(message[1]))
+        stats.bytes_out += len(message[1])
+        if self._batching:
+            info['pending'].append(message)
+            self._dirty[client_socket] = None
             return True
+        return self._write(client_socket, info, [message])
+    
+    def _send_datagrams(self, info: dict, records: list):
+        if not self.udp_socket or not info['udp_addr']:
+            return
+        for datagram in pack_datagrams(info['udp_token'], records):
+            try:
+                self.udp_socket.sendto(datagram, info['udp_addr'])
+                self.send_stats.record_syscalls()
+                info['stats'].bytes_out += len(datagram)
+            except OSError:
+                pass  # perda de datagrama é aceitável neste canal
+    
+    def _write(self, client_socket: socket.socket, info: dict, messages: list) -> bool:
+        """Envia frames (tipo, bytes) sem bloquear; o que o kernel não aceitar vai para a fila."""
+        # Já há bytes pendentes: enfileira atrás deles para preservar a ordem
+        if info['outbox']:
+            for msg_type, buffer in messages:
+                self._enqueue(info, msg_type, buffer)
+            return self._check_backlog(client_socket, info)
+        
+        try:
+            sent = send_vectored(client_socket, [buffer for _, buffer in messages])
+            self.send_stats.record_syscalls()
+        except (BlockingIOError, InterruptedError):
+            sent = 0  # EAGAIN não é erro: só significa que o buffer do kernel está cheio
         except Exception as e:
             print(f"[TCP Server] Erro ao enviar: {e}")
             self._handle_disconnect(client_socket)
             return False
+        
+        # Buffer do kernel cheio: o reator termina o envio quando o socket ficar gravável
+        for msg_type, buffer in messages:
+            if sent >= len(buffer):
+                sent -= len(buffer)
+                continue
+            self._enqueue(info, msg_type, memoryview(buffer)[sent:], started=sent > 0)
+            sent = 0
+        
+        if info['outbox']:
+            if info['backlog_since'] is None:
+                info['backlog_since'] = time.monotonic()
+                info['stats'].send_stalls += 1
+            self._backlogged.add(client_socket)
+            self._want_write.add(client_socket)
+            self._wake()
+            return self._check_backlog(client_socket, info)
+        return True
+    
+    def _enqueue(self, info: dict, msg_type: str | None, buffer, started: bool = False):
+        outbox = info['outbox']
+        group = SUPERSEDED_GROUPS.get(msg_type)
+        if group is not None and outbox:
+            # Cliente atrasado: snapshots ainda não iniciados perdem o sentido com um mais novo
+            kept = deque()
+            for entry in outbox:
+                if not entry[2] and SUPERSEDED_GROUPS.get(entry[0]) == group:
+                    info['outbox_bytes'] -= len(entry[1])
+                    info['dropped'] += 1
+                    self.send_stats.dropped += 1
+                else:
+                    kept.append(entry)
+            info['outbox'] = outbox = kept
+        outbox.append([msg_type, buffer, started])
+        info['outbox_bytes'] += len(buffer)
+    
+    def _check_backlog(self, client_socket: socket.socket, info: dict) -> bool:
+        """Política de remoção de clientes lentos. Retorna False se o cliente foi desconectado."""
+        reason = None
+        if info['outbox_bytes'] > self.max_queue_bytes:
+            reason = f"fila de envio com {info['outbox_bytes']} bytes"
+        elif (info['backlog_since'] is not None
+              and time.monotonic() - info['backlog_since'] > self.max_lag):
+            reason = f"fila de envio parada há mais de {self.max_lag:.1f}s"
+        
+        if reason is None:
+            return True
+        print(f"[TCP Server] Cliente {info['id']} muito lento ({reason}), desconectando")
+        self._handle_disconnect(client_socket)
+        return False
+    
+    def _check_backlogs(self):
+        with self.client_lock:
+            for client_socket in list(self._backlogged):
+                info = self.clients.get(client_socket)
+                if info is None:
+                    self._backlogged.discard(client_socket)
+                    continue
+                self._check_backlog(client_socket, info)
+    
+    def _flush_outbox(self, client_socket: socket.socket):
+        with self.client_lock:
+            info = self.clients.get(client_socket)
+            if info is None:
+                return
+            outbox = info['outbox']
+            
+            if outbox:
+                buffers = [entry[1] for _, entry in zip(range(_MAX_IOV), outbox)]
+                try:
+                    sent = send_vectored(client_socket, buffers)
+                    self.send_stats.record_syscalls()
+                except (BlockingIOError, InterruptedError):
+                    return
+                except Exception as e:
+                    print(f"[TCP Server] Erro ao enviar: {e}")
+                    self._handle_disconnect(client_socket)
+                    return
+                
+                info['outbox_bytes'] -= sent
+                while sent:
+                    entry = outbox[0]
+                    if sent >= len(entry[1]):
+                        sent -= len(entry[1])
+                        outbox.popleft()
+                        continue
+                    entry[1] = memoryview(entry[1])[sent:]
+                    entry[2] = True
+                    sent = 0
+                
+                if outbox:
+                    return
+            
+            if info['backlog_since'] is not None:
+                info['stats'].stalled_s += time.monotonic() - info['backlog_since']
+            info['backlog_since'] = None
+            self._backlogged.discard(client_socket)
+        
+        # Tudo enviado: volta a observar só leitura
+        try:
+            self._selector.modify(client_socket, selectors.EVENT_READ, 'client')
+        except (KeyError, ValueError):
+            pass
     
     def get_messages(self) -> list:
         messages = list(self.receive_queue)
@@ -248,11 +818,55 @@ class TCPServer:
     
     def get_client_count(self) -> int:
         with self.client_lock:
-            return len(self.clients)
+            return len(self.clients) + len(self._local_clients)
     
     def get_client_ids(self) -> list:
         with self.client_lock:
-            return [info['id'] for info in self.clients.values()]
+            return list(self._local_clients) + [info['id'] for info in self.clients.values()]
+    
+    def get_send_stats(self) -> dict:
+        return self.send_stats.snapshot()
+    
+    def get_queue_stats(self) -> dict:
+        """Estado da fila de escrita de cada cliente (id -> bytes, mensagens, descartes, atraso)."""
+        now = time.monotonic()
+        with self.client_lock:
+            return {
+                info['id']: {
+                    'queued_bytes': info['outbox_bytes'],
+                    'queued_messages': len(info['outbox']),
+                    'dropped': info['dropped'],
+                    'lag': now - info['backlog_since'] if info['backlog_since'] is not None else 0.0,
+                }
+                for info in self.clients.values()
+            }
+    
+    def get_connection_stats(self, client_id: int | None = None) -> dict:
+        """Métricas por conexão (id -> tráfego por tipo, filas, falhas, idade da última recepção).
+        
+        Com client_id, só as daquele cliente (vazio se ele não estiver conectado por socket).
+        """
+        now = time.monotonic()
+        with self.client_lock:
+            if client_id is not None:
+                client_socket = self._client_sockets.get(client_id)
+                infos = [self.clients[client_socket]] if client_socket in self.clients else []
+            else:
+                infos = list(self.clients.values())
+            result = {}
+            for info in infos:
+                stats = info['stats'].snapshot()
+                stats.update({
+                    'codec': info['codec'],
+                    'udp': info['udp_addr'] is not None,
+                    'queued_bytes': info['outbox_bytes'],
+                    'queued_messages': len(info['outbox']),
+                    'batched_messages': len(info['pending']) + len(info['udp_pending']),
+                    'dropped': info['dropped'],
+                    'lag': now - info['backlog_since'] if info['backlog_since'] is not None else 0.0,
+                })
+                result[info['id']] = stats
+            return result
 
 
 if __name__ == '__main__':
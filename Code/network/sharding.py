@@ -0,0 +1,349 @@
+"""Servidor de salas em vários processos (um por núcleo).
+
+Um supervisor aceita as conexões na porta pública, lê o começo do stream até o
+join_room do cliente e repassa o socket (fd passing por um socketpair Unix) ao
+worker escolhido, junto com os bytes já lidos. Cada worker roda seu próprio
+RoomManager e reporta a carga periodicamente.
+
+Salas nomeadas vão sempre para o mesmo worker (hash do id), e jogadores sem sala
+vão para um worker com alguém esperando adversário, ou para o menos carregado.
+"""
+import json
+import multiprocessing
+import os
+import selectors
+import socket
+import time
+import zlib
+
+from network.protocol import decode_message
+from network.rooms import (DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_ROOMS, DEFAULT_MAX_SPECTATORS,
+                           DEFAULT_SPECTATOR_DELAY, PLACEMENT_TIMEOUT, RoomManager)
+from settings import FPS
+
+
+# Intervalo entre relatórios de carga de cada worker
+REPORT_INTERVAL = 0.25
+# Bytes lidos de uma conexão nova antes de decidir o worker sem ter visto o join_room
+PEEK_LIMIT = 4096
+# Intervalo entre checagens de workers mortos
+LIVENESS_INTERVAL = 1.0
+
+_STOP = b'stop'
+
+
+def _find_join_room(data: bytes) -> tuple[bool, str | None]:
+    """Procura o join_room entre os frames completos já lidos. Retorna (decidido, sala)."""
+    offset = 0
+    while len(data) - offset >= 4:
+        length = int.from_bytes(data[offset:offset + 4], byteorder='big')
+        end = offset + 4 + length
+        if end > len(data):
+            break
+        try:
+            msg = decode_message(data[offset + 4:end])
+        except ValueError:
+            return True, None  # o worker lida com o erro
+        if msg.get('type') == 'join_room':
+            room = msg.get('room')
+            return True, None if room is None else str(room)
+        offset = end
+    return False, None
+
+
+def _worker_main(index: int, control: socket.socket, options: dict):
+    udp_base_port = options['udp_base_port']
+    manager = RoomManager(options['host'], 0, options['tick_rate'],
+                          max_rooms=options['max_rooms'], idle_timeout=options['idle_timeout'],
+                          listen=False,
+                          udp_port=0 if udp_base_port is None else udp_base_port + index,
+                          max_spectators=options['max_spectators'],
+                          spectator_delay=options['spectator_delay'])
+    if not manager.start():
+        return
+
+    control.setblocking(False)
+    last_report = 0.0
+    try:
+        while manager.running and manager.server.running:
+            manager.poll()
+            if not _receive_connections(manager, control):
+                break
+
+            now = time.monotonic()
+            if now - last_report >= REPORT_INTERVAL:
+                last_report = now
+                report = manager.get_stats()
+                report['p99_ms'] = max((room['p99_ms'] for room in manager.get_room_stats().values()),
+                                       default=0.0)
+                report['pid'] = os.getpid()
+                try:
+                    control.send(json.dumps(report).encode('utf-8'))
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    break  # supervisor morreu
+
+            manager.wait()
+    except KeyboardInterrupt:
+        pass  # o Ctrl+C chega ao grupo todo; o supervisor coordena o encerramento
+    finally:
+        manager.stop()
+
+
+def _receive_connections(manager: RoomManager, control: socket.socket) -> bool:
+    """Adota os sockets repassados pelo supervisor. Retorna False ao receber o pedido de parada."""
+    while True:
+        try:
+            msg, fds, _, _ = socket.recv_fds(control, PEEK_LIMIT + 1024, 1)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+
+        if not fds:
+            if msg == _STOP or not msg:
+                return False
+            continue
+
+        header, _, initial_data = msg.partition(b'\n')
+        address = tuple(json.loads(header).get('address') or ())
+        client_socket = socket.socket(fileno=fds[0])
+        manager.server.adopt_client(client_socket, address, initial_data)
+
+
+class WorkerHandle:
+    """Visão do supervisor sobre um worker: processo, canal de controle e última carga reportada."""
+
+    def __init__(self, index: int, process, control: socket.socket):
+        self.index = index
+        self.process = process
+        self.control = control
+        self.load: dict = {}
+        self.assigned = 0  # conexões repassadas desde o último relatório
+        self.waiting = 0   # estimativa de jogadores esperando adversário em salas públicas
+
+    @property
+    def clients(self) -> int:
+        return self.load.get('clients', 0) + self.assigned
+
+
+class Supervisor:
+    """Aceita conexões e as distribui entre N processos de RoomManager."""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 5555, workers: int | None = None,
+                 tick_rate: int = FPS, max_rooms: int = DEFAULT_MAX_ROOMS,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, udp_base_port: int | None = None,
+                 max_spectators: int = DEFAULT_MAX_SPECTATORS,
+                 spectator_delay: float = DEFAULT_SPECTATOR_DELAY):
+        self.host = host
+        self.port = port
+        self.worker_count = workers or os.cpu_count() or 1
+        self.options = {
+            'host': host,
+            'tick_rate': tick_rate,
+            'max_rooms': max_rooms,
+            'idle_timeout': idle_timeout,
+            'udp_base_port': udp_base_port,
+            'max_spectators': max_spectators,
+            'spectator_delay': spectator_delay,
+        }
+        self.server_socket: socket.socket | None = None
+        self.workers: list[WorkerHandle] = []
+        self._selector: selectors.BaseSelector | None = None
+        # Conexões aceitas esperando o join_room: socket -> (endereço, bytes lidos, momento)
+        self._pending: dict[socket.socket, tuple[tuple, bytearray, float]] = {}
+        self._context = multiprocessing.get_context('spawn')
+        self._last_liveness = 0.0
+        self.running = False
+
+    def start(self) -> bool:
+        if not hasattr(socket, 'send_fds') or not hasattr(socket, 'AF_UNIX'):
+            print("[Supervisor] Passagem de sockets entre processos não suportada nesta plataforma")
+            return False
+        try:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(128)
+            self.server_socket.setblocking(False)
+
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.server_socket, selectors.EVENT_READ, ('accept', None))
+
+            self.workers = [self._spawn(index) for index in range(self.worker_count)]
+        except Exception as e:
+            print(f"[Supervisor] Erro ao iniciar: {e}")
+            self.stop()
+            return False
+
+        self.running = True
+        print(f"[Supervisor] {self.worker_count} workers em {self.host}:{self.port}")
+        return True
+
+    def _spawn(self, index: int) -> WorkerHandle:
+        control, child_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        process = self._context.Process(target=_worker_main, args=(index, child_control, self.options),
+                                        name=f'room-worker-{index}', daemon=True)
+        process.start()
+        child_control.close()
+        control.setblocking(False)
+
+        worker = WorkerHandle(index, process, control)
+        self._selector.register(control, selectors.EVENT_READ, ('worker', worker))
+        return worker
+
+    def stop(self):
+        self.running = False
+
+        for client_socket in list(self._pending):
+            client_socket.close()
+        self._pending.clear()
+
+        if self.server_socket:
+            self.server_socket.close()
+            self.server_socket = None
+
+        for worker in self.workers:
+            try:
+                worker.control.send(_STOP)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=2.0)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.control.close()
+        self.workers = []
+
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+
+    def run(self):
+        while self.running:
+            self.poll(0.1)
+
+    def poll(self, timeout: float = 0.0):
+        for key, _ in self._selector.select(timeout):
+            kind, worker = key.data
+            if kind == 'accept':
+                self._accept()
+            elif kind == 'peek':
+                self._peek(key.fileobj)
+            else:
+                self._read_reports(worker)
+
+        # Quem não mandou join_room a tempo vai para uma sala pública
+        now = time.monotonic()
+        for client_socket, (_, _, accepted_at) in list(self._pending.items()):
+            if now - accepted_at >= PLACEMENT_TIMEOUT:
+                self._dispatch(client_socket, None)
+
+        if now - self._last_liveness >= LIVENESS_INTERVAL:
+            self._last_liveness = now
+            self._respawn_dead_workers()
+
+    def _accept(self):
+        while True:
+            try:
+                client_socket, address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"[Supervisor] Erro ao aceitar conexão: {e}")
+                return
+            client_socket.setblocking(False)
+            self._pending[client_socket] = (address, bytearray(), time.monotonic())
+            self._selector.register(client_socket, selectors.EVENT_READ, ('peek', None))
+
+    def _peek(self, client_socket: socket.socket):
+        address, data, _ = self._pending[client_socket]
+        try:
+            chunk = client_socket.recv(PEEK_LIMIT - len(data))
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b''
+
+        if not chunk:
+            # Desistiu antes de entrar numa sala
+            self._selector.unregister(client_socket)
+            del self._pending[client_socket]
+            client_socket.close()
+            return
+
+        data += chunk
+        decided, room = _find_join_room(data)
+        if decided or len(data) >= PEEK_LIMIT:
+            self._dispatch(client_socket, room)
+
+    def _dispatch(self, client_socket: socket.socket, room: str | None):
+        address, data, _ = self._pending.pop(client_socket)
+        self._selector.unregister(client_socket)
+
+        worker = self._choose_worker(room)
+        header = json.dumps({'address': list(address)}).encode('utf-8')
+        try:
+            socket.send_fds(worker.control, [header + b'\n' + bytes(data)], [client_socket.fileno()])
+            worker.assigned += 1
+        except OSError as e:
+            print(f"[Supervisor] Falha ao repassar conexão ao worker {worker.index}: {e}")
+        finally:
+            # O worker tem sua própria cópia do descritor
+            client_socket.close()
+
+    def _choose_worker(self, room: str | None) -> WorkerHandle:
+        if room is not None:
+            # Os dois lados de uma sala nomeada precisam cair no mesmo processo
+            return self.workers[zlib.crc32(room.encode('utf-8')) % len(self.workers)]
+
+        waiting = [worker for worker in self.workers if worker.waiting > 0]
+        if waiting:
+            worker = min(waiting, key=lambda w: w.clients)
+            worker.waiting -= 1
+        else:
+            worker = min(self.workers, key=lambda w: w.clients)
+            worker.waiting += 1
+        return worker
+
+    def _read_reports(self, worker: WorkerHandle):
+        while True:
+            try:
+                data = worker.control.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            try:
+                report = json.loads(data)
+            except ValueError:
+                continue
+            worker.load = report
+            worker.assigned = 0
+            worker.waiting = report.get('waiting', 0)
+
+    def _respawn_dead_workers(self):
+        for index, worker in enumerate(self.workers):
+            if worker.process.is_alive():
+                continue
+            print(f"[Supervisor] Worker {index} saiu (código {worker.process.exitcode}), reiniciando")
+            self._selector.unregister(worker.control)
+            worker.control.close()
+            self.workers[index] = self._spawn(index)
+
+    def get_stats(self) -> dict:
+        """Carga agregada e por worker, a partir dos últimos relatórios."""
+        summed = ('rooms', 'matches', 'waiting', 'spectators', 'clients', 'bytes_in', 'bytes_out',
+                  'decode_errors', 'send_stalls')
+        totals = dict.fromkeys(summed, 0)
+        totals['workers'] = len(self.workers)
+        totals['max_receive_age_s'] = 0.0
+        per_worker = []
+        for worker in self.workers:
+            for field in summed:
+                totals[field] += worker.load.get(field, 0)
+            totals['max_receive_age_s'] = max(totals['max_receive_age_s'], worker.load.get('max_receive_age_s', 0.0))
+            per_worker.append(dict(worker.load, index=worker.index, assigned=worker.assigned))
+        totals['per_worker'] = per_worker
+        return totals
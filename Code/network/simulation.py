@@ -0,0 +1,131 @@
+"""Simulação headless de uma partida 1v1 (World, Ball e paddles), sem janela nem áudio."""
+import os
+
+# Sem display nem dispositivo de áudio: precisa valer antes do primeiro import do pygame
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from network.prediction import InputBuffer, expand_history, paddle_state
+from settings import COUNTDOWN, FPS
+from world import World
+from player import Ball, Player
+
+
+# Mesma suavização que o host aplica à posição reportada pelo oponente
+PADDLE_LERP = 0.5
+
+SLOTS = (1, 2)
+
+
+class RemoteInput:
+    """Controlador de um paddle a partir dos inputs recebidos do jogador.
+
+    Inputs numerados (seq) são consumidos um por passo; clientes antigos mandam só a
+    direção e a posição, e o paddle converge para ela.
+    """
+
+    def __init__(self):
+        self.direction = 0
+        self.paddle_y: float | None = None
+        self.buffer = InputBuffer()
+
+    def get_direction(self) -> int:
+        if self.buffer.active:
+            return self.buffer.next()
+        return self.direction
+
+
+class Match:
+    """Uma partida 1v1: World, Ball e os dois paddles avançados em passos fixos."""
+
+    def __init__(self, tick_rate: int = FPS):
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.world = World()
+        self.paused = False
+
+        self.all_sprites = pygame.sprite.Group()
+        self.paddle_sprites = pygame.sprite.Group()
+        self.inputs = {slot: RemoteInput() for slot in SLOTS}
+        self.players = {
+            1: Player('TEAM_1', self.inputs[1], (self.all_sprites, self.paddle_sprites)),
+            2: Player('TEAM_2', self.inputs[2], (self.all_sprites, self.paddle_sprites)),
+        }
+        self.ball = Ball(self.all_sprites, self.paddle_sprites, self._on_goal)
+        self.ball.reset()
+
+    def start(self):
+        self.world.start_countdown(COUNTDOWN['ball'], self.tick_rate)
+
+    def apply_input(self, slot: int, msg: dict):
+        controller = self.inputs.get(slot)
+        if controller is None:
+            return
+        if msg.get('seq') is not None:
+            # Autoritativo: o paddle é simulado a partir dos inputs, sem a posição reportada
+            for seq, direction in expand_history(msg['seq'], msg.get('direction', 0), msg.get('history')):
+                controller.buffer.push(seq, direction)
+            return
+        controller.direction = msg.get('direction', 0)
+        if msg.get('paddle_y') is not None:
+            controller.paddle_y = msg['paddle_y']
+
+    def set_pause(self, paused: bool):
+        """Mesma regra do PauseManager: ao despausar, countdown antes de voltar a jogar."""
+        if paused == self.paused:
+            return
+        self.paused = paused
+        if not paused:
+            if self.world.phase == 'play':
+                self.world.start_pause_countdown(3.0, self.tick_rate)
+            elif self.world.phase == 'countdown':
+                self.world.start_countdown(3.0, self.tick_rate)
+
+    def step(self):
+        world = self.world
+        if self.paused:
+            return
+
+        if world.phase == 'pause_countdown':
+            world.tick += 1
+            world.maybe_resume()
+            return
+
+        # Cada cliente simula o próprio paddle; o servidor converge para a posição reportada
+        for slot, player in self.players.items():
+            controller = self.inputs[slot]
+            if controller.paddle_y is not None:
+                player.rect.centery += (controller.paddle_y - player.rect.centery) * PADDLE_LERP
+                controller.paddle_y = None
+
+        world.tick += 1
+        if world.maybe_resume():
+            self.ball.launch_after_countdown()
+
+        self.all_sprites.update(self.dt)
+
+    def snapshot(self) -> dict:
+        state = {
+            'ball_x': self.ball.rect.centerx,
+            'ball_y': self.ball.rect.centery,
+            'ball_dx': self.ball.direction.x,
+            'ball_dy': self.ball.direction.y,
+            'ball_speed': self.ball.speed,
+            'score_t1': self.world.score['TEAM_1'],
+            'score_t2': self.world.score['TEAM_2'],
+            'phase': self.world.phase,
+            'tick': self.world.tick,
+            'countdown_end': self.world.countdownEndTick,
+        }
+        for slot, player in self.players.items():
+            buffer = self.inputs[slot].buffer
+            state.update(paddle_state(slot, player, buffer.last_seq))
+        return state
+
+    def _on_goal(self, side: str):
+        self.world.score[side] += 1
+        self.world.start_countdown(COUNTDOWN['ball'], self.tick_rate)
+        self.ball.reset()
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+
+
+# Campos do game_state comparados no delta (o 'seq' identifica o snapshot)
+STATE_FIELDS = ('ball_x', 'ball_y', 'ball_dx', 'ball_dy', 'ball_speed',
+                'score_t1', 'score_t2', 'phase', 'tick', 'countdown_end',
+                'p1_y', 'p2_y', 'p1_vel', 'p2_vel', 'p1_charge', 'p2_charge',
+                'p1_ack', 'p2_ack', 'p1_dir', 'p2_dir')
+
+# Um keyframe completo a cada N snapshots, mesmo com acks em dia
+DEFAULT_KEYFRAME_INTERVAL = 60
+# Quantos snapshots recentes cada lado guarda como base de delta
+DEFAULT_HISTORY = 64
+
+
+class DeltaEncoder:
+    """Lado do host: gera keyframes ou deltas contra o último snapshot confirmado por cada cliente."""
+
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 history: int = DEFAULT_HISTORY):
+        self.keyframe_interval = keyframe_interval
+        self.history = history
+        self._snapshots: OrderedDict[int, dict] = OrderedDict()
+        self._acked: dict[int, int] = {}          # client_id -> último seq confirmado
+        self._last_keyframe: dict[int, int] = {}  # client_id -> seq do último keyframe enviado
+        self._keyframe_requested: set[int] = set()
+        self._cache: dict[tuple[int, int | None], dict] = {}
+        self._seq = 0
+
+    def push(self, state: dict) -> int:
+        """Registra um novo snapshot completo e retorna seu seq."""
+        self._seq += 1
+        snapshot = {field: state.get(field) for field in STATE_FIELDS}
+        self._snapshots[self._seq] = snapshot
+        while len(self._snapshots) > self.history:
+            self._snapshots.popitem(last=False)
+        self._cache.clear()
+        return self._seq
+
+    def encode_for(self, client_id: int) -> dict:
+        """Mensagem do snapshot mais recente para um cliente (keyframe ou delta)."""
+        seq = self._seq
+        base_seq = self._acked.get(client_id)
+        base = self._snapshots.get(base_seq) if base_seq is not None else None
+
+        keyframe_due = (base is None
+                        or client_id in self._keyframe_requested
+                        or seq - self._last_keyframe.get(client_id, 0) >= self.keyframe_interval)
+
+        if keyframe_due:
+            self._keyframe_requested.discard(client_id)
+            self._last_keyframe[client_id] = seq
+            base_seq = None
+
+        # Clientes com a mesma base recebem o mesmo objeto de mensagem
+        key = (seq, base_seq)
+        msg = self._cache.get(key)
+        if msg is None:
+            msg = self._build(seq, base_seq, base)
+            self._cache[key] = msg
+        return msg
+
+    def _build(self, seq: int, base_seq: int | None, base: dict | None) -> dict:
+        snapshot = self._snapshots[seq]
+        if base_seq is None:
+            msg = {'type': 'game_state', 'seq': seq}
+            msg.update(snapshot)
+            return msg
+
+        msg = {'type': 'game_state_delta', 'seq': seq, 'base': base_seq}
+        for field in STATE_FIELDS:
+            value = snapshot[field]
+            if value != base[field]:
+                msg[field] = value
+        return msg
+
+    def ack(self, client_id: int, seq: int):
+        # Acks chegam fora de ordem pelo UDP: só avança
+        if seq in self._snapshots and seq > self._acked.get(client_id, 0):
+            self._acked[client_id] = seq
+
+    def request_keyframe(self, client_id: int | None = None):
+        """Força keyframe no próximo envio (para um cliente ou para todos)."""
+        if client_id is None:
+            self._keyframe_requested.update(self._acked.keys())
+            self._keyframe_requested.update(self._last_keyframe.keys())
+        else:
+            self._keyframe_requested.add(client_id)
+
+    def remove_client(self, client_id: int):
+        self._acked.pop(client_id, None)
+        self._last_keyframe.pop(client_id, None)
+        self._keyframe_requested.discard(client_id)
+
+
+class DeltaDecoder:
+    """Lado do cliente: reconstrói o estado completo a partir de keyframes e deltas."""
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        self.history = history
+        self._states: OrderedDict[int, dict] = OrderedDict()
+        self.latest_seq = 0
+        self.awaiting_keyframe = False
+
+    def apply(self, msg: dict) -> dict | None:
+        """Retorna o estado completo, ou None se a mensagem for antiga ou sem base conhecida."""
+        seq = msg.get('seq')
+        if seq is None:
+            # Host sem deltas (versão anterior): o próprio snapshot é o estado
+            return msg
+        if seq <= self.latest_seq:
+            return None
+
+        if msg.get('type') == 'game_state':
+            state = {field: msg.get(field) for field in STATE_FIELDS}
+            self.awaiting_keyframe = False
+        else:
+            base = self._states.get(msg.get('base'))
+            if base is None:
+                self.awaiting_keyframe = True
+                return None
+            state = dict(base)
+            for field in STATE_FIELDS:
+                if field in msg:
+                    state[field] = msg[field]
+
+        state['type'] = 'game_state'
+        state['seq'] = seq
+        self._states[seq] = state
+        while len(self._states) > self.history:
+            self._states.popitem(last=False)
+        self.latest_seq = seq
+        return state
+
+    def reset(self):
+        self._states.clear()
+        self.latest_seq = 0
+        self.awaiting_keyframe = False
@@ -0,0 +1,91 @@
+import struct
+
+
+# Cabeçalho de cada datagrama: token da sessão. Em seguida vêm um ou mais registros
+# (sequência + tamanho + payload), para coalescer as mensagens de um tick.
+_DATAGRAM_HEADER = struct.Struct('!I')
+_RECORD_HEADER = struct.Struct('!IH')
+
+# Bytes acrescentados a cada mensagem num datagrama (seq + tamanho)
+RECORD_OVERHEAD = _RECORD_HEADER.size
+
+# Mantém datagramas abaixo do MTU típico para evitar fragmentação IP
+MAX_DATAGRAM_SIZE = 1200
+
+_SEQ_MOD = 1 << 32
+_SEQ_HALF = 1 << 31
+
+
+def pack_datagrams(token: int, records: list[tuple[int, bytes]]) -> list[bytes]:
+    """Agrupa registros (seq, payload) no menor número de datagramas até MAX_DATAGRAM_SIZE."""
+    datagrams = []
+    parts = [_DATAGRAM_HEADER.pack(token)]
+    size = _DATAGRAM_HEADER.size
+    for seq, payload in records:
+        record_size = _RECORD_HEADER.size + len(payload)
+        if size + record_size > MAX_DATAGRAM_SIZE and len(parts) > 1:
+            datagrams.append(b''.join(parts))
+            parts = [_DATAGRAM_HEADER.pack(token)]
+            size = _DATAGRAM_HEADER.size
+        parts.append(_RECORD_HEADER.pack(seq % _SEQ_MOD, len(payload)))
+        parts.append(payload)
+        size += record_size
+    if len(parts) > 1:
+        datagrams.append(b''.join(parts))
+    return datagrams
+
+
+def unpack_datagram(data: bytes) -> tuple[int, list[tuple[int, memoryview]]] | None:
+    """Retorna (token, [(seq, payload), ...]) ou None se o datagrama estiver malformado."""
+    if len(data) < _DATAGRAM_HEADER.size:
+        return None
+    (token,) = _DATAGRAM_HEADER.unpack_from(data)
+    view = memoryview(data)
+    records = []
+    offset = _DATAGRAM_HEADER.size
+    while offset < len(view):
+        if offset + _RECORD_HEADER.size > len(view):
+            return None
+        seq, length = _RECORD_HEADER.unpack_from(view, offset)
+        offset += _RECORD_HEADER.size
+        if offset + length > len(view):
+            return None
+        records.append((seq, view[offset:offset + length]))
+        offset += length
+    return token, records
+
+
+def seq_newer(seq: int, last: int) -> bool:
+    """Comparação com wrap-around (aritmética de números de série)."""
+    return 0 < (seq - last) % _SEQ_MOD < _SEQ_HALF
+
+
+class SequenceCounter:
+    """Gera números de sequência independentes por tipo de mensagem."""
+
+    def __init__(self):
+        self._next: dict[str, int] = {}
+
+    def next(self, msg_type: str) -> int:
+        seq = self._next.get(msg_type, 0)
+        self._next[msg_type] = (seq + 1) % _SEQ_MOD
+        return seq
+
+
+class SequenceFilter:
+    """Descarta datagramas repetidos, atrasados ou fora de ordem, por tipo de mensagem."""
+
+    def __init__(self):
+        self._last: dict[str, int] = {}
+        self.dropped = 0
+
+    def accept(self, msg_type: str, seq: int) -> bool:
+        last = self._last.get(msg_type)
+        if last is not None and not seq_newer(seq, last):
+            self.dropped += 1
+            return False
+        self._last[msg_type] = seq
+        return True
+
+    def reset(self):
+        self._last.clear()
@@ -1,5 +1,8 @@
 from network.network_handler import NetworkHandler
 from network.network_input import NetworkInputHandler
+from network.prediction import INPUT_HISTORY, InputThrottle, PredictedInput, paddle_state, restore_paddle
+from audio_manager import get_audio_manager
+from settings import FPS
 import math
 
 
@@ -11,6 +14,17 @@ class NetworkSync:
         self.ball = ball
         self.world = world
         self.players = players
+        # Predição do paddle local (cliente): último ack aplicado e a última correção
+        self.last_input_ack = 0
+        self.last_correction = 0.0
+        self.reconciliations = 0
+        # Input só nas mudanças de direção e num heartbeat; o receptor mantém a última direção
+        self.input_throttle = InputThrottle()
+    
+    def _local_player(self):
+        if self.network.is_spectator():
+            return None
+        return self.players.get('player1' if self.network.player_id == 1 else 'player2')
     
     def send_local_input(self):
         """Envia input do jogador local e estado do jogo (host)"""
@@ -19,20 +33,39 @@ class NetworkSync:
         
         is_host = self.network.is_host()
         
+        # Tudo o que for enviado neste tick sai junto no flush() do final
+        self.network.begin_tick()
+        
         # Enviar input do jogador local + posição Y do paddle
-        local_player_key = 'player1' if self.network.player_id == 1 else 'player2'
-        if local_player_key in self.players:
-            player = self.players[local_player_key]
-            if hasattr(player.input_handler, 'get_direction'):
-                direction = player.input_handler.get_direction()
-                paddle_y = player.rect.centery  # Captura posição Y atual
-                self.network.send_input(direction, paddle_y=paddle_y)
+        player = self._local_player()
+        if player is not None:
+            controller = player.input_handler
+            if isinstance(controller, PredictedInput):
+                # Uma mensagem com o passo mais novo; os anteriores não confirmados vão no
+                # histórico (frames com muitos passos mandam uma a cada INPUT_HISTORY + 1)
+                outgoing = controller.take_outgoing()
+                marks = [self.input_throttle.should_send(direction) for _, direction in outgoing]
+                group = INPUT_HISTORY + 1
+                for end in range(len(outgoing), 0, -group)[::-1]:
+                    if not any(marks[max(0, end - group):end]):
+                        continue  # só passos com a direção mantida: o host já os cobre
+                    seq, direction = outgoing[end - 1]
+                    self.network.send_input(direction, paddle_y=player.rect.centery, seq=seq,
+                                            history=controller.history(seq))
+            elif hasattr(controller, 'get_direction'):
+                direction = controller.get_direction()
+                if self.input_throttle.should_send(direction):
+                    paddle_y = player.rect.centery  # Captura posição Y atual
+                    self.network.send_input(direction, paddle_y=paddle_y)
         
         # Host aplica posição do oponente recebida via input
         if is_host:
             self._apply_opponent_position_from_input()
+            self.network.server_tick = self.world.tick
             self.send_game_state(is_host)
         
+        self.network.flush()
+        
         # Cliente aplica estado recebido
         if not is_host:
             self.apply_game_state()
@@ -42,14 +75,6 @@ class NetworkSync:
         if not is_host or not self.network or not self.ball or not self.world:
             return
         
-        # Captura posições dos paddles
-        p1_y = None
-        p2_y = None
-        if 'player1' in self.players:
-            p1_y = self.players['player1'].rect.centery
-        if 'player2' in self.players:
-            p2_y = self.players['player2'].rect.centery
-        
         game_state = {
             'ball_x': self.ball.rect.centerx,
             'ball_y': self.ball.rect.centery,
@@ -61,9 +86,13 @@ class NetworkSync:
             'phase': self.world.phase,
             'tick': self.world.tick,
             'countdown_end': self.world.countdownEndTick,
-            'p1_y': p1_y,  # Posição Y do player 1
-            'p2_y': p2_y   # Posição Y do player 2
         }
+        
+        # Paddles: posição, velocidade, carga e o último input do cliente aplicado (ack)
+        for slot, key in ((1, 'player1'), (2, 'player2')):
+            if key in self.players:
+                ack = None if slot == self.network.player_id else self.network.opponent_inputs.last_seq
+                game_state.update(paddle_state(slot, self.players[key], ack))
     
         self.network.send_game_state(game_state)
     
@@ -76,13 +105,14 @@ class NetworkSync:
         if not state:
             return
         
-        # Interpolação suave da bola
+        # Bola e paddle do oponente vêm do jitter buffer: interpolados entre os dois
+        # snapshots em volta de agora - interp_delay
+        sample = self.network.snapshots.sample()
+        if sample is None:
+            sample = state
+        
         if 'ball_x' in state:
-            lerp = 0.4
-            target_x = state['ball_x']
-            target_y = state['ball_y']
-            self.ball.rect.centerx += (target_x - self.ball.rect.centerx) * lerp
-            self.ball.rect.centery += (target_y - self.ball.rect.centery) * lerp
+            self.ball.rect.center = (sample['ball_x'], sample['ball_y'])
             self.ball.direction.x = state['ball_dx']
             self.ball.direction.y = state['ball_dy']
             self.ball.speed = state['ball_speed']
@@ -95,18 +125,59 @@ class NetworkSync:
         # Atualiza estado do jogo
         if 'phase' in state:
             self.world.phase = state['phase']
-            self.world.tick = state.get('tick', self.world.tick)
+            # O snapshot tem RTT/2 de idade: com o relógio estimado por ping/pong o
+            # cliente usa o tick em que o servidor está agora
+            estimated_tick = self.network.estimated_server_tick
+            if estimated_tick is not None:
+                self.world.tick = max(int(round(estimated_tick)), state.get('tick', 0))
+            else:
+                self.world.tick = state.get('tick', self.world.tick)
             self.world.countdownEndTick = state.get('countdown_end')
         
-        # Aplica posição do oponente (player1 para o cliente que é player2)
-        # O cliente é player2, então o oponente é player1
-        if 'p1_y' in state and state['p1_y'] is not None:
-            if 'player1' in self.players:
-                opponent = self.players['player1']
-                target_y = state['p1_y']
-                # Interpolação suave para evitar teleporte
-                lerp_paddle = 0.5
-                opponent.rect.centery += (target_y - opponent.rect.centery) * lerp_paddle
+        self._reconcile_local_paddle(state)
+        
+        # Aplica posição do oponente: player1 para o cliente que é player2 (host comum);
+        # num servidor dedicado o cliente também pode ser o player1. Espectadores: os dois
+        if self.network.is_spectator():
+            remote_paddles = (('player1', 'p1_y'), ('player2', 'p2_y'))
+        elif self.network.player_id == 1:
+            remote_paddles = (('player2', 'p2_y'),)
+        else:
+            remote_paddles = (('player1', 'p1_y'),)
+        for key, field in remote_paddles:
+            if sample.get(field) is not None and key in self.players:
+                self.players[key].rect.centery = sample[field]
+    
+    def _reconcile_local_paddle(self, state: dict):
+        """Volta o paddle local ao estado confirmado pelo host e reaplica os inputs pendentes."""
+        slot = self.network.player_id
+        player = self._local_player()
+        if player is None or not isinstance(player.input_handler, PredictedInput):
+            return
+        ack = state.get(f'p{slot}_ack')
+        if ack is None or ack <= self.last_input_ack or state.get(f'p{slot}_y') is None:
+            return  # host sem predição, ou nada novo confirmado
+        self.last_input_ack = ack
+        
+        controller = player.input_handler
+        direction = controller.acknowledge(ack)
+        predicted_y = player.rect.centery
+        restore_paddle(player, state, slot, direction)
+        
+        # Replay silencioso: os sons dos passos reaplicados já tocaram
+        audio = get_audio_manager()
+        was_muted = audio.muted
+        audio.muted = True
+        controller.begin_replay()
+        try:
+            for _ in range(len(controller.pending)):
+                player.update(1 / FPS)
+        finally:
+            controller.end_replay()
+            audio.muted = was_muted
+        
+        self.last_correction = player.rect.centery - predicted_y
+        self.reconciliations += 1
     
     def _apply_opponent_position_from_input(self):
         """Host aplica posição do oponente recebida via mensagem de input"""
@@ -134,6 +205,9 @@ class PauseManager:
         self.world = world
         self.paused = False
         self.pause_initiator = None  # "local" ou "remote"
+        # Countdown ao despausar; no rollback a pausa não pode mexer no World
+        # (cada lado despausaria num tick diferente e os estados divergiriam)
+        self.resume_countdown = True
     
     def toggle_pause_local(self):
         """Alterna pausa localmente e notifica rede"""
@@ -156,7 +230,7 @@ class PauseManager:
         
         # Se estamos despausando: só cria pause_countdown se estávamos jogando;
         # se estávamos em countdown de gol, apenas retoma o countdown existente.
-        if not paused and self.world:
+        if not paused and self.world and self.resume_countdown:
             from settings import FPS
             # Evita rearmar countdown se já está em pause_countdown ou já despausou
             if self.world.phase == "play":
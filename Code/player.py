@@ -343,9 +343,11 @@ class Ball(pygame.sprite.Sprite):
         #self.is_frozen = True
         self.speed = OBJECTS_SPEED['ball']
 
-    def launch_after_countdown(self):
+    def launch_after_countdown(self, rng=None):
         #self.is_frozen = False
-        self.direction = pygame.Vector2(choice((1,-1)), uniform(0.7,0.8) * choice((-1,1)))
+        # rng com semente: no rollback os dois lados precisam sortear a mesma direção
+        pick, spread = (rng.choice, rng.uniform) if rng else (choice, uniform)
+        self.direction = pygame.Vector2(pick((1,-1)), spread(0.7,0.8) * pick((-1,1)))
         self.speed = OBJECTS_SPEED['ball']
 
     def update(self, dt):
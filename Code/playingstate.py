@@ -8,11 +8,14 @@ from world import *
 from audio_manager import get_audio_manager
 from gamestate import BaseState, StateID
 from networksync import *
+from network.rollback import RollbackSession, SlotInput, launch_rng
 from menu_state.pause import *
 from menu_state.ui import *
 
 class PlayingState(BaseState):
     FIXED_DT = 1/FPS
+    # network debug overlay (F3): text refreshed a few times per second
+    NETWORK_DEBUG_REFRESH = 0.25
 
     def __init__(self, state_manager):
         super().__init__(state_manager)
@@ -27,6 +30,7 @@ class PlayingState(BaseState):
         self.network = None
         self.network_sync = None  # Será inicializado em enter()
         self.pause_manager = None  # Será inicializado em enter()
+        self.rollback = None  # RollbackSession no netcode 'rollback'
 
         # Disconnect handling
         self.opponent_disconnected = False
@@ -54,6 +58,7 @@ class PlayingState(BaseState):
         self.pause_menu = PauseMenu(self.screen, pause_title_font, pause_option_font, pause_small_font)
         self.remote_pause_msg = RemotePauseMessage(self.screen, pause_title_font, pause_option_font, pause_small_font)
         self.disconnect_msg = DisconnectMessage(self.screen, pause_title_font, pause_small_font)
+        self.reconnect_msg = ReconnectMessage(self.screen, pause_title_font, pause_small_font)
         self.countdown_display = CountdownDisplay(self.screen, None)  # world será setado em enter()
         self.score_display = ScoreDisplay(self.screen, None)  # world será setado em enter()
 
@@ -63,6 +68,10 @@ class PlayingState(BaseState):
         self.last_substeps = 0
         self.last_dt = 0.0
         self.debug_font = pygame.font.Font(None, 24)
+        self.show_network_debug = False
+        self._network_debug_lines = []
+        self._network_debug_next = 0.0
+        self._network_debug_last = None  # (time, bytes in, bytes out) for the rates
 
     def enter(self, game_mode="local", network = None):
         # pygame.mouse.set_visible(False)
@@ -94,6 +103,8 @@ class PlayingState(BaseState):
         
         self.last_countdown_beep = None
 
+        self.rollback = None
+
         # initializing sprite groups
         self.all_sprites = pygame.sprite.Group()
         self.paddle_sprites = pygame.sprite.Group()
@@ -108,6 +119,13 @@ class PlayingState(BaseState):
         # Inicializar NetworkSync
         self.network_sync = NetworkSync(self.network, self.ball, self.world, self.players)
 
+        # Rollback: os dois lados simulam a partida a partir dos inputs trocados por tick
+        if self.rollback_controller is not None:
+            paddles = {1: self.players['player1'], 2: self.players['player2']}
+            self.rollback = RollbackSession(self.network, self.network.player_id, self.rollback_controller,
+                                            self.world, self.ball, paddles, self._rollback_step)
+            self.pause_manager.resume_countdown = False
+
         # Start gameplay music
         get_audio_manager().play_gameplay_music(intensity="normal", fade_ms=500)
 
@@ -125,6 +143,8 @@ class PlayingState(BaseState):
                 self.network = None
     
     def setup_players(self):
+        self.rollback_controller = None
+
         # singleplayer (TODO)
 
         # local coop (sem IA por enquanto)
@@ -151,6 +171,16 @@ class PlayingState(BaseState):
             local_keys = (pygame.K_w, pygame.K_s)
             local_controller = InputHandler(*local_keys)
             remote_controller = NetworkInputHandler(self.network)
+            if self.network.is_spectator():
+                # Espectador: os dois paddles vêm dos snapshots, nenhum lê o teclado
+                local_controller, remote_controller = SlotInput(), SlotInput()
+            elif self.network.netcode == 'rollback':
+                # A RollbackSession lê o teclado e define a direção dos dois paddles a cada passo
+                self.rollback_controller = local_controller
+                local_controller, remote_controller = SlotInput(), SlotInput()
+            elif not self.network.is_host():
+                # Cliente prevê o próprio paddle e reconcilia com os acks do host
+                local_controller = PredictedInput(local_controller)
             
             if self.network.player_id == 1:
                 # Jogador 1 é local
@@ -192,6 +222,8 @@ class PlayingState(BaseState):
             if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 self._toggle_pause_local()
                 return
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.show_network_debug = not self.show_network_debug
             
     def _toggle_pause_local(self):
         """Alterna pausa localmente e notifica rede"""
@@ -244,7 +276,57 @@ class PlayingState(BaseState):
 
 
     def display_debug(self):
-        pass
+        if not (self.show_network_debug and self.network):
+            return
+        now = _time_hr.monotonic()
+        if now >= self._network_debug_next:
+            self._network_debug_next = now + self.NETWORK_DEBUG_REFRESH
+            self._network_debug_lines = self._network_debug_text(now)
+        for i, line in enumerate(self._network_debug_lines):
+            text = self.debug_font.render(line, True, (200, 200, 200))
+            self.screen.blit(text, (10, 10 + i * 20))
+
+    def _network_debug_text(self, now):
+        metrics = self.network.get_network_metrics()
+        lines = [f"{metrics['mode']} / {metrics['netcode']} / player {metrics['player_id']}"]
+        connections = list(metrics.get('server', {}).values())
+        client = metrics.get('client')
+        if client and client['codec'] is not None:
+            connections.append(client)
+            lines.append(f"RTT {client['rtt_ms']:.1f} ms  jitter {client['jitter_ms']:.1f} ms  "
+                         f"{client['codec']}{' + udp' if client['udp'] else ''}")
+
+        bytes_in = sum(conn['bytes_in'] for conn in connections)
+        bytes_out = sum(conn['bytes_out'] for conn in connections)
+        if self._network_debug_last:
+            then, last_in, last_out = self._network_debug_last
+            elapsed = max(now - then, 1e-6)
+            lines.append(f"in {(bytes_in - last_in) / elapsed / 1024:.1f} KiB/s  "
+                         f"out {(bytes_out - last_out) / elapsed / 1024:.1f} KiB/s")
+        self._network_debug_last = (now, bytes_in, bytes_out)
+
+        for client_id, conn in metrics.get('server', {}).items():
+            lines.append(f"client {client_id}: last recv {self._age_ms(conn)} ms ago  "
+                         f"send queue {conn['queued_bytes']} B  stalls {conn['send_stalls']}  "
+                         f"decode errors {conn['decode_errors']}")
+        if client and client['codec'] is not None:
+            lines.append(f"server: last recv {self._age_ms(client)} ms ago  inbox {client['received_queue']}  "
+                         f"stalls {client['send_stalls']}  decode errors {client['decode_errors']}")
+
+        snapshots = metrics['snapshots']
+        if not self.network.is_host():
+            lines.append(f"snapshots: delay {snapshots['delay_ms']:.0f} ms  buffered {snapshots['buffered']}  "
+                         f"underruns {snapshots['underruns']}")
+        if self.rollback:
+            stats = self.rollback.get_stats()
+            lines.append(f"rollbacks {stats['rollbacks']}  max depth {stats['max_rollback_depth']}  "
+                         f"stalls {stats['stalls']}  desyncs {stats['desyncs']}")
+        return lines
+
+    @staticmethod
+    def _age_ms(conn):
+        age = conn['last_receive_age_s']
+        return f"{age * 1000:.0f}" if age is not None else "-"
 
     def draw(self):
         self.screen.fill("black")
@@ -268,7 +350,7 @@ class PlayingState(BaseState):
         self.countdown_display.draw()
 
         # debug
-        if self.frame_times:
+        if self.frame_times or self.show_network_debug:
             self.display_debug()
 
         center_x = WINDOW_WIDTH // 2
@@ -288,6 +370,8 @@ class PlayingState(BaseState):
         # overlay de desconexão
         if self.opponent_disconnected:
             self.disconnect_msg.draw(center_x, center_y, self.disconnect_timer, self.disconnect_message_duration)
+        elif self.network and self.network.is_resuming():
+            self.reconnect_msg.draw(center_x, center_y, self.network.is_host(), self.network.resume_time_left())
 
     def update(self, dt):
         # Store dt for animations
@@ -309,6 +393,14 @@ class PlayingState(BaseState):
                 self.state_manager.change_state(StateID.MAIN_MENU)
             return  # Don't update game while showing disconnect message
         
+        # Session interrupted: the match stays frozen while the connection is resumed;
+        # the host keeps sending state so the resumed client gets its keyframe
+        if self.network and self.network.is_resuming():
+            self.network.update()
+            if self.network.is_host():
+                self._send_local_input()
+            return
+        
         # Update dot animation for remote pause message
         self.update_dot_animation(dt)
         
@@ -316,8 +408,18 @@ class PlayingState(BaseState):
         if self.network:
             self.network.update()
             self._sync_pause_from_network()
-            self._send_local_input()
+            if self.rollback:
+                # Inputs do adversário antes dos passos; os nossos saem juntos no flush
+                self.rollback.poll()
+                self.network.begin_tick()
         
+        self._advance(dt)
+        
+        # Inputs dos passos deste frame (e o estado, no host) saem depois da simulação
+        if self.network:
+            self._send_local_input()
+
+    def _advance(self, dt):
         # Se estiver em countdown de pausa, atualizar o tick
         if self.world and self.world.phase == "pause_countdown":
             # Atualiza o tick para o countdown funcionar
@@ -361,6 +463,14 @@ class PlayingState(BaseState):
         # verifying fps
         substeps = 0
         while self.accumulator >= self.FIXED_DT and substeps < max_substeps:
+            if self.rollback:
+                advanced = self.rollback.advance()
+                self.accumulator -= self.FIXED_DT
+                if not advanced:
+                    break  # esperando inputs do adversário (ou o adversário alcançar)
+                substeps += 1
+                continue
+
             self.world.tick += 1
 
             # launch ball after countdown ends
@@ -379,8 +489,22 @@ class PlayingState(BaseState):
         return substeps
 
     #metodos de rede
+    def _rollback_step(self, directions):
+        """Um passo determinístico do rollback: mesma ordem e mesmos sorteios nos dois lados."""
+        self.players['player1'].input_handler.direction = directions[1]
+        self.players['player2'].input_handler.direction = directions[2]
+        self.world.tick += 1
+        if self.world.maybe_resume() and self.ball:
+            self.ball.launch_after_countdown(launch_rng(self.network.match_seed, self.world.tick))
+            self.last_countdown_beep = None
+            get_audio_manager().play_launch()
+        self.all_sprites.update(self.FIXED_DT)
+
     def _send_local_input(self):
-        if self.network_sync:
+        if self.rollback:
+            # Inputs já registrados pela sessão em cada passo
+            self.network.flush()
+        elif self.network_sync:
             self.network_sync.send_local_input()
 
     def _apply_game_state(self):
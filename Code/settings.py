@@ -8,6 +8,12 @@ from enum import Enum, auto
 WINDOW_WIDTH, WINDOW_HEIGHT = 1280,720
 FPS = 60
 
+# Lobby de matchmaking usado pelo "Quick match" (ver network/lobby.py)
+LOBBY_HOST, LOBBY_PORT = 'localhost', 5550
+
+# Netcode das partidas hospedadas: 'server' (host autoritativo) ou 'rollback'
+NETCODE = 'server'
+
 OBJECTS_SIZE = {'paddle': (25,75), 'ball': (30,30)  } #size of the game objects
 
 OBJECTS_POSITION = {'TEAM_1': (50, WINDOW_HEIGHT/2), 